@@ -1,7 +1,8 @@
 # accounts/backends.py
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+
+from .models import LoginIdentifier, login_key
 
 User = get_user_model()
 
@@ -9,14 +10,31 @@ class EmailOrUsernameBackend(ModelBackend):
     """
     Позволяет авторизоваться по email ИЛИ по username.
     Мы не меняем модель пользователя → всё совместимо с текущей БД.
+
+    Поиск идёт по нормализованной таблице LoginIdentifier (один индексный запрос).
+    Если идентификатор совпал с чьим-то логином, проверяется только этот
+    пользователь; email рассматривается, лишь когда такого логина нет. Иначе
+    пароль одного пользователя открывал бы вход в чужой аккаунт, чей email
+    совпал с его логином. Общий email у нескольких пользователей — проверяем
+    их по возрастанию id.
     """
     def authenticate(self, request, username=None, password=None, **kwargs):
         if username is None or password is None:
             return None
-        try:
-            user = User.objects.get(Q(email__iexact=username) | Q(username__iexact=username))
-        except User.DoesNotExist:
+        entries = list(
+            LoginIdentifier.objects.filter(identifier=login_key(username))
+            .select_related("user")
+            .order_by("kind", "user_id")
+        )
+        # Записи отсортированы по kind: есть совпадение по логину — email не смотрим.
+        kind = entries[0].kind if entries else None
+        candidates = {entry.user_id: entry.user for entry in entries if entry.kind == kind}
+        if not candidates:
+            # Как в ModelBackend: хэшируем пароль и без пользователя, чтобы по времени
+            # ответа нельзя было понять, существует ли логин.
+            User().set_password(password)
             return None
-        if user.check_password(password) and self.user_can_authenticate(user):
-            return user
+        for user in candidates.values():
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
         return None
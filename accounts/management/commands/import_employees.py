@@ -1,11 +1,27 @@
 import os
+import time
 
 import pandas as pd
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from accounts.models import Department, Employee, EmployeeSkill, Position, Skill
 
+# Меньше лимита SQLite на число параметров в одном запросе.
+LOOKUP_CHUNK = 900
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """Строки без пробелов по краям; пустые значения и NaN -> пустая строка."""
+    return series.where(series.notna(), "").astype(str).str.strip()
+
 
 class Command(BaseCommand):
     help = "Импорт сотрудников из Excel с отделами, должностями и навыками"
@@ -20,6 +36,124 @@ class Command(BaseCommand):
             ),
         )
 
+    def _column(self, df, *names):
+        for name in names:
+            if name in df.columns:
+                return df[name]
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    def _normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        birth_date = pd.to_datetime(
+            self._column(df, "Дата рождения").fillna(self._column(df, "Дата")),
+            errors="coerce",
+            dayfirst=True,
+        )
+        frame = pd.DataFrame(
+            {
+                "full_name": _text(self._column(df, "ФИО")),
+                "phone": _text(self._column(df, "Телефон")).str.replace(r"\.0$", "", regex=True),
+                "status": _text(self._column(df, "Статус")).replace("", "штатно работает"),
+                "birth_date": birth_date.dt.date.astype(object).where(birth_date.notna(), None),
+                "department": _text(self._column(df, "Отдел")),
+                "position": _text(self._column(df, "Должность")),
+                "skills": _text(self._column(df, "Навыки")),
+            }
+        )
+        return frame[frame["full_name"] != ""]
+
+    def _departments(self, frame) -> dict:
+        names = set(frame["department"]) - {""}
+        Department.objects.bulk_create(
+            [Department(name=name) for name in names], ignore_conflicts=True
+        )
+        result = {}
+        for chunk in _chunks(names):
+            result.update({d.name: d for d in Department.objects.filter(name__in=chunk)})
+        return result
+
+    def _positions(self, frame, departments) -> dict:
+        rows = frame[frame["position"] != ""]
+        # Отдел должности — последний непустой из файла (как при построчном импорте).
+        with_department = rows[rows["department"] != ""]
+        position_department = with_department.groupby("position")["department"].last().to_dict()
+        names = set(rows["position"])
+
+        Position.objects.bulk_create(
+            [
+                Position(name=name, department=departments.get(position_department.get(name)))
+                for name in names
+            ],
+            ignore_conflicts=True,
+        )
+        positions = {}
+        for chunk in _chunks(names):
+            positions.update({p.name: p for p in Position.objects.filter(name__in=chunk)})
+
+        to_update = []
+        for name, dept_name in position_department.items():
+            position = positions[name]
+            department = departments[dept_name]
+            if position.department_id != department.pk:
+                position.department = department
+                to_update.append(position)
+        Position.objects.bulk_update(to_update, ["department"])
+        return positions
+
+    def _skills(self, links) -> dict:
+        names = set(links["skill"])
+        existing = {}
+        for chunk in _chunks(names):
+            for skill in Skill.objects.filter(name__in=chunk).order_by("id"):
+                existing.setdefault(skill.name, skill)
+        missing = names - set(existing)
+        Skill.objects.bulk_create(
+            [Skill(name=name, code=name.lower().replace(" ", "_")) for name in missing],
+            ignore_conflicts=True,
+        )
+        for chunk in _chunks(missing):
+            for skill in Skill.objects.filter(name__in=chunk).order_by("id"):
+                existing.setdefault(skill.name, skill)
+        return existing
+
+    def _employees(self, frame, positions):
+        rows = frame.drop_duplicates(subset="full_name", keep="last")
+        existing = {}
+        for chunk in _chunks(rows["full_name"]):
+            for employee in Employee.objects.filter(full_name__in=chunk).order_by("id"):
+                existing.setdefault(employee.full_name, employee)
+
+        fields = ["phone", "status", "birth_date", "main_position"]
+        to_create, to_update = [], []
+        for row in rows.itertuples(index=False):
+            position = positions.get(row.position)
+            # Сравниваем id, а не объект: иначе каждая строка дочитывает должность из базы.
+            values = {
+                "phone": row.phone,
+                "status": row.status,
+                "birth_date": row.birth_date,
+                "main_position_id": position.pk if position else None,
+            }
+            employee = existing.get(row.full_name)
+            if employee is None:
+                to_create.append(Employee(full_name=row.full_name, **values))
+                continue
+            changed = False
+            for field, value in values.items():
+                if getattr(employee, field) != value:
+                    setattr(employee, field, value)
+                    changed = True
+            if changed:
+                to_update.append(employee)
+
+        Employee.objects.bulk_create(to_create)
+        Employee.objects.bulk_update(to_update, fields)
+
+        # id новых записей не все бэкенды возвращают из bulk_create — дочитываем.
+        for chunk in _chunks(employee.full_name for employee in to_create):
+            for employee in Employee.objects.filter(full_name__in=chunk).order_by("id"):
+                existing.setdefault(employee.full_name, employee)
+        return existing, len(to_create), len(to_update)
+
     def handle(self, *args, **options):
         provided_path = options.get("file")
         default_path = os.path.join(settings.BASE_DIR, "data", "employees.xlsx")
@@ -32,65 +166,55 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f"❌ {error_msg}"))
             return
 
+        timings = {}
+        started = time.perf_counter()
         df = pd.read_excel(file_path)
         self.stdout.write(self.style.WARNING(f"📂 Импорт начат из файла: {file_path}"))
-
-        total = 0
-
-        for _, row in df.iterrows():
-            fio = row.get('ФИО')
-            if not fio or pd.isna(fio):
-                continue
-
-            phone = str(row.get('Телефон')) if pd.notna(row.get('Телефон')) else None
-            status = row.get('Статус', 'штатно работает')
-            birth_date = row.get('Дата рождения') or row.get('Дата', None)
-            dept_name = row.get('Отдел')
-            position_name = row.get('Должность')
-            skills_str = row.get('Навыки', '')
-
-            # === Отдел ===
-            department = None
-            if pd.notna(dept_name) and str(dept_name).strip():
-                department, _ = Department.objects.get_or_create(name=str(dept_name).strip())
-
-            # === Должность ===
-            position = None
-            if pd.notna(position_name) and str(position_name).strip():
-                position, _ = Position.objects.get_or_create(
-                    name=str(position_name).strip(),
-                    defaults={"department": department}
-                )
-                if department and position.department != department:
-                    position.department = department
-                    position.save()
-
-            # === Сотрудник ===
-            employee, _ = Employee.objects.update_or_create(
-                full_name=fio.strip(),
-                defaults={
-                    "phone": phone,
-                    "status": status,
-                    "birth_date": birth_date,
-                    "main_position": position,
-                }
-            )
-
-            # === Навыки ===
-            if pd.notna(skills_str) and skills_str.strip():
-                skill_names = [s.strip() for s in str(skills_str).split(',')]
-                for skill_name in skill_names:
-                    skill_obj, _ = Skill.objects.get_or_create(
-                        name=skill_name,
-                        defaults={"code": skill_name.lower().replace(" ", "_")}
-                    )
-                    EmployeeSkill.objects.get_or_create(
-                        employee=employee,
-                        skill=skill_obj,
-                        defaults={"is_primary": False}
+        timings["чтение"] = time.perf_counter() - started
+
+        phase = time.perf_counter()
+        frame = self._normalize(df)
+        links = (
+            frame[["full_name", "skills"]]
+            .assign(skill=frame["skills"].str.split(","))
+            .explode("skill")
+        )
+        links["skill"] = links["skill"].fillna("").str.strip()
+        links = links[links["skill"] != ""].drop_duplicates(subset=["full_name", "skill"])
+        timings["подготовка"] = time.perf_counter() - phase
+
+        with transaction.atomic():
+            phase = time.perf_counter()
+            departments = self._departments(frame)
+            positions = self._positions(frame, departments)
+            skills = self._skills(links)
+            timings["справочники"] = time.perf_counter() - phase
+
+            phase = time.perf_counter()
+            employees, created, updated = self._employees(frame, positions)
+            timings["сотрудники"] = time.perf_counter() - phase
+
+            phase = time.perf_counter()
+            EmployeeSkill.objects.bulk_create(
+                [
+                    EmployeeSkill(
+                        employee=employees[row.full_name],
+                        skill=skills[row.skill],
+                        is_primary=False,
                     )
+                    for row in links.itertuples(index=False)
+                ],
+                ignore_conflicts=True,
+            )
+            timings["навыки"] = time.perf_counter() - phase
 
-            total += 1
-            self.stdout.write(self.style.SUCCESS(f"✅ {fio} импортирован"))
-
-        self.stdout.write(self.style.SUCCESS(f"\nИмпорт завершён успешно. Добавлено/обновлено {total} сотрудников ✅"))
+        total = frame["full_name"].nunique()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nИмпорт завершён успешно. Добавлено/обновлено {total} сотрудников ✅ "
+                f"(новых: {created}, изменённых: {updated})"
+            )
+        )
+        self.stdout.write(
+            "Время: " + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in timings.items())
+        )
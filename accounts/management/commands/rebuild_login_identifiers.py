@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import LoginIdentifier
+
+BATCH = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает таблицу идентификаторов входа (логин/email) по auth_user. "
+        "Нужна после правок пользователей в обход моделей."
+    )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("pk").only("pk", "username", "email")
+        with transaction.atomic():
+            LoginIdentifier.objects.all().delete()
+            batch = []
+            for user in users.iterator(chunk_size=BATCH):
+                batch.extend(LoginIdentifier.for_user(user))
+                if len(batch) >= BATCH:
+                    LoginIdentifier.objects.bulk_create(batch)
+                    batch = []
+            LoginIdentifier.objects.bulk_create(batch)
+        self.stdout.write(
+            self.style.SUCCESS(f"Идентификаторов входа: {LoginIdentifier.objects.count()}")
+        )
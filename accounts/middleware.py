@@ -0,0 +1,82 @@
+from asgiref.sync import sync_to_async
+from django.contrib import auth
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+from .models import Employee
+
+# Кэшируется только профиль сотрудника с должностью и отделом; сам пользователь
+# (активность, хэш пароля для сессии) всегда читается из базы через auth.get_user.
+# Сброс виден всем процессам только при общем кэше (Redis/Memcached): с LocMem
+# правка должности или отдела доходит до других воркеров через USER_CACHE_TIMEOUT.
+USER_CACHE_TIMEOUT = 15 * 60
+USER_CACHE_VERSION_KEY = "accounts:user-cache-version"
+# Маркер «профиля нет»: None от cache.get означает промах.
+NO_PROFILE = "-"
+
+
+def _profile_cache_key(user_id) -> str:
+    # Версия общая для всех: правка должности или отдела сбрасывает всех разом.
+    version = cache.get(USER_CACHE_VERSION_KEY, 0)
+    return f"accounts:profile:{version}:{user_id}"
+
+
+def invalidate_cached_user(user_id) -> None:
+    """Сбрасывает профиль после коммита: иначе параллельный запрос успеет
+    закэшировать ещё не изменённые строки, а откат оставит сброшенный кэш."""
+    if user_id is not None:
+        transaction.on_commit(lambda: cache.delete(_profile_cache_key(user_id)))
+
+
+def _bump_version() -> None:
+    try:
+        cache.incr(USER_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(USER_CACHE_VERSION_KEY, 1, None)
+
+
+def invalidate_cached_users() -> None:
+    transaction.on_commit(_bump_version)
+
+
+def get_cached_user(request):
+    """Пользователь сессии (``auth.get_user`` — все его проверки) с профилем
+    сотрудника, должностью и отделом из кэша."""
+    user = auth.get_user(request)
+    if not user.is_authenticated:
+        return user
+
+    key = _profile_cache_key(user.pk)
+    employee = cache.get(key)
+    if employee is None:
+        employee = (
+            Employee.objects.select_related("main_position__department")
+            .filter(user_id=user.pk)
+            .first()
+        ) or NO_PROFILE
+        cache.set(key, employee, USER_CACHE_TIMEOUT)
+    if employee == NO_PROFILE:
+        employee = None
+    else:
+        Employee.user.field.set_cached_value(employee, user)
+    Employee.user.field.remote_field.set_cached_value(user, employee)
+    return user
+
+
+class CachedUserMiddleware:
+    """Подменяет ``request.user`` из AuthenticationMiddleware на версию с
+    профилем из кэша. Ставится сразу после ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+        async def auser():
+            return await sync_to_async(get_cached_user)(request)
+
+        request.auser = auser
+        return self.get_response(request)
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:47
+
+import graceproject.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+def search_key(value):
+    # Копия graceproject.fields.search_key на момент миграции.
+    return " ".join(str(value or "").split()).casefold()
+
+
+def fill_search_keys(apps, schema_editor):
+    Employee = apps.get_model("accounts", "Employee")
+    employees = list(Employee.objects.only("id", "full_name"))
+    for employee in employees:
+        employee.full_name_key = search_key(employee.full_name)[:200]
+    Employee.objects.bulk_update(employees, ["full_name_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="employee",
+            name="full_name_key",
+            field=graceproject.fields.SearchKeyField(max_length=200, source="full_name"),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["full_name_key"], name="accounts_employee_name_key_idx"
+            ),
+        ),
+    ]
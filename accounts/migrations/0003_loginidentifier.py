@@ -0,0 +1,82 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def login_key(value):
+    # Копия accounts.models.login_key на момент миграции.
+    return (value or "").strip().casefold()
+
+
+def fill_login_identifiers(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    LoginIdentifier = apps.get_model("accounts", "LoginIdentifier")
+    identifiers = []
+    for user_id, username, email in User.objects.values_list("id", "username", "email"):
+        identifiers.append(
+            LoginIdentifier(user_id=user_id, kind=1, identifier=login_key(username))
+        )
+        if email:
+            identifiers.append(
+                LoginIdentifier(user_id=user_id, kind=2, identifier=login_key(email))
+            )
+    LoginIdentifier.objects.bulk_create(identifiers, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_employee_full_name_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LoginIdentifier",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.PositiveSmallIntegerField(
+                        choices=[(1, "Логин"), (2, "Email")]
+                    ),
+                ),
+                ("identifier", models.CharField(max_length=254)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="login_identifiers",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Идентификатор входа",
+                "verbose_name_plural": "Идентификаторы входа",
+                "indexes": [
+                    models.Index(
+                        fields=["identifier", "kind", "user"],
+                        name="accounts_login_lookup_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="loginidentifier",
+            constraint=models.UniqueConstraint(
+                fields=("user", "kind"), name="accounts_login_user_kind_uniq"
+            ),
+        ),
+        migrations.RunPython(fill_login_identifiers, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from graceproject.fields import SearchKeyField
+
 User = get_user_model()
 
 
@@ -58,6 +60,7 @@ class Employee(models.Model):
         related_name="employee_profile"
     )
     full_name = models.CharField("ФИО", max_length=200, db_index=True)
+    full_name_key = SearchKeyField(source="full_name", max_length=200)
     phone = models.CharField("Телефон", max_length=32, blank=True)
     birth_date = models.DateField("Дата рождения", null=True, blank=True)
     status = models.CharField("Статус", max_length=20, default="штатно работает")
@@ -77,6 +80,9 @@ class Employee(models.Model):
     class Meta:
         verbose_name = "Сотрудник"
         verbose_name_plural = "Сотрудники"
+        indexes = [
+            models.Index(fields=["full_name_key"], name="accounts_employee_name_key_idx"),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -97,3 +103,52 @@ class EmployeeSkill(models.Model):
 
     def __str__(self):
         return f"{self.employee.full_name} - {self.skill.name}"
+
+
+def login_key(value) -> str:
+    """Логин или email в нормализованном виде: без пробелов по краям и регистра."""
+    return (value or "").strip().casefold()
+
+
+class LoginIdentifier(models.Model):
+    """Нормализованные логины и email пользователей для входа одним индексным поиском.
+
+    Поддерживается сигналом на сохранение пользователя; правки ``auth_user`` в обход
+    модели (``update()``, SQL) требуют ``manage.py rebuild_login_identifiers``.
+    """
+
+    class Kind(models.IntegerChoices):
+        # Порядок важен: при совпадении логин приоритетнее email.
+        USERNAME = 1, "Логин"
+        EMAIL = 2, "Email"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="login_identifiers")
+    kind = models.PositiveSmallIntegerField(choices=Kind.choices)
+    identifier = models.CharField(max_length=254)
+
+    class Meta:
+        verbose_name = "Идентификатор входа"
+        verbose_name_plural = "Идентификаторы входа"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "kind"], name="accounts_login_user_kind_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["identifier", "kind", "user"], name="accounts_login_lookup_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.identifier} ({self.get_kind_display()})"
+
+    @classmethod
+    def for_user(cls, user) -> list:
+        identifiers = [cls(user_id=user.pk, kind=cls.Kind.USERNAME, identifier=login_key(user.username))]
+        if user.email:
+            identifiers.append(cls(user_id=user.pk, kind=cls.Kind.EMAIL, identifier=login_key(user.email)))
+        return identifiers
+
+    @classmethod
+    def sync(cls, users) -> None:
+        """Пересобирает идентификаторы для ``users``."""
+        users = list(users)
+        cls.objects.filter(user__in=[user.pk for user in users]).delete()
+        cls.objects.bulk_create([identifier for user in users for identifier in cls.for_user(user)])
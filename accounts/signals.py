@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .middleware import invalidate_cached_user, invalidate_cached_users
+from .models import Department, Employee, LoginIdentifier, Position
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Вход обновляет только last_login — идентификаторы пересобирать незачем.
+    if raw or (update_fields is not None and not {"username", "email"} & set(update_fields)):
+        return
+    LoginIdentifier.sync([instance])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_init, sender=Employee)
+def employee_loaded(sender, instance, **kwargs):
+    # Профиль могли перепривязать к другому пользователю — сбросить нужно обоих.
+    instance._cached_user_id = instance.user_id
+
+
+@receiver([post_save, post_delete], sender=Employee)
+def employee_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+    if instance._cached_user_id != instance.user_id:
+        invalidate_cached_user(instance._cached_user_id)
+    instance._cached_user_id = instance.user_id
+
+
+@receiver([post_save, post_delete], sender=Position)
+@receiver([post_save, post_delete], sender=Department)
+def position_changed(sender, **kwargs):
+    invalidate_cached_users()
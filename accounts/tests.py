@@ -1,3 +1,166 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import Workbook
+
+from .models import Department, Employee, EmployeeSkill, Position, Skill
+
+User = get_user_model()
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class EmailOrUsernameBackendTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("Alice", "alice@x.kz", "alice-pass")
+
+    def test_username_and_email_fold_case_and_whitespace(self):
+        self.assertEqual(authenticate(username="  aLiCe ", password="alice-pass"), self.alice)
+        self.assertEqual(authenticate(username="ALICE@X.KZ ", password="alice-pass"), self.alice)
+        self.assertIsNone(authenticate(username="alice", password="wrong"))
+
+    def test_unknown_login(self):
+        self.assertIsNone(authenticate(username="nobody@x.kz", password="alice-pass"))
+
+    def test_shared_email(self):
+        bob = User.objects.create_user("bob", "alice@x.kz", "bob-pass")
+        self.assertEqual(authenticate(username="alice@x.kz", password="alice-pass"), self.alice)
+        self.assertEqual(authenticate(username="alice@x.kz", password="bob-pass"), bob)
+
+    def test_username_wins_over_other_users_email(self):
+        # Логин одного пользователя совпадает с email другого.
+        User.objects.create_user("same@x.kz", "owner@x.kz", "owner-pass")
+        other = User.objects.create_user("other", "same@x.kz", "other-pass")
+        self.assertIsNone(authenticate(username="same@x.kz", password="other-pass"))
+        self.assertEqual(authenticate(username="other", password="other-pass"), other)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class CachedUserMiddlewareTests(TestCase):
+    url = reverse("accounts:profile")
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", "alice@x.kz", "alice-pass")
+        position = Position.objects.create(name="Печатник", department=Department.objects.create(name="Цех"))
+        self.employee = Employee.objects.create(full_name="Алиса", user=self.user, main_position=position)
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+
+    def test_profile_from_cache(self):
+        # Из базы читается только сам пользователь; сессия и профиль — из кэша.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Алиса")
+        self.assertContains(response, "Печатник, Цех")
+
+    def test_auth_state_is_not_cached(self):
+        # update() не шлёт сигналов: деактивация всё равно видна сразу.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_password_change_logs_out(self):
+        self.user.set_password("new-pass")
+        User.objects.filter(pk=self.user.pk).update(password=self.user.password)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_profile_dropped_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee.full_name = "Алиса Иванова"
+            self.employee.save()
+        self.assertContains(self.client.get(self.url), "Алиса Иванова")
+
+    def test_rollback_keeps_cache(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                Position.objects.create(name="Монтажник")
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+
+class ImportEmployeesTests(TestCase):
+    header = ["ФИО", "Телефон", "Статус", "Дата рождения", "Отдел", "Должность", "Навыки"]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.printer = Position.objects.create(name="Печатник")
+        self.alice = Employee.objects.create(full_name="Алиса", phone="111", main_position=self.printer)
+        self.bob = Employee.objects.create(full_name="Борис", phone="222", main_position=self.printer)
+
+    def run_import(self, rows, name="employees.xlsx"):
+        path = os.path.join(self.directory, name)
+        workbook = Workbook()
+        workbook.active.append(self.header)
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as captured:
+            call_command("import_employees", "--file", path, stdout=stdout)
+        return stdout.getvalue(), len(captured)
+
+    def test_upsert_by_full_name(self):
+        output, _ = self.run_import(
+            [
+                ("Алиса", 777, "", "05.03.1990", "Цех", "Печатник", "Печать, Ламинация"),
+                ("Борис", "222", "", None, "", "Печатник", ""),
+                ("Вера", "333", "отпуск", None, "Офис", "Менеджер", "Печать"),
+                ("", "444", "", None, "", "", ""),
+            ]
+        )
+        self.assertIn("новых: 1, изменённых: 1", output)
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.phone, "777")
+        self.assertEqual(self.alice.birth_date, date(1990, 3, 5))
+        self.printer.refresh_from_db()
+        self.assertEqual(self.printer.department.name, "Цех")
+
+        vera = Employee.objects.get(full_name="Вера")
+        self.assertEqual(vera.status, "отпуск")
+        self.assertEqual(vera.main_position.department.name, "Офис")
+        self.assertEqual(Employee.objects.count(), 3)
+        self.assertEqual(
+            set(EmployeeSkill.objects.values_list("employee__full_name", "skill__name")),
+            {("Алиса", "Печать"), ("Алиса", "Ламинация"), ("Вера", "Печать")},
+        )
+
+    def test_repeated_import_changes_nothing(self):
+        rows = [("Алиса", "111", "", None, "Цех", "Печатник", "Печать")]
+        self.run_import(rows)
+        output, _ = self.run_import(rows)
+        self.assertIn("новых: 0, изменённых: 0", output)
+        self.assertEqual(Skill.objects.count(), 1)
+        self.assertEqual(EmployeeSkill.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def rows(prefix, count):
+            # Свои названия в каждом прогоне: справочники в обоих случаях новые.
+            return [
+                (
+                    f"{prefix} {index}",
+                    str(index),
+                    "",
+                    None,
+                    f"{prefix} отдел {index % 3}",
+                    f"{prefix} должность {index % 5}",
+                    f"{prefix} навык {index % 4}, {prefix} навык {index % 7}",
+                )
+                for index in range(count)
+            ]
+
+        _, few = self.run_import(rows("А", 10), "few.xlsx")
+        _, many = self.run_import(rows("Б", 80), "many.xlsx")
+        self.assertEqual(few, many)
@@ -0,0 +1,136 @@
+from asyncio import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = "replica"
+# Приложения, чтение которых можно отдавать реплике. Сессии, пользователи и
+# contenttypes всегда читаются с основной базы: там важна свежесть.
+REPLICA_APPS = {"portal", "accounts"}
+# Кука после записи: следующие несколько секунд пользователь читает с основной
+# базы и видит свои изменения, даже если реплика отстаёт.
+PIN_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_read_alias = ContextVar("read_alias", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _reads_from_replica(request) -> bool:
+    return (
+        replica_configured()
+        and request.method in SAFE_METHODS
+        and not request.COOKIES.get(PIN_COOKIE)
+    )
+
+
+def use_replica(view):
+    """Чтения ORM внутри представления идут на реплику (только GET/HEAD).
+
+    Записи по-прежнему уходят на основную базу; после записи ``ReplicaPinMiddleware``
+    ставит куку, и на ``DATABASE_REPLICA_PIN_SECONDS`` чтение остаётся на основной базе.
+    Подходит и для асинхронных представлений.
+    """
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not _reads_from_replica(request):
+                return await view(request, *args, **kwargs)
+            token = _read_alias.set(REPLICA_ALIAS)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _reads_from_replica(request):
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(REPLICA_ALIAS)
+        try:
+            response = view(request, *args, **kwargs)
+            if getattr(response, "streaming", False):
+                # Потоковый ответ читает базу уже после выхода из представления.
+                response.streaming_content = _on_replica(response.streaming_content)
+            return response
+        finally:
+            _read_alias.reset(token)
+
+    return wrapper
+
+
+def _on_replica(chunks):
+    iterator = iter(chunks)
+    while True:
+        token = _read_alias.set(REPLICA_ALIAS)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield chunk
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут на основную базу, даже в ``use_replica``.
+
+    Для пересборки кэша после сброса: данные, которых реплика ещё не получила,
+    иначе закэшировались бы на весь таймаут.
+    """
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaPinMiddleware:
+    """После успешной записи (любой не-GET/HEAD/OPTIONS без ошибки) ставит куку,
+    чтобы следующий запрос, обычно редирект, читал с основной базы."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            replica_configured()
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class ReplicaRouter:
+    """Чтение — с реплики внутри ``use_replica``, всё остальное — с основной базы."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias and model._meta.app_label in REPLICA_APPS and alias in settings.DATABASES:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной базы, связи между ними допустимы.
+        return True
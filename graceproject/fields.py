@@ -0,0 +1,37 @@
+from django.db import models
+
+
+def search_key(value) -> str:
+    """Ключ для поиска по началу строки: без учёта регистра и лишних пробелов."""
+    return " ".join(str(value or "").split()).casefold()
+
+
+class SearchKeyField(models.CharField):
+    """Нормализованная копия поля ``source``, по которой ищут через индекс.
+
+    Заполняется при ``save()`` и ``bulk_create()``; ``bulk_update()`` и
+    ``QuerySet.update()`` поле не пересчитывают — его нужно передать явно.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault("max_length", 255)
+        kwargs.setdefault("editable", False)
+        kwargs.setdefault("default", "")
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        if kwargs.get("editable") is False:
+            kwargs.pop("editable")
+        if kwargs.get("default") == "":
+            kwargs.pop("default")
+        if kwargs.get("max_length") == 255:
+            kwargs.pop("max_length")
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = search_key(getattr(model_instance, self.source))[: self.max_length]
+        setattr(model_instance, self.attname, value)
+        return value
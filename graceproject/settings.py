@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -33,11 +34,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'portal.instrumentation.QueryInstrumentationMiddleware',  # включается PORTAL_INSTRUMENTATION
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedUserMiddleware',  # пользователь и профиль из кэша
+    'graceproject.db_routers.ReplicaPinMiddleware',  # после записи — чтение с основной базы
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,6 +72,16 @@ WSGI_APPLICATION = 'graceproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Профиль базы выбирается переменной GRACE_DB_PROFILE:
+#   sqlite (по умолчанию) — один файл db.sqlite3;
+#   sqlite-replica — алиас 'replica', чтобы локально проверить маршрутизацию
+#       чтения; по умолчанию это тот же db.sqlite3, отдельный файл задаёт
+#       DB_REPLICA_NAME (его нужно заполнить копией основной базы:
+#       sqlite3 db.sqlite3 ".backup db_replica.sqlite3");
+#   mysql — MySQL (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT); если задан
+#       DB_REPLICA_HOST, тяжёлые страницы читают с реплики.
+DB_PROFILE = os.environ.get('GRACE_DB_PROFILE', 'sqlite')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -75,6 +89,98 @@ DATABASES = {
     }
 }
 
+if DB_PROFILE == 'sqlite-replica':
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_REPLICA_NAME', BASE_DIR / 'db.sqlite3'),
+        # В тестах реплика — та же тестовая база.
+        'TEST': {'MIRROR': 'default'},
+    }
+elif DB_PROFILE == 'mysql':
+    _mysql = {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': os.environ.get('DB_NAME', 'grace'),
+        'USER': os.environ.get('DB_USER', 'grace'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('DB_PORT', '3306'),
+        # Постоянные соединения: без них каждый запрос заново подключается к MySQL.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'charset': 'utf8mb4',
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            'isolation_level': 'read committed',
+        },
+    }
+    DATABASES = {'default': _mysql}
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **_mysql,
+            'HOST': os.environ['DB_REPLICA_HOST'],
+            'PORT': os.environ.get('DB_REPLICA_PORT', _mysql['PORT']),
+            'USER': os.environ.get('DB_REPLICA_USER', _mysql['USER']),
+            'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', _mysql['PASSWORD']),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Главная и отчёт выполняют независимые запросы параллельно (portal/concurrency.py).
+# Имеет смысл только с сервером БД: SQLite в процессе упирается в GIL.
+PORTAL_CONCURRENT_QUERIES = DB_PROFILE == 'mysql'
+
+# Чтение в представлениях с @use_replica уходит на алиас 'replica', если он задан;
+# после записи пользователь столько секунд читает с основной базы.
+DATABASE_ROUTERS = ['graceproject.db_routers.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+# PRAGMA для каждого нового соединения SQLite (portal/sqlite.py): ожидание
+# блокировки до busy_timeout мс вместо «database is locked», mmap и кэш страниц
+# побольше. busy_timeout идёт первым: смене journal_mode нужна блокировка файла.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # отрицательное — в КиБ, т.е. 64 МиБ
+}
+# WAL (сохранение расхода или брака не блокирует читателей) записывается в
+# заголовок файла базы, поэтому для db.sqlite3 из репозитория он выключен;
+# на рабочей базе включается переменной GRACE_SQLITE_WAL=1. synchronous=NORMAL
+# безопасен только в WAL.
+if os.environ.get('GRACE_SQLITE_WAL'):
+    SQLITE_PRAGMAS.update({'journal_mode': 'wal', 'synchronous': 'normal'})
+
+# Кэш для снимков дашборда, сессий и профилей сотрудников. LocMemCache живёт в
+# пределах процесса: сброс кэша после записи другие воркеры не видят. При
+# нескольких воркерах нужен общий бэкенд (Redis/Memcached).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'grace-portal',
+    }
+}
+
+# Счётчик запросов к БД и времени ответа по каждому запросу (portal/instrumentation.py).
+# Запросы сверх порогов пишутся в лог portal.instrumentation.
+PORTAL_INSTRUMENTATION = False
+PORTAL_INSTRUMENTATION_MAX_QUERIES = 30
+PORTAL_INSTRUMENTATION_SLOW_MS = 500
+PORTAL_INSTRUMENTATION_DUPLICATES = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'portal.instrumentation': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'portal.thumbnails': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Сессии читаются из кэша, в БД пишутся только изменения (cached_db).
+# Для прежнего поведения: 'django.contrib.sessions.backends.db'.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -121,6 +227,21 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Превью фото чеков (portal/thumbnails.py): строятся в фоновых потоках после
+# сохранения расхода. Размер — максимальные ширина и высота в пикселях.
+PORTAL_THUMBNAIL_SIZE = (480, 480)
+PORTAL_THUMBNAIL_QUALITY = 70
+PORTAL_THUMBNAIL_WORKERS = 2
+
+# Вложения отдаются только через portal:expense_file (вход обязателен). Право,
+# которое дополнительно нужно для просмотра, например 'portal.view_expense'.
+PORTAL_ATTACHMENT_PERMISSION = None
+# Отдача файла веб-сервером после проверки доступа: None — сам Django (FileResponse
+# с Range), 'x-accel-redirect' — nginx (internal location по префиксу ниже, алиас
+# на MEDIA_ROOT), 'x-sendfile' — Apache mod_xsendfile.
+PORTAL_MEDIA_OFFLOAD = None
+PORTAL_MEDIA_ACCEL_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
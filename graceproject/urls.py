@@ -1,5 +1,3 @@
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
@@ -7,4 +5,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('accounts.urls')),
     path('', include('portal.urls')),  # Django сам зарегистрирует "portal" через app_name
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+# MEDIA_URL намеренно не раздаётся: вложения расходов отдаёт portal:expense_file
+# с проверкой доступа (см. PORTAL_MEDIA_OFFLOAD для nginx/Apache).
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
 
 from .models import (
     Client,
@@ -9,6 +11,7 @@ from .models import (
     InventoryItem,
     InventoryMovement,
     InventoryUsage,
+    MonthlyRollup,
     Order,
     OrderItem,
 )
@@ -51,6 +54,8 @@ class InventoryItemAdmin(admin.ModelAdmin):
         "category",
         "base_unit",
         "quantity_on_hand",
+        "reorder_level",
+        "days_of_cover",
         "package_size",
         "default_unit_price",
         "location",
@@ -63,6 +68,7 @@ class InventoryItemAdmin(admin.ModelAdmin):
 @admin.register(InventoryMovement)
 class InventoryMovementAdmin(admin.ModelAdmin):
     list_display = ("item", "direction", "quantity", "reason", "created_at")
+    list_select_related = ("item",)
     list_filter = ("direction", "created_at")
 
 
@@ -71,11 +77,21 @@ class ExpenseAdmin(admin.ModelAdmin):
     list_display = ("supplier_name", "expense_date", "amount", "created_at")
     list_filter = ("expense_date",)
     search_fields = ("supplier_name", "description")
+    readonly_fields = ("attachment_link",)
+
+    @admin.display(description="Открыть файл")
+    def attachment_link(self, obj):
+        # MEDIA_URL не раздаётся — ссылка на представление с проверкой доступа.
+        if not obj.pk or not obj.attachment:
+            return "—"
+        url = reverse("portal:expense_file", args=[obj.pk, "file"])
+        return format_html('<a href="{}" target="_blank">{}</a>', url, obj.attachment.name)
 
 
 @admin.register(InventoryUsage)
 class InventoryUsageAdmin(admin.ModelAdmin):
     list_display = ("usage_date", "item", "quantity", "project", "comment", "created_at")
+    list_select_related = ("item", "project")
     list_filter = ("usage_date", "item")
     search_fields = ("item__name", "comment", "project__title")
 
@@ -91,4 +107,17 @@ class DefectRecordAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = ("report_date", "project", "responsible", "status")
+    list_select_related = ("project", "responsible")
     search_fields = ("project__title", "responsible__full_name", "comment")
+
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ("month", "order_count", "income", "expense", "net", "updated_at")
+    date_hierarchy = "month"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from graceproject.db_routers import primary_reads
+
+from .models import DefectRecord, Expense, InventoryUsage, Order
+
+# Модель -> поле даты, по которому страницы листаются помесячно.
+MONTH_FIELDS = {
+    Order: "created_at",
+    Expense: "expense_date",
+    InventoryUsage: "usage_date",
+    DefectRecord: "report_date",
+}
+ARCHIVE_CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(model) -> str:
+    return f"portal:archive-months:{model._meta.label_lower}"
+
+
+def get_archive_months(model) -> list:
+    """Месяцы (первые числа, по убыванию), в которых у модели есть записи."""
+    key = _cache_key(model)
+    months = cache.get(key)
+    if months is None:
+        with primary_reads():
+            months = list(
+                model.objects.order_by().dates(MONTH_FIELDS[model], "month", order="DESC")
+            )
+        cache.set(key, months, ARCHIVE_CACHE_TIMEOUT)
+    return months
+
+
+def merge_archive_months(*models) -> list:
+    months = set()
+    for model in models:
+        months.update(get_archive_months(model))
+    return sorted(months, reverse=True)
+
+
+def invalidate_archive_months(model) -> None:
+    """Сбрасывает список после коммита, как и версии фрагментов в ``versions``."""
+    key = _cache_key(model)
+    transaction.on_commit(lambda: cache.delete(key))
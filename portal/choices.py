@@ -0,0 +1,121 @@
+import copy
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.validators import EMPTY_VALUES
+from django.forms.models import ModelChoiceIteratorValue
+from django.urls import reverse_lazy
+
+
+class SelectedObjects:
+    """Выбранные объекты одного поля во всех формах формсета (или в одной форме).
+
+    Значения всех форм читаются одним запросом ``pk__in`` при первом обращении;
+    результат общий для проверки и для рендера ``RemoteSelect``.
+    """
+
+    def __init__(self, queryset, name, forms):
+        self.queryset = queryset
+        self.name = name
+        self.forms = forms
+        self._keys = None
+        self._objects = {}
+
+    def _key(self, value):
+        if isinstance(value, self.queryset.model):
+            return value.pk
+        if value in EMPTY_VALUES:
+            return None
+        try:
+            return self.queryset.model._meta.pk.to_python(value)
+        except ValidationError:
+            return None
+
+    def _load(self, keys) -> None:
+        keys = {key for key in keys if key is not None} - self._keys
+        if keys:
+            self._objects.update(self.queryset.in_bulk(keys))
+            self._keys |= keys
+
+    def get(self, value):
+        if self._keys is None:
+            self._keys = set()
+            values = [form[self.name].value() for form in self.forms()]
+            self._load(map(self._key, values))
+        key = self._key(value)
+        # Значение не из данных форм (например, clean() вызван напрямую).
+        self._load([key])
+        return self._objects.get(key)
+
+
+class RemoteModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField для ``RemoteSelect``: полный список вариантов не
+    строится, варианты ищет ``portal:lookup``, а значение проверяется по базе
+    через ``SelectedObjects`` — один запрос на поле формы или формсета."""
+
+    selected = None
+
+    def __deepcopy__(self, memo):
+        result = super().__deepcopy__(memo)
+        result.selected = None
+        return result
+
+    def get_bound_field(self, form, field_name):
+        if self.selected is None:
+            self.selected = SelectedObjects(self.queryset, field_name, lambda: [form])
+        return super().get_bound_field(form, field_name)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        obj = self.selected.get(value) if self.selected else super().to_python(value)
+        if obj is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
+    def selected_choices(self, values) -> list:
+        """Пустой вариант и только выбранные объекты — для ``RemoteSelect``."""
+        choices = [] if self.empty_label is None else [("", self.empty_label)]
+        for value in values:
+            obj = self.selected.get(value) if self.selected else None
+            if obj is not None:
+                choices.append((ModelChoiceIteratorValue(obj.pk, obj), str(obj)))
+        return choices
+
+
+class RemoteChoiceFormSet(forms.BaseFormSet):
+    """Формсет, в котором каждое поле ``RemoteModelChoiceField`` читает выбранные
+    объекты всех строк одним запросом, а не по запросу на строку."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._selected = {}
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        for name, field in form.fields.items():
+            if isinstance(field, RemoteModelChoiceField):
+                if name not in self._selected:
+                    self._selected[name] = SelectedObjects(field.queryset, name, lambda: self.forms)
+                field.selected = self._selected[name]
+        return form
+
+
+class RemoteSelect(forms.Select):
+    """Select, в который выводится только выбранный вариант; остальные
+    подгружаются скриптом ``portal/js/lookup.js`` из ``portal:lookup``."""
+
+    template_name = "portal/widgets/remote_select.html"
+
+    def __init__(self, lookup, attrs=None):
+        attrs = {"data-lookup-url": reverse_lazy("portal:lookup", args=[lookup]), **(attrs or {})}
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        widget = copy.copy(self)
+        widget.choices = self.choices.field.selected_choices(value)
+        return super(RemoteSelect, widget).optgroups(name, value, attrs)
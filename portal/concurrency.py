@@ -0,0 +1,46 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .instrumentation import record_thread_queries
+
+
+def _in_transaction() -> bool:
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def _own_connection(call):
+    @wraps(call)
+    def run():
+        try:
+            with record_thread_queries():
+                return call()
+        finally:
+            # Поток из пула: соединение закрывается по тем же правилам
+            # CONN_MAX_AGE, что и в конце обычного запроса.
+            close_old_connections()
+
+    return run
+
+
+async def gather_queries(*calls) -> list:
+    """Выполняет независимые функции с запросами к БД одновременно.
+
+    Асинхронный ORM Django 5.0 выполняет все запросы в одном потоке по очереди,
+    поэтому каждая функция здесь идёт в отдельном потоке со своим соединением.
+    Выигрыш есть только с сервером БД (``PORTAL_CONCURRENT_QUERIES``): SQLite
+    работает в процессе и держит GIL, там вызовы остаются последовательными.
+    Внутри транзакции тоже: другие соединения не видят её данных.
+    """
+    if getattr(settings, "PORTAL_CONCURRENT_QUERIES", False) and not await sync_to_async(
+        _in_transaction
+    )():
+        return list(
+            await asyncio.gather(
+                *(sync_to_async(_own_connection(call), thread_sensitive=False)() for call in calls)
+            )
+        )
+    return await sync_to_async(lambda: [call() for call in calls])()
@@ -0,0 +1,42 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from graceproject.db_routers import primary_reads
+
+from .models import Order
+
+DASHBOARD_CACHE_KEY = "portal:dashboard:snapshot"
+# Снимок сбрасывается сигналами, таймаут — страховка на случай массовых
+# изменений через queryset.update(), которые сигналы не отправляют.
+DASHBOARD_CACHE_TIMEOUT = 60 * 15
+
+
+def _build_snapshot() -> dict:
+    status_counts = dict(
+        Order.objects.order_by()
+        .values("status")
+        .annotate(count=Count("id"))
+        .values_list("status", "count")
+    )
+    return {
+        "status_counts": status_counts,
+        "total": sum(status_counts.values()),
+    }
+
+
+def get_dashboard_snapshot() -> dict:
+    """Счётчики заказов по статусам для главной страницы."""
+    snapshot = cache.get(DASHBOARD_CACHE_KEY)
+    if snapshot is None:
+        # Пересборка после сброса — с основной базы: реплика могла ещё не догнать запись.
+        with primary_reads():
+            snapshot = _build_snapshot()
+        cache.set(DASHBOARD_CACHE_KEY, snapshot, DASHBOARD_CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate_dashboard_snapshot() -> None:
+    """Сбрасывает снимок после коммита: иначе параллельный запрос успеет собрать
+    его заново из ещё не закоммиченных данных, а при откате сброс не нужен."""
+    transaction.on_commit(lambda: cache.delete(DASHBOARD_CACHE_KEY))
@@ -0,0 +1,184 @@
+import csv
+import tempfile
+from datetime import MAXYEAR, MINYEAR, date, datetime, time
+from itertools import chain
+
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+from .models import DefectRecord, Expense, InventoryUsage, Order
+from .rollups import next_month, shift_month
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def _parse_month(value):
+    try:
+        year, month = [int(x) for x in value.split("-")]
+        # Конец периода — начало следующего месяца, поэтому декабрь 9999 не подходит.
+        if not MINYEAR <= year < MAXYEAR:
+            return None
+        return date(year, month, 1)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def export_range(request):
+    """Период выгрузки: ``?month=YYYY-MM`` или ``?from=YYYY-MM&to=YYYY-MM``."""
+    today = date.today()
+    start = _parse_month(request.GET.get("from")) or _parse_month(request.GET.get("month"))
+    start = start or date(today.year, today.month, 1)
+    last = _parse_month(request.GET.get("to")) or start
+    if last < start:
+        start, last = last, start
+    return start, next_month(last)
+
+
+def _orders(start, end):
+    return (
+        Order.objects.filter(
+            created_at__gte=datetime.combine(start, time.min),
+            created_at__lt=datetime.combine(end, time.min),
+        )
+        .order_by("created_at", "id")
+        .values_list("created_at", "title", "client__name", "total_amount")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def _expenses(start, end):
+    return (
+        Expense.objects.filter(expense_date__gte=start, expense_date__lt=end)
+        .order_by("expense_date", "id")
+        .values_list("expense_date", "supplier_name", "description", "amount")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def report_rows(start, end):
+    income = (
+        ("Доход", created_at.date(), title, client, amount)
+        for created_at, title, client, amount in _orders(start, end)
+    )
+    expense = (
+        ("Расход", expense_date, supplier, description, amount)
+        for expense_date, supplier, description, amount in _expenses(start, end)
+    )
+    return chain(income, expense)
+
+
+def usage_rows(start, end):
+    return (
+        InventoryUsage.objects.filter(usage_date__gte=start, usage_date__lt=end)
+        .order_by("usage_date", "created_at", "id")
+        .values_list("usage_date", "item__sku", "item__name", "quantity", "project__title", "comment")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def defect_rows(start, end):
+    statuses = dict(DefectRecord.Status.choices)
+    rows = (
+        DefectRecord.objects.filter(report_date__gte=start, report_date__lt=end)
+        .order_by("report_date", "created_at", "id")
+        .values_list("report_date", "project__title", "responsible__full_name", "comment", "status")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return (row[:-1] + (statuses.get(row[-1], row[-1]),) for row in rows)
+
+
+DATASETS = {
+    "report": {
+        "title": "Отчёт",
+        "headers": ["Тип", "Дата", "Заказ / поставщик", "Клиент / комментарий", "Сумма"],
+        "rows": report_rows,
+    },
+    "expenses": {
+        "title": "Расходы",
+        "headers": ["Дата", "Поставщик", "Комментарий", "Сумма"],
+        "rows": _expenses,
+    },
+    "usage": {
+        "title": "Списания",
+        "headers": ["Дата", "SKU", "Материал", "Количество", "Проект", "Комментарий"],
+        "rows": usage_rows,
+    },
+    "defects": {
+        "title": "Брак",
+        "headers": ["Дата", "Проект", "Ответственный", "Комментарий", "Статус"],
+        "rows": defect_rows,
+    },
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, date):
+        return value.strftime("%d.%m.%Y")
+    return value
+
+
+def stream_csv(headers, rows, filename):
+    writer = csv.writer(Echo(), delimiter=";")
+
+    def generate():
+        # BOM, чтобы Excel открыл кириллицу без мастера импорта.
+        yield "\ufeff" + writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow([_csv_value(value) for value in row])
+
+    response = StreamingHttpResponse(generate(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(title, headers, rows, filename):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title)
+    sheet.append(headers)
+
+    def cell(value):
+        if value is None:
+            return ""
+        if isinstance(value, date):
+            date_cell = WriteOnlyCell(sheet, value=value)
+            date_cell.number_format = "DD.MM.YYYY"
+            return date_cell
+        return value
+
+    for row in rows:
+        sheet.append([cell(value) for value in row])
+    # write-only режим держит в памяти одну строку; архив собирается во
+    # временном файле, который удалится после отдачи ответа.
+    buffer = tempfile.TemporaryFile()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return FileResponse(
+        buffer,
+        as_attachment=True,
+        filename=filename,
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+def export_response(request, dataset, fmt):
+    spec = DATASETS.get(dataset)
+    if spec is None or fmt not in {"csv", "xlsx"}:
+        raise Http404("Неизвестный формат выгрузки")
+    start, end = export_range(request)
+    rows = spec["rows"](start, end)
+    last_month = shift_month(end, -1)
+    period = f"{start:%Y-%m}" if last_month == start else f"{start:%Y-%m}_{last_month:%Y-%m}"
+    filename = f"{dataset}_{period}.{fmt}"
+    if fmt == "csv":
+        return stream_csv(spec["headers"], rows, filename)
+    return xlsx_response(spec["title"], spec["headers"], rows, filename)
@@ -1,6 +1,9 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from django.forms import formset_factory, modelformset_factory
+from django.utils.functional import cached_property
 
+from .choices import RemoteChoiceFormSet, RemoteModelChoiceField, RemoteSelect
 from .models import (
     Client,
     DefectRecord,
@@ -71,9 +74,54 @@ class OrderItemForm(forms.ModelForm):
         fields = ["title", "quantity", "unit_price"]
 
 
+class FormsetObjectField(forms.ModelChoiceField):
+    """Скрытое поле id строки формсета: объект берётся из уже загруженного
+    queryset формсета, а не отдельным запросом на каждую строку."""
+
+    def __init__(self, objects, *args, **kwargs):
+        self.objects = objects
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            key = self.queryset.model._meta.pk.to_python(value)
+        except ValidationError:
+            key = None
+        obj = self.objects.get(key) if key is not None else None
+        if obj is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
+
+class BaseOrderItemFormSet(forms.BaseModelFormSet):
+    @cached_property
+    def objects_by_pk(self) -> dict:
+        """Строки формсета по первичному ключу — один проход по ``get_queryset()``."""
+        return {obj.pk: obj for obj in self.get_queryset()}
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self.model._meta.pk.name
+        field = form.fields[name]
+        form.fields[name] = FormsetObjectField(
+            self.objects_by_pk,
+            field.queryset,
+            initial=field.initial,
+            required=False,
+            widget=field.widget,
+        )
+
+
 OrderItemFormSet = modelformset_factory(
     OrderItem,
     form=OrderItemForm,
+    formset=BaseOrderItemFormSet,
     extra=1,
     can_delete=True,
 )
@@ -101,11 +149,11 @@ class CalculatorSummaryForm(forms.Form):
 
 
 class CalculatorItemForm(forms.Form):
-    product = forms.ModelChoiceField(
+    product = RemoteModelChoiceField(
         queryset=InventoryItem.objects.order_by("name"),
         required=False,
         label="Материал",
-        widget=forms.Select(attrs={"class": "form-select"}),
+        widget=RemoteSelect("items", attrs={"class": "form-select"}),
     )
     description = forms.CharField(
         required=False,
@@ -136,7 +184,9 @@ class CalculatorItemForm(forms.Form):
         return cleaned
 
 
-CalculatorItemFormSet = formset_factory(CalculatorItemForm, extra=3, can_delete=True)
+CalculatorItemFormSet = formset_factory(
+    CalculatorItemForm, formset=RemoteChoiceFormSet, extra=3, can_delete=True
+)
 
 
 class ExpenseForm(forms.ModelForm):
@@ -163,8 +213,11 @@ class InventoryUsageForm(forms.ModelForm):
     class Meta:
         model = InventoryUsage
         fields = ["usage_date", "item", "quantity", "project", "comment"]
+        field_classes = {"item": RemoteModelChoiceField, "project": RemoteModelChoiceField}
         widgets = {
             "usage_date": forms.DateInput(attrs={"type": "date"}),
+            "item": RemoteSelect("items"),
+            "project": RemoteSelect("orders"),
         }
 
 
@@ -180,6 +233,9 @@ class DefectRecordForm(forms.ModelForm):
     class Meta:
         model = DefectRecord
         fields = ["report_date", "project", "responsible", "comment", "status"]
+        field_classes = {"project": RemoteModelChoiceField, "responsible": RemoteModelChoiceField}
         widgets = {
             "report_date": forms.DateInput(attrs={"type": "date"}),
+            "project": RemoteSelect("orders"),
+            "responsible": RemoteSelect("employees"),
         }
@@ -0,0 +1,132 @@
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("portal.instrumentation")
+
+DEFAULT_MAX_QUERIES = 30
+DEFAULT_SLOW_MS = 500
+# Один и тот же SQL столько раз за запрос — почти наверняка N+1.
+DEFAULT_DUPLICATE_THRESHOLD = 5
+
+
+_recorder = ContextVar("query_recorder", default=None)
+
+
+class QueryRecorder:
+    """Обёртка ``connection.execute_wrapper``: считает запросы, время и повторы SQL.
+
+    Может одновременно стоять на соединениях нескольких потоков (``gather_queries``).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            with self._lock:
+                self.count += 1
+                self.duration += elapsed
+                calls, total = self.statements.get(sql, (0, 0.0))
+                self.statements[sql] = (calls + 1, total + elapsed)
+
+    def duplicates(self, threshold: int) -> list:
+        """``[(sql, вызовов, секунд)]`` для SQL, повторённых не меньше ``threshold`` раз."""
+        groups = [
+            (sql, calls, total)
+            for sql, (calls, total) in self.statements.items()
+            if calls >= threshold
+        ]
+        return sorted(groups, key=lambda group: group[1], reverse=True)
+
+
+@contextmanager
+def _wrap_connections(recorder):
+    # ``connections`` — свои объекты соединений у каждого потока.
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield
+
+
+@contextmanager
+def record_thread_queries():
+    """Считает запросы текущего потока в счётчик запроса, если он включён.
+
+    Для рабочих потоков, у которых свои соединения (``portal.concurrency``):
+    контекст запроса доходит до них через ``sync_to_async``, а обёртки соединений — нет.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+    with _wrap_connections(recorder):
+        yield
+
+
+class QueryInstrumentationMiddleware:
+    """Число запросов, время БД, повторы SQL и время ответа для каждого запроса.
+
+    Включается ``PORTAL_INSTRUMENTATION = True``; пороги — ``PORTAL_INSTRUMENTATION_MAX_QUERIES``,
+    ``PORTAL_INSTRUMENTATION_SLOW_MS``, ``PORTAL_INSTRUMENTATION_DUPLICATES``. Нарушители
+    пишутся в лог ``portal.instrumentation``, итоги — в заголовок ``Server-Timing``.
+    Запросы рабочих потоков ``gather_queries`` учитываются вместе с запросами
+    самого запроса, включая PRAGMA новых соединений SQLite. Запросы, выполненные
+    при отдаче потокового ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PORTAL_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.max_queries = getattr(settings, "PORTAL_INSTRUMENTATION_MAX_QUERIES", DEFAULT_MAX_QUERIES)
+        self.slow_ms = getattr(settings, "PORTAL_INSTRUMENTATION_SLOW_MS", DEFAULT_SLOW_MS)
+        self.duplicate_threshold = getattr(
+            settings, "PORTAL_INSTRUMENTATION_DUPLICATES", DEFAULT_DUPLICATE_THRESHOLD
+        )
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = perf_counter()
+        token = _recorder.set(recorder)
+        try:
+            with _wrap_connections(recorder):
+                response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        wall_ms = (perf_counter() - started) * 1000
+        db_ms = recorder.duration * 1000
+        duplicates = recorder.duplicates(self.duplicate_threshold)
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={db_ms:.1f};desc="{recorder.count} queries"',
+                f"app;dur={wall_ms - db_ms:.1f}",
+                f"total;dur={wall_ms:.1f}",
+            ]
+        )
+        if recorder.count > self.max_queries or wall_ms > self.slow_ms or duplicates:
+            self._report(request, response, recorder, wall_ms, db_ms, duplicates)
+        return response
+
+    def _report(self, request, response, recorder, wall_ms, db_ms, duplicates):
+        lines = [
+            f"{request.method} {request.get_full_path()} → {response.status_code}: "
+            f"{recorder.count} запросов, БД {db_ms:.1f} мс, всего {wall_ms:.1f} мс"
+        ]
+        for sql, calls, total in duplicates[:5]:
+            lines.append(f"  ×{calls} ({total * 1000:.1f} мс): {sql[:200]}")
+        logger.warning("\n".join(lines))
@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+
+from accounts.models import Employee
+from graceproject.fields import search_key
+
+from .models import InventoryItem, Order
+from .pagination import paginate_keyset
+
+LOOKUP_PAGE_SIZE = 20
+
+
+@dataclass(frozen=True)
+class Lookup:
+    model: type
+    keys: tuple
+    ordering: tuple
+
+    def search(self, term: str):
+        queryset = self.model._default_manager.all()
+        prefix = search_key(term)
+        if prefix:
+            queryset = queryset.filter(prefix_filter(self.keys, prefix))
+        return queryset
+
+
+LOOKUPS = {
+    "items": Lookup(InventoryItem, ("name_key", "sku_key"), ("name_key", "id")),
+    "orders": Lookup(Order, ("title_key",), ("title_key", "id")),
+    "employees": Lookup(Employee, ("full_name_key",), ("full_name_key", "id")),
+}
+
+
+def prefix_filter(keys, prefix: str) -> Q:
+    """Начало строки как диапазон ``[prefix, следующий префикс)`` — такой
+    запрос читает индекс на любом бэкенде, в отличие от LIKE/ILIKE."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    condition = Q()
+    for key in keys:
+        condition |= Q(**{f"{key}__gte": prefix, f"{key}__lt": upper})
+    return condition
+
+
+def lookup_response(request, name: str) -> JsonResponse:
+    lookup = LOOKUPS.get(name)
+    if lookup is None:
+        raise Http404("Неизвестный справочник")
+    page = paginate_keyset(
+        request,
+        lookup.search(request.GET.get("q", "")),
+        lookup.ordering,
+        per_page=LOOKUP_PAGE_SIZE,
+    )
+    return JsonResponse(
+        {
+            "results": [{"id": obj.pk, "text": str(obj)} for obj in page],
+            "next": page.next_query or None,
+        },
+        json_dumps_params={"ensure_ascii": False},
+    )
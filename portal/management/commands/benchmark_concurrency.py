@@ -0,0 +1,188 @@
+import logging
+import statistics
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client as HttpClient
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from accounts.models import Employee
+from portal.models import DefectRecord, InventoryItem, InventoryUsage, Order
+
+MARKER = "benchmark_concurrency"
+# Прежнее поведение: журнал отката и полная синхронизация; ожидание блокировки —
+# стандартные 5 с модуля sqlite3.
+BASELINE_PRAGMAS = {"journal_mode": "delete", "synchronous": "full"}
+
+
+def _percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(share * (len(ordered) - 1)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает SQLite параллельными POST на usage и defects из нескольких потоков "
+        "и сравнивает прежний режим журнала с настройками SQLITE_PRAGMAS. Все потоки "
+        "делят один процесс и GIL, поэтому время чтения здесь зависит и от нагрузки на CPU."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=50, help="Запросов на поток")
+        parser.add_argument("--readers", type=int, default=4, help="Потоков, читающих страницы во время записи")
+        parser.add_argument("--host", default="localhost", help="Заголовок Host (из ALLOWED_HOSTS)")
+        parser.add_argument("--skip-baseline", action="store_true", help="Не замерять прежний режим")
+        parser.add_argument("--keep", action="store_true", help="Не удалять созданные записи")
+
+    def _payloads(self):
+        item_ids = list(InventoryItem.objects.order_by("pk").values_list("pk", flat=True)[:50])
+        order_ids = list(Order.objects.order_by("-pk").values_list("pk", flat=True)[:50])
+        employee_ids = list(Employee.objects.order_by("pk").values_list("pk", flat=True)[:50])
+        if not item_ids:
+            raise CommandError("Нет товаров — сначала заполните базу (seed_benchmark).")
+        today = date.today().isoformat()
+        usage_url, defects_url = reverse("portal:usage"), reverse("portal:defects")
+
+        def payload(index):
+            if index % 2:
+                return defects_url, {
+                    "report_date": today,
+                    "project": order_ids[index % len(order_ids)] if order_ids else "",
+                    "responsible": employee_ids[index % len(employee_ids)] if employee_ids else "",
+                    "comment": MARKER,
+                    "status": DefectRecord.Status.choices[0][0],
+                }
+            return usage_url, {
+                "usage_date": today,
+                "item": item_ids[index % len(item_ids)],
+                "quantity": "1",
+                "project": order_ids[index % len(order_ids)] if order_ids else "",
+                "comment": MARKER,
+            }
+
+        return payload
+
+    def _worker(self, payload, offset, count, host, timings, errors, start):
+        client = HttpClient(HTTP_HOST=host)
+        start.wait()
+        try:
+            for index in range(offset, offset + count):
+                url, data = payload(index)
+                started = time.perf_counter()
+                try:
+                    response = client.post(url, data)
+                except Exception as exc:
+                    with self.lock:
+                        errors[f"{type(exc).__name__}: {exc}"] += 1
+                    continue
+                if response.status_code != 302:
+                    with self.lock:
+                        errors[f"HTTP {response.status_code} (форма не сохранена)"] += 1
+                    continue
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()
+
+    def _reader(self, host, timings, errors, start, done):
+        client = HttpClient(HTTP_HOST=host)
+        urls = [reverse("portal:usage"), reverse("portal:defects")]
+        start.wait()
+        try:
+            index = 0
+            while not done.is_set():
+                started = time.perf_counter()
+                try:
+                    client.get(urls[index % len(urls)])
+                except Exception as exc:
+                    with self.lock:
+                        errors[f"чтение — {type(exc).__name__}: {exc}"] += 1
+                else:
+                    timings.append((time.perf_counter() - started) * 1000)
+                index += 1
+        finally:
+            connection.close()
+
+    def _run(self, title, options):
+        # Соединения открываются заново, чтобы PRAGMA этого прогона применились.
+        connections.close_all()
+        payload = self._payloads()
+        threads_count, per_thread = options["threads"], options["requests"]
+        timings, read_timings, errors = [], [], Counter()
+        self.lock = threading.Lock()
+        done = threading.Event()
+        start = threading.Barrier(threads_count + options["readers"] + 1)
+        writers = [
+            threading.Thread(
+                target=self._worker,
+                args=(payload, number * per_thread, per_thread, options["host"], timings, errors, start),
+            )
+            for number in range(threads_count)
+        ]
+        readers = [
+            threading.Thread(target=self._reader, args=(options["host"], read_timings, errors, start, done))
+            for _ in range(options["readers"])
+        ]
+        for thread in writers + readers:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        total = threads_count * per_thread
+        self.stdout.write(f"{title} (journal_mode={journal_mode}):")
+        self.stdout.write(
+            f"  сохранено {len(timings)} из {total} за {elapsed:.2f} с, "
+            f"{len(timings) / elapsed:.1f} запросов/с"
+        )
+        if timings:
+            self.stdout.write(
+                f"  запись: медиана {statistics.median(timings):.1f} мс, "
+                f"p95 {_percentile(timings, 0.95):.1f} мс"
+            )
+        if read_timings:
+            self.stdout.write(
+                f"  чтение: {len(read_timings)} страниц, медиана {statistics.median(read_timings):.1f} мс, "
+                f"p95 {_percentile(read_timings, 0.95):.1f} мс"
+            )
+        for message, count in errors.most_common(5):
+            self.stdout.write(self.style.WARNING(f"  ×{count} {message}"))
+        return len(timings), sum(errors.values())
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Замер рассчитан на SQLite.")
+        # Ошибки считаются в сводке, трассировки django.request только мешают.
+        request_logger = logging.getLogger("django.request")
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            if not options["skip_baseline"]:
+                with override_settings(SQLITE_PRAGMAS=BASELINE_PRAGMAS):
+                    self._run("Прежний режим", options)
+            saved, failed = self._run("SQLITE_PRAGMAS", options)
+        finally:
+            request_logger.setLevel(previous_level)
+            connections.close_all()
+            if not options["keep"]:
+                # Удаление по одной записи: сигналы вернут остатки товаров.
+                for model in (InventoryUsage, DefectRecord):
+                    for record in model.objects.filter(comment=MARKER).iterator():
+                        record.delete()
+        if failed:
+            self.stdout.write(self.style.WARNING(f"С настройками SQLITE_PRAGMAS ошибок: {failed}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"С настройками SQLITE_PRAGMAS все {saved} запросов сохранены"))
@@ -0,0 +1,76 @@
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portal.models import Expense
+from portal.storage import digest_of
+from portal.thumbnails import DEFAULT_WORKERS, build_thumbnail, logger
+
+
+def _build(expense_id):
+    """Имя превью, "" для не-изображений или None, если файл не удалось обработать."""
+    try:
+        return build_thumbnail(expense_id)
+    except Exception:
+        logger.exception("Не удалось построить превью для расхода %s", expense_id)
+        return None
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит недостающие превью вложений расходов. С --rehash сначала переносит "
+        "старые вложения в хранилище по хэшу содержимого: дубликаты сливаются в один файл."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+        parser.add_argument("--rehash", action="store_true", help="Переименовать старые файлы по sha256")
+
+    def _rehash(self):
+        field = Expense._meta.get_field("attachment")
+        storage = field.storage
+        moved = freed = 0
+        for expense in Expense.objects.exclude(attachment="").exclude(attachment__isnull=True).iterator():
+            old_name = expense.attachment.name
+            if len(digest_of(old_name)) == 64 or not storage.exists(old_name):
+                continue
+            with storage.open(old_name, "rb") as fh:
+                new_name = storage.save(field.generate_filename(expense, posixpath.basename(old_name)), fh)
+            # update(): сигналы не нужны, суммы и даты не меняются.
+            Expense.objects.filter(pk=expense.pk).update(attachment=new_name, thumbnail="")
+            moved += 1
+            if not Expense.objects.filter(attachment=old_name).exists():
+                storage.delete(old_name)
+                freed += 1
+        self.stdout.write(f"Перенесено вложений: {moved}, удалено старых файлов: {freed}")
+
+    def handle(self, *args, **options):
+        if options["rehash"]:
+            self._rehash()
+        pending = (
+            Expense.objects.exclude(attachment="")
+            .exclude(attachment__isnull=True)
+            .filter(thumbnail="")
+            .values_list("pk", "attachment")
+        )
+        # Записи с одним файлом обрабатываем по очереди внутри потока, иначе
+        # параллельные потоки посчитают одно и то же превью несколько раз.
+        by_file = {}
+        for pk, name in pending:
+            by_file.setdefault(name, []).append(pk)
+
+        def build_group(group):
+            return [_build(pk) for pk in group]
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            results = [name for group in pool.map(build_group, by_file.values()) for name in group]
+        built = sum(1 for name in results if name)
+        failed = results.count(None)
+        skipped = len(results) - built - failed
+        self.stdout.write(
+            self.style.SUCCESS(f"Превью готово: {built}; не изображения: {skipped}; с ошибкой: {failed}")
+        )
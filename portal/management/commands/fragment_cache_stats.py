@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from portal.versions import fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = "Попадания и промахи кэша фрагментов шаблонов ({% versioned_cache %}) по именам."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Обнулить счётчики после вывода")
+
+    def handle(self, *args, **options):
+        stats = fragment_stats()
+        if not stats:
+            # Команда — отдельный процесс: с LocMem она видит только свой пустой кэш.
+            self.stdout.write(
+                "Статистики пока нет. С кэшем в памяти процесса счётчики видны только "
+                "на странице portal:fragment_stats работающего сервера."
+            )
+        for name, (hits, misses) in stats.items():
+            total = hits + misses
+            ratio = hits / total * 100 if total else 0
+            self.stdout.write(f"{name:<24} попаданий {hits:>8}  промахов {misses:>6}  ({ratio:.1f}%)")
+        if options["reset"]:
+            reset_fragment_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики обнулены"))
@@ -1,8 +1,28 @@
+import time
+
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.utils import timezone
 from openpyxl import load_workbook
 
-from portal.models import InventoryItem
+from portal.models import InventoryItem, SearchDocument
+from portal.search import index_objects
+from portal.versions import bump_versions
+from portal.stock import refresh_days_of_cover, reset_opening_quantity
+
+UPSERT_FIELDS = [
+    "name",
+    "category",
+    "base_unit",
+    "package_size",
+    "package_unit_label",
+    "default_unit_price",
+    "quantity_on_hand",
+    "location",
+    "notes",
+]
+# Меньше лимита SQLite на число параметров в одном запросе.
+LOOKUP_CHUNK = 900
 
 
 class Command(BaseCommand):
@@ -18,6 +38,12 @@ class Command(BaseCommand):
             default="data/inventory.xlsx",
             help="Путь к Excel-файлу со справочником товаров",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Сколько строк записывать одним запросом",
+        )
 
     def _normalize_unit(self, raw):
         if not raw:
@@ -37,31 +63,27 @@ class Command(BaseCommand):
         }
         return mapping.get(raw, InventoryItem.Unit.PIECE)
 
-    @transaction.atomic
-    def handle(self, *args, **options):
-        path = options["file_path"]
-        try:
-            wb = load_workbook(path)
-        except FileNotFoundError as exc:
-            raise CommandError(f"Файл не найден: {path}") from exc
-
-        ws = wb.active
-        if ws.max_row < 2:
-            self.stdout.write(self.style.WARNING("В файле нет данных"))
-            return
-
-        created = 0
-        updated = 0
+    def _read_rows(self, ws):
+        """Разбирает лист в словарь SKU -> значения полей (последняя строка с SKU побеждает)."""
+        rows = {}
+        skipped = 0
         for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             sku, name, category, unit_raw, package_size, package_label, price, qty, location, notes = (
                 (row[i] if i < len(row) else None) for i in range(10)
             )
 
             if not name:
+                skipped += 1
                 self.stdout.write(self.style.WARNING(f"Строка {idx}: пропущена (нет названия)"))
                 continue
 
-            defaults = {
+            sku = str(sku).strip() if sku else None
+            if not sku:
+                skipped += 1
+                self.stdout.write(self.style.WARNING(f"Строка {idx}: пропущена (нет SKU)"))
+                continue
+
+            values = {
                 "name": str(name).strip(),
                 "category": category or "",
                 "base_unit": self._normalize_unit(unit_raw) or InventoryItem.Unit.PIECE,
@@ -72,16 +94,96 @@ class Command(BaseCommand):
                 "location": location or "",
                 "notes": notes or "",
             }
+            rows[sku] = {
+                field: InventoryItem._meta.get_field(field).to_python(value)
+                for field, value in values.items()
+            }
+        return rows, skipped
 
-            sku = str(sku).strip() if sku else None
-            if not sku:
-                self.stdout.write(self.style.WARNING(f"Строка {idx}: пропущена (нет SKU)"))
+    def _existing_items(self, skus):
+        existing = {}
+        for start in range(0, len(skus), LOOKUP_CHUNK):
+            chunk = skus[start : start + LOOKUP_CHUNK]
+            for item in InventoryItem.objects.filter(sku__in=chunk).only("id", "sku", *UPSERT_FIELDS):
+                existing[item.sku] = item
+        return existing
+
+    def _item_ids(self, items):
+        # Не все бэкенды возвращают id из bulk_create (MySQL) — дочитываем по SKU.
+        skus = [item.sku for item in items]
+        ids = []
+        for start in range(0, len(skus), LOOKUP_CHUNK):
+            chunk = skus[start : start + LOOKUP_CHUNK]
+            ids.extend(InventoryItem.objects.filter(sku__in=chunk).values_list("id", flat=True))
+        return ids
+
+    def handle(self, *args, **options):
+        path = options["file_path"]
+        batch_size = options["batch_size"]
+        started = time.perf_counter()
+        try:
+            wb = load_workbook(path, read_only=True, data_only=True)
+        except FileNotFoundError as exc:
+            raise CommandError(f"Файл не найден: {path}") from exc
+
+        try:
+            rows, skipped = self._read_rows(wb.active)
+        finally:
+            wb.close()
+        read_done = time.perf_counter()
+
+        if not rows:
+            self.stdout.write(self.style.WARNING("В файле нет данных"))
+            return
+
+        existing = self._existing_items(list(rows))
+        now = timezone.now()
+        name_key_field = InventoryItem._meta.get_field("name_key")
+        to_create = []
+        to_update = []
+        recounted = []
+        for sku, values in rows.items():
+            item = existing.get(sku)
+            if item is None:
+                to_create.append(
+                    InventoryItem(sku=sku, opening_quantity=values["quantity_on_hand"], **values)
+                )
                 continue
+            changed = False
+            for field, value in values.items():
+                if getattr(item, field) != value:
+                    setattr(item, field, value)
+                    changed = True
+                    if field == "quantity_on_hand":
+                        recounted.append(item.pk)
+            if changed:
+                # bulk_update не вызывает pre_save — ключ поиска обновляем сами.
+                name_key_field.pre_save(item, add=False)
+                item.updated_at = now
+                to_update.append(item)
+        lookup_done = time.perf_counter()
 
-            item, created_flag = InventoryItem.objects.update_or_create(
-                sku=sku, defaults=defaults
+        with transaction.atomic():
+            InventoryItem.objects.bulk_create(to_create, batch_size=batch_size)
+            InventoryItem.objects.bulk_update(
+                to_update, [*UPSERT_FIELDS, "name_key", "updated_at"], batch_size=batch_size
             )
-            created += int(created_flag)
-            updated += int(not created_flag)
+            # Остаток из файла — результат инвентаризации: журнал продолжается от него.
+            reset_opening_quantity(recounted)
+            refresh_days_of_cover(recounted)
+            # bulk-операции не отправляют сигналы — версии и поиск обновляем сами.
+            bump_versions(InventoryItem)
+            index_objects(SearchDocument.Kind.ITEM, self._item_ids([*to_create, *to_update]))
+        write_done = time.perf_counter()
 
-        self.stdout.write(self.style.SUCCESS(f"Создано: {created}, обновлено: {updated}"))
+        unchanged = len(rows) - len(to_create) - len(to_update)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано: {len(to_create)}, обновлено: {len(to_update)}, "
+                f"без изменений: {unchanged}, пропущено строк: {skipped}"
+            )
+        )
+        self.stdout.write(
+            f"Время: чтение {read_done - started:.2f} с, сверка {lookup_done - read_done:.2f} с, "
+            f"запись {write_done - lookup_done:.2f} с, всего {write_done - started:.2f} с"
+        )
@@ -1,11 +1,19 @@
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils.text import slugify
 from openpyxl import load_workbook
 
-from portal.models import InventoryItem, InventoryUsage, Order
+from portal.archive import invalidate_archive_months
+from portal.models import InventoryItem, InventoryUsage, Order, SearchDocument
+from portal.search import index_objects
+from portal.stock import apply_stock_deltas, entry_deltas, refresh_usage_velocity
+from portal.versions import bump_versions
+
+# Меньше лимита SQLite на число параметров в одном запросе.
+LOOKUP_CHUNK = 900
 
 
 def _parse_date(value):
@@ -39,21 +47,35 @@ def _normalize_unit(unit_value: str):
     return mapping.get(unit_value)
 
 
-def _get_or_create_item(name: str, unit_label: str | None):
-    existing = InventoryItem.objects.filter(name__iexact=name).first()
-    if existing:
-        return existing, False
-
+def _unique_sku(name: str, taken: set) -> str:
     base_sku = slugify(name) or "item"
     sku = base_sku
     counter = 1
-    while InventoryItem.objects.filter(sku=sku).exists():
+    while sku in taken:
         counter += 1
         sku = f"{base_sku}-{counter}"
+    taken.add(sku)
+    return sku
+
+
+class Lookups:
+    """Справочники, загруженные один раз за запуск: ключи приведены через casefold()."""
+
+    def __init__(self):
+        self.items = {}
+        self.skus = set()
+        for item_id, name, sku in InventoryItem.objects.order_by("id").values_list("id", "name", "sku"):
+            self.items.setdefault(name.casefold(), item_id)
+            self.skus.add(sku)
+        self.orders = {}
+        for order_id, title in Order.objects.order_by("-created_at").values_list("id", "title"):
+            self.orders.setdefault(title.casefold(), order_id)
 
-    base_unit = _normalize_unit(unit_label) or InventoryItem.Unit.PIECE
-    created = InventoryItem.objects.create(name=name, sku=sku, base_unit=base_unit)
-    return created, True
+    def item_id(self, name: str):
+        return self.items.get(name.casefold())
+
+    def order_id(self, title: str):
+        return self.orders.get(title.casefold())
 
 
 class Command(BaseCommand):
@@ -69,25 +91,23 @@ class Command(BaseCommand):
             default="data/materials.xlsx",
             help="Путь к файлу Excel с расходами материалов",
         )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет создано, без записи в базу",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Сколько строк записывать одним запросом",
+        )
 
-    @transaction.atomic
-    def handle(self, *args, **options):
-        path = options["file_path"]
-        try:
-            wb = load_workbook(path)
-        except FileNotFoundError as exc:
-            raise CommandError(f"Файл не найден: {path}") from exc
-
-        ws = wb.active
-        if ws.max_row < 2:
-            self.stdout.write(self.style.WARNING("В файле нет данных"))
-            return
-
-        created_usages = 0
-        created_items = 0
+    def _read_rows(self, ws):
+        rows = []
         skipped_rows = 0
-
         for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            row = tuple(row) + (None,) * (5 - len(row))
             usage_date_raw, product_name, quantity_raw, unit_raw, project_raw = row[:5]
 
             if not product_name or not quantity_raw:
@@ -97,31 +117,117 @@ class Command(BaseCommand):
 
             usage_date = _parse_date(usage_date_raw) or datetime.today().date()
             try:
-                quantity = float(quantity_raw)
-            except (TypeError, ValueError):
+                quantity = Decimal(str(quantity_raw).replace(",", "."))
+                if not quantity.is_finite():
+                    raise InvalidOperation
+            except InvalidOperation:
                 skipped_rows += 1
                 self.stdout.write(self.style.WARNING(f"Строка {idx}: некорректное количество {quantity_raw}"))
                 continue
 
-            item, is_new = _get_or_create_item(str(product_name).strip(), unit_raw)
-            if is_new:
-                created_items += 1
+            rows.append(
+                {
+                    "usage_date": usage_date,
+                    "name": str(product_name).strip(),
+                    "quantity": quantity,
+                    "unit": unit_raw,
+                    "project": str(project_raw).strip() if project_raw else "",
+                }
+            )
+        return rows, skipped_rows
+
+    def _create_items(self, lookups, new_items, batch_size):
+        InventoryItem.objects.bulk_create(new_items.values(), batch_size=batch_size)
+        # Не все бэкенды возвращают id из bulk_create (MySQL) — дочитываем по SKU.
+        skus = [item.sku for item in new_items.values()]
+        created_ids = []
+        for start in range(0, len(skus), LOOKUP_CHUNK):
+            for item_id, name in InventoryItem.objects.filter(
+                sku__in=skus[start : start + LOOKUP_CHUNK]
+            ).values_list("id", "name"):
+                lookups.items.setdefault(name.casefold(), item_id)
+                created_ids.append(item_id)
+        index_objects(SearchDocument.Kind.ITEM, created_ids)
 
-            project = None
-            if project_raw:
-                project = Order.objects.filter(title__iexact=str(project_raw).strip()).first()
+    def handle(self, *args, **options):
+        path = options["file_path"]
+        dry_run = options["dry_run"]
+        batch_size = options["batch_size"]
+        try:
+            wb = load_workbook(path, read_only=True, data_only=True)
+        except FileNotFoundError as exc:
+            raise CommandError(f"Файл не найден: {path}") from exc
 
-            InventoryUsage.objects.create(
-                usage_date=usage_date,
-                item=item,
-                quantity=quantity,
-                project=project,
-                comment="Импорт из materials.xlsx",
-            )
-            created_usages += 1
+        try:
+            rows, skipped_rows = self._read_rows(wb.active)
+        finally:
+            wb.close()
+
+        if not rows:
+            self.stdout.write(self.style.WARNING("В файле нет данных"))
+            return
+
+        lookups = Lookups()
+        new_items = {}
+        missing_projects = set()
+        for row in rows:
+            key = row["name"].casefold()
+            if lookups.item_id(row["name"]) is None and key not in new_items:
+                new_items[key] = InventoryItem(
+                    name=row["name"],
+                    sku=_unique_sku(row["name"], lookups.skus),
+                    base_unit=_normalize_unit(row["unit"]) or InventoryItem.Unit.PIECE,
+                )
+            if row["project"] and lookups.order_id(row["project"]) is None:
+                missing_projects.add(row["project"])
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Пробный запуск: изменения не записываются"))
+            self.stdout.write(f"Будет создано списаний: {len(rows)}")
+            if new_items:
+                self.stdout.write(f"Будет создано новых товаров: {len(new_items)}")
+                for item in new_items.values():
+                    self.stdout.write(f"  + {item.sku} — {item.name}")
+            if missing_projects:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "Проекты не найдены (списание без проекта): " + ", ".join(sorted(missing_projects))
+                    )
+                )
+            if skipped_rows:
+                self.stdout.write(self.style.WARNING(f"Будет пропущено строк: {skipped_rows}"))
+            return
 
-        self.stdout.write(self.style.SUCCESS(f"Создано списаний: {created_usages}"))
-        if created_items:
-            self.stdout.write(self.style.SUCCESS(f"Создано новых товаров: {created_items}"))
+        with transaction.atomic():
+            if new_items:
+                self._create_items(lookups, new_items, batch_size)
+
+            usages = [
+                InventoryUsage(
+                    usage_date=row["usage_date"],
+                    item_id=lookups.item_id(row["name"]),
+                    quantity=row["quantity"],
+                    project_id=lookups.order_id(row["project"]) if row["project"] else None,
+                    comment="Импорт из materials.xlsx",
+                )
+                for row in rows
+            ]
+            InventoryUsage.objects.bulk_create(usages, batch_size=batch_size)
+            # bulk_create не отправляет сигналы — остатки правим одним проходом по товарам.
+            apply_stock_deltas(entry_deltas(usages))
+            # Импорт чаще всего приносит расход за прошлые дни — средний расход
+            # и запас в днях пересчитываем сразу, а не до следующего refresh_stock_cover.
+            refresh_usage_velocity()
+            bump_versions(InventoryUsage)
+        # Новые месяцы должны появиться в архиве сразу, а не после истечения кэша.
+        invalidate_archive_months(InventoryUsage)
+
+        self.stdout.write(self.style.SUCCESS(f"Создано списаний: {len(usages)}"))
+        if new_items:
+            self.stdout.write(self.style.SUCCESS(f"Создано новых товаров: {len(new_items)}"))
+        if missing_projects:
+            self.stdout.write(
+                self.style.WARNING(f"Проектов не найдено: {len(missing_projects)} (списания без проекта)")
+            )
         if skipped_rows:
             self.stdout.write(self.style.WARNING(f"Пропущено строк: {skipped_rows}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from portal.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает месячную сводку доходов и расходов (MonthlyRollup) по заказам и закупкам. "
+        "Нужна после массового импорта или правок в обход моделей."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано месяцев: {count}"))
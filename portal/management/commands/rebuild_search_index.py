@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.search import fts_available, optimize_index, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает поисковый индекс (клиенты, заказы с позициями, материалы). "
+        "Нужна после массового импорта или правок в обход моделей."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_index()
+        optimize_index()
+        backend = "FTS5" if fts_available() else "без полнотекстового индекса"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Проиндексировано документов: {count} ({backend}), "
+                f"{time.perf_counter() - started:.2f} с"
+            )
+        )
@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from portal.stock import expected_stock_expression, refresh_days_of_cover, stock_drift
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет остатки товаров с журналом (начальный остаток + приходы − расходы − списания) "
+        "и показывает расхождения. С флагом --fix записывает пересчитанные остатки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Исправить остатки по журналу",
+        )
+
+    def handle(self, *args, **options):
+        drift = list(stock_drift().values_list("sku", "name", "quantity_on_hand", "expected_quantity"))
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет"))
+            return
+
+        for sku, name, actual, expected in drift:
+            expected = Decimal(expected).quantize(Decimal("0.01"))
+            self.stdout.write(
+                f"{sku} — {name}: в базе {actual}, по журналу {expected} (разница {actual - expected})"
+            )
+        self.stdout.write(self.style.WARNING(f"Расхождений: {len(drift)}"))
+
+        if options["fix"]:
+            with transaction.atomic():
+                updated = stock_drift().update(quantity_on_hand=expected_stock_expression())
+                refresh_days_of_cover()
+            self.stdout.write(self.style.SUCCESS(f"Исправлено остатков: {updated}"))
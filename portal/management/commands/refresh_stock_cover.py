@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from portal.models import InventoryItem
+from portal.stock import USAGE_WINDOW_DAYS, refresh_usage_velocity
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает средний дневной расход материалов по истории списаний и запас в днях "
+        "для виджета «минимум запасов» на главной. Запускайте по расписанию (например, раз в ночь)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=USAGE_WINDOW_DAYS,
+            help="За сколько последних дней брать списания",
+        )
+
+    def handle(self, *args, **options):
+        updated = refresh_usage_velocity(options["days"])
+        critical = InventoryItem.objects.filter(days_of_cover__isnull=False).count()
+        self.stdout.write(
+            self.style.SUCCESS(f"Обновлено товаров: {updated}, с рассчитанным запасом: {critical}")
+        )
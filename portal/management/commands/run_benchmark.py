@@ -0,0 +1,250 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import date
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client as HttpClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from openpyxl import Workbook
+
+from accounts.models import Employee
+from portal.models import Client, DefectRecord, Expense, InventoryItem, InventoryUsage, Order, OrderItem
+from portal.rollups import shift_month
+
+
+def _percentile(values, share):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(share * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(timings, queries):
+    return {
+        "median_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(_percentile(timings, 0.95), 2),
+        "min_ms": round(min(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "queries_median": statistics.median(queries),
+        "queries_max": max(queries),
+    }
+
+
+def _write_xlsx(path, headers, rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет все страницы portal и команды импорта на текущих данных "
+        "(см. seed_benchmark): медиана и p95 времени ответа, число SQL-запросов. "
+        "Результат пишется в JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Замеров на каждый адрес")
+        parser.add_argument("--warmup", type=int, default=2, help="Прогревочных запросов без учёта")
+        parser.add_argument("--output", default="benchmark.json", help="Куда записать результат")
+        parser.add_argument("--host", default="localhost", help="Заголовок Host (из ALLOWED_HOSTS)")
+        parser.add_argument("--cold", action="store_true", help="Очищать кэш перед каждым запросом")
+        parser.add_argument("--skip-imports", action="store_true", help="Не замерять команды импорта")
+        parser.add_argument("--import-rows", type=int, default=2_000, help="Строк в файлах для импорта")
+        parser.add_argument("--import-iterations", type=int, default=3)
+
+    def url_cases(self):
+        """``[(имя маршрута, адрес)]``; старый месяц — страница архива, а не текущего."""
+        month = date.today().replace(day=1)
+        archive = shift_month(month, -6).strftime("%Y-%m")
+        order_id = Order.objects.order_by("-pk").values_list("pk", flat=True).first()
+        query = InventoryItem.objects.values_list("name", flat=True).first() or "баннер"
+        prefix = query.split()[0][:4]
+
+        cases = [
+            ("index", reverse("portal:index")),
+            ("index", f"{reverse('portal:index')}?month={archive}"),
+            ("order", reverse("portal:order")),
+            ("wizard", reverse("portal:wizard")),
+            ("report", reverse("portal:report")),
+            ("report", f"{reverse('portal:report')}?month={archive}"),
+            ("expenses", reverse("portal:expenses")),
+            ("usage", reverse("portal:usage")),
+            ("defects", reverse("portal:defects")),
+            ("search", f"{reverse('portal:search')}?q={prefix}"),
+            ("inventory", reverse("portal:inventory")),
+            ("help", reverse("portal:help")),
+            ("directory", reverse("portal:directory")),
+            ("staff", reverse("portal:staff")),
+            ("fragment_stats", reverse("portal:fragment_stats")),
+        ]
+        if order_id:
+            cases.append(("order_detail", reverse("portal:order_detail", args=[order_id])))
+        expense_id = (
+            Expense.objects.exclude(attachment="")
+            .exclude(attachment__isnull=True)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if expense_id:
+            cases.append(("expense_file", reverse("portal:expense_file", args=[expense_id, "file"])))
+        for name in ("items", "orders", "employees"):
+            cases.append(("lookup", f"{reverse('portal:lookup', args=[name])}?q={prefix}"))
+        for dataset in ("report", "expenses", "usage", "defects"):
+            for fmt in ("csv", "xlsx"):
+                url = reverse("portal:export", kwargs={"dataset": dataset, "fmt": fmt})
+                cases.append(("export", f"{url}?month={archive}"))
+        return cases
+
+    def _check_coverage(self, cases):
+        covered = {name for name, _ in cases}
+        portal = get_resolver().namespace_dict["portal"][1]
+        missing = sorted(
+            name for name in portal.reverse_dict if isinstance(name, str) and name not in covered
+        )
+        for name in missing:
+            self.stdout.write(self.style.WARNING(f"Маршрут portal:{name} не замеряется"))
+
+    def _measure_url(self, client, url, iterations, warmup, cold):
+        timings, queries, status = [], [], None
+        for attempt in range(warmup + iterations):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                else:
+                    response.content
+                elapsed = (time.perf_counter() - started) * 1000
+            status = response.status_code
+            if attempt >= warmup:
+                timings.append(elapsed)
+                queries.append(len(captured))
+        return {"url": url, "status": status, **_summary(timings, queries)}
+
+    def _import_files(self, directory, rows):
+        items = list(InventoryItem.objects.order_by("pk").values_list("sku", "name")[:rows])
+        orders = list(Order.objects.order_by("-pk").values_list("title", flat=True)[:50]) or [""]
+        today = date.today().strftime("%d.%m.%Y")
+
+        inventory = os.path.join(directory, "inventory.xlsx")
+        _write_xlsx(
+            inventory,
+            ["SKU", "Название", "Категория", "Ед.", "Упаковка", "Маркировка упаковки", "Цена", "Остаток", "Локация", "Примечание"],
+            # Половина строк обновляет существующие товары, половина — новые.
+            [(sku, name, "замер", "шт", None, "", 100, 10, "", "") for sku, name in items[: rows // 2]]
+            + [(f"IMPORT-{index:06d}", f"Импорт {index}", "замер", "м", 50, "рулон", 10, 0, "", "") for index in range(rows - len(items[: rows // 2]))],
+        )
+        materials = os.path.join(directory, "materials.xlsx")
+        _write_xlsx(
+            materials,
+            ["Дата", "Товар", "Количество", "Ед. изм.", "Проект"],
+            [
+                (today, items[index % len(items)][1], 1, "шт", orders[index % len(orders)])
+                for index in range(rows if items else 0)
+            ],
+        )
+        employees = os.path.join(directory, "employees.xlsx")
+        _write_xlsx(
+            employees,
+            ["ФИО", "Телефон", "Статус", "Дата рождения", "Отдел", "Должность", "Навыки"],
+            [(f"Импорт Сотрудник {index}", f"+7 702 {index:07d}", "", "01.01.1990", f"Отдел {index % 10}", f"Должность {index % 25}", "монтаж, печать") for index in range(rows)],
+        )
+        return [
+            ("import_inventory", ["--file", inventory]),
+            ("import_materials", ["--file", materials]),
+            ("import_employees", ["--file", employees]),
+        ]
+
+    def _measure_import(self, command, args, iterations):
+        timings, queries = [], []
+        for _ in range(iterations):
+            # Каждый прогон откатывается, чтобы все замеры шли на одних и тех же данных.
+            with CaptureQueriesContext(connection) as captured, transaction.atomic():
+                started = time.perf_counter()
+                call_command(command, *args, stdout=StringIO(), stderr=StringIO())
+                elapsed = (time.perf_counter() - started) * 1000
+                transaction.set_rollback(True)
+            timings.append(elapsed)
+            queries.append(len(captured))
+        return _summary(timings, queries)
+
+    def handle(self, *args, **options):
+        # Вложения отдаются только вошедшим пользователям: временный пользователь
+        # живёт только на время замера.
+        user = get_user_model().objects.create_user(f"benchmark-{uuid.uuid4().hex[:12]}")
+        client = HttpClient(HTTP_HOST=options["host"])
+        client.force_login(user)
+        try:
+            self._run(client, options)
+        finally:
+            client.logout()
+            user.delete()
+
+    def _run(self, client, options):
+        cases = self.url_cases()
+        self._check_coverage(cases)
+
+        results = {
+            "meta": {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "cache": settings.CACHES["default"]["BACKEND"],
+                "iterations": options["iterations"],
+                "warmup": options["warmup"],
+                "cold_cache": options["cold"],
+            },
+            "dataset": {
+                model._meta.label: model.objects.count()
+                for model in (Client, Order, OrderItem, InventoryItem, InventoryUsage, Expense, DefectRecord, Employee)
+            },
+            "urls": {},
+            "imports": {},
+        }
+
+        for name, url in cases:
+            result = self._measure_url(client, url, options["iterations"], options["warmup"], options["cold"])
+            results["urls"][url] = {"name": name, **result}
+            self.stdout.write(
+                f"{url}: {result['status']}, медиана {result['median_ms']} мс, "
+                f"p95 {result['p95_ms']} мс, запросов {result['queries_median']}"
+            )
+
+        if not options["skip_imports"]:
+            with tempfile.TemporaryDirectory() as directory:
+                for command, command_args in self._import_files(directory, options["import_rows"]):
+                    try:
+                        result = self._measure_import(command, command_args, options["import_iterations"])
+                    except ImportError as exc:
+                        results["imports"][command] = {"skipped": str(exc)}
+                        self.stdout.write(self.style.WARNING(f"{command}: пропущено ({exc})"))
+                        continue
+                    results["imports"][command] = {"rows": options["import_rows"], **result}
+                    self.stdout.write(
+                        f"{command}: медиана {result['median_ms']} мс, "
+                        f"p95 {result['p95_ms']} мс, запросов {result['queries_median']}"
+                    )
+
+        with open(options["output"], "w", encoding="utf-8") as fh:
+            json.dump(results, fh, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Результаты записаны в {options['output']}"))
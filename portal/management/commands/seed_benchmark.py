@@ -0,0 +1,275 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Employee
+from portal.archive import MONTH_FIELDS, invalidate_archive_months
+from portal.dashboard import invalidate_dashboard_snapshot
+from portal.models import (
+    Client,
+    DefectRecord,
+    Expense,
+    InventoryItem,
+    InventoryUsage,
+    Order,
+    OrderItem,
+)
+from portal.rollups import rebuild_rollups
+from portal.search import rebuild_index
+from portal.stock import refresh_usage_velocity, reset_opening_quantity
+from portal.versions import bump_versions
+
+WORDS = (
+    "баннер плёнка оракал вывеска короб световой лайтбокс печать монтаж фасад "
+    "табличка стенд наклейка композит акрил пвх буквы неон штендер брендирование"
+).split()
+SUPPLIERS = ["ТОО Реклама-Снаб", "ИП Печатник", "ТОО Пластик-Трейд", "Оракал Центр", "ИП Монтаж Сервис"]
+CITIES = ["Алматы", "Астана", "Шымкент", "Караганда", "Актобе"]
+UNITS = [unit for unit, _ in InventoryItem.Unit.choices]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Отключает auto_now/auto_now_add, чтобы данные легли на прошлые месяцы."""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими данными для замеров (клиенты, заказы с позициями, "
+        "списания, закупки, брак). Запускайте на отдельной базе: данные не удаляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=10_000)
+        parser.add_argument("--orders", type=int, default=100_000)
+        parser.add_argument("--order-items", type=int, default=1_000_000)
+        parser.add_argument("--usages", type=int, default=1_000_000)
+        parser.add_argument("--expenses", type=int, default=50_000)
+        parser.add_argument("--defects", type=int, default=20_000)
+        parser.add_argument("--inventory", type=int, default=2_000)
+        parser.add_argument("--employees", type=int, default=300)
+        parser.add_argument("--months", type=int, default=24, help="На сколько месяцев назад растянуть даты")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
+    def _step(self, title, started):
+        self.stdout.write(f"  {title}: {time.perf_counter() - started:.1f} с")
+
+    def _insert(self, model, objects):
+        """bulk_create и id созданных строк по порядку (MySQL их не возвращает)."""
+        last_id = model.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        if all(obj.pk is not None for obj in objects):
+            return [obj.pk for obj in objects]
+        return list(model.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True))
+
+    def _moment(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.span_seconds))
+
+    def _words(self, count):
+        return " ".join(self.rng.choice(WORDS) for _ in range(count))
+
+    def _money(self, low, high):
+        return Decimal(self.rng.randrange(low * 100, high * 100)) / 100
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = datetime.now().replace(microsecond=0)
+        self.span_seconds = options["months"] * 30 * 24 * 3600
+        started = time.perf_counter()
+
+        models = (Client, Order, OrderItem, InventoryItem, InventoryUsage, Expense, DefectRecord)
+        with explicit_timestamps(*models), transaction.atomic():
+            step = time.perf_counter()
+            item_ids = self._inventory(options["inventory"])
+            employee_ids = self._employees(options["employees"])
+            client_ids = self._clients(options["clients"])
+            self._step("справочники", step)
+
+            step = time.perf_counter()
+            order_ids = self._orders(options["orders"], options["order_items"], client_ids)
+            self._step("заказы и позиции", step)
+
+            step = time.perf_counter()
+            self._usages(options["usages"], item_ids, order_ids)
+            self._expenses(options["expenses"])
+            self._defects(options["defects"], order_ids, employee_ids)
+            self._step("списания, закупки, брак", step)
+
+        # bulk_create не отправляет сигналы — производные данные пересчитываем разом.
+        step = time.perf_counter()
+        reset_opening_quantity(item_ids)
+        refresh_usage_velocity()
+        rebuild_rollups()
+        rebuild_index()
+        invalidate_dashboard_snapshot()
+        for model in MONTH_FIELDS:
+            invalidate_archive_months(model)
+        bump_versions(Order, InventoryItem, *MONTH_FIELDS)
+        self._step("сводки, поиск, кэши", step)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Данные для замеров созданы за {time.perf_counter() - started:.1f} с")
+        )
+
+    def _inventory(self, count):
+        items = []
+        for index in range(count):
+            package_size = self.rng.choice([None, Decimal("50"), Decimal("25"), Decimal("10")])
+            items.append(
+                InventoryItem(
+                    sku=f"BENCH-{index:06d}",
+                    name=f"{self._words(2).capitalize()} {index}",
+                    category=self.rng.choice(WORDS),
+                    base_unit=self.rng.choice(UNITS),
+                    package_size=package_size,
+                    package_unit_label="рулон" if package_size else "",
+                    default_unit_price=self._money(100, 20_000),
+                    quantity_on_hand=Decimal(self.rng.randrange(0, 5_000)),
+                    reorder_level=Decimal(self.rng.randrange(0, 200)),
+                    location=self.rng.choice(CITIES),
+                    created_at=self.now,
+                    updated_at=self.now,
+                )
+            )
+        return self._insert(InventoryItem, items)
+
+    def _employees(self, count):
+        employees = [
+            Employee(full_name=f"Сотрудник {self._words(1).capitalize()} {index}", phone=f"+7 701 {index:07d}")
+            for index in range(count)
+        ]
+        return self._insert(Employee, employees)
+
+    def _clients(self, count):
+        clients = []
+        for index in range(count):
+            created = self._moment()
+            clients.append(
+                Client(
+                    name=f"ТОО {self._words(1).capitalize()} {index}",
+                    contact_person=f"Контакт {index}",
+                    phone=f"+7 7{self.rng.randrange(0, 10**9):09d}",
+                    address=f"{self.rng.choice(CITIES)}, ул. {self._words(1).capitalize()} {self.rng.randrange(1, 200)}",
+                    created_at=created,
+                    updated_at=created,
+                )
+            )
+        return self._insert(Client, clients)
+
+    def _orders(self, count, item_count, client_ids):
+        statuses = [status for status, _ in Order.Status.choices]
+        per_order = item_count / count if count else 0
+        order_ids = []
+        for start in range(0, count, self.batch_size):
+            orders, lines = [], []
+            for _ in range(min(self.batch_size, count - start)):
+                created = self._moment()
+                # Позиций в среднем per_order: целая часть плюс случайная добавка.
+                lines_count = int(per_order) + (self.rng.random() < per_order - int(per_order))
+                order_lines = [
+                    (self._words(2).capitalize(), Decimal(self.rng.randrange(1, 50)), self._money(500, 50_000))
+                    for _ in range(lines_count)
+                ]
+                orders.append(
+                    Order(
+                        title=f"{self._words(3).capitalize()} №{start + len(orders) + 1}",
+                        client_id=self.rng.choice(client_ids),
+                        description=self._words(8),
+                        status=self.rng.choice(statuses),
+                        total_amount=sum((qty * price for _, qty, price in order_lines), Decimal("0")),
+                        created_at=created,
+                        updated_at=created,
+                    )
+                )
+                lines.append((created, order_lines))
+            ids = self._insert(Order, orders)
+            order_ids.extend(ids)
+            OrderItem.objects.bulk_create(
+                (
+                    OrderItem(
+                        order_id=order_id,
+                        title=title,
+                        quantity=quantity,
+                        unit_price=price,
+                        created_at=created,
+                        updated_at=created,
+                    )
+                    for order_id, (created, order_lines) in zip(ids, lines)
+                    for title, quantity, price in order_lines
+                ),
+                batch_size=self.batch_size,
+            )
+        return order_ids
+
+    def _usages(self, count, item_ids, order_ids):
+        for start in range(0, count, self.batch_size):
+            usages = []
+            for _ in range(min(self.batch_size, count - start)):
+                created = self._moment()
+                usages.append(
+                    InventoryUsage(
+                        usage_date=created.date(),
+                        item_id=self.rng.choice(item_ids),
+                        quantity=Decimal(self.rng.randrange(1, 500)) / 10,
+                        project_id=self.rng.choice(order_ids) if self.rng.random() < 0.8 else None,
+                        comment=self._words(2),
+                        created_at=created,
+                        updated_at=created,
+                    )
+                )
+            InventoryUsage.objects.bulk_create(usages, batch_size=self.batch_size)
+
+    def _expenses(self, count):
+        expenses = []
+        for _ in range(count):
+            created = self._moment()
+            expenses.append(
+                Expense(
+                    supplier_name=self.rng.choice(SUPPLIERS),
+                    expense_date=created.date(),
+                    amount=self._money(1_000, 500_000),
+                    description=self._words(3),
+                    created_at=created,
+                    updated_at=created,
+                )
+            )
+        Expense.objects.bulk_create(expenses, batch_size=self.batch_size)
+
+    def _defects(self, count, order_ids, employee_ids):
+        statuses = [status for status, _ in DefectRecord.Status.choices]
+        defects = []
+        for _ in range(count):
+            created = self._moment()
+            defects.append(
+                DefectRecord(
+                    report_date=created.date(),
+                    project_id=self.rng.choice(order_ids) if order_ids else None,
+                    responsible_id=self.rng.choice(employee_ids) if employee_ids else None,
+                    comment=self._words(4),
+                    status=self.rng.choice(statuses),
+                    created_at=created,
+                    updated_at=created,
+                )
+            )
+        DefectRecord.objects.bulk_create(defects, batch_size=self.batch_size)
@@ -0,0 +1,145 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .storage import digest_of
+
+CHUNK_SIZE = 64 * 1024
+# Эти типы безопасно показывать в браузере; остальное (HTML, SVG и т.п.) — только скачивание.
+INLINE_TYPES = {"application/pdf", "image/jpeg", "image/png", "image/gif", "image/webp"}
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(name, stat) -> str:
+    digest = digest_of(name)
+    if len(digest) == 64:
+        # Имя по sha256 содержимого — готовый сильный ETag.
+        return f'"{digest}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """``(начало, конец)`` включительно для одного диапазона, None — отдать весь файл,
+    ``False`` — диапазон за пределами файла (416). Несколько диапазонов не поддерживаются."""
+    match = RANGE_RE.match((header or "").strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-500 — последние 500 байт.
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime) -> bool:
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith(('"', "W/")):
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and int(mtime) <= since
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload_headers(name, path) -> dict:
+    """Заголовок, по которому файл отдаёт сам веб-сервер (``PORTAL_MEDIA_OFFLOAD``)."""
+    mode = getattr(settings, "PORTAL_MEDIA_OFFLOAD", None)
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "PORTAL_MEDIA_ACCEL_PREFIX", "/protected-media/")
+        return {"X-Accel-Redirect": prefix.rstrip("/") + "/" + quote(name)}
+    if mode == "x-sendfile":
+        return {"X-Sendfile": path}
+    return {}
+
+
+def serve_file(request, storage, name, filename):
+    """Отдаёт файл из ``storage``: ETag/Last-Modified, Range и выгрузку на веб-сервер.
+
+    Проверка доступа — на стороне представления; сюда попадает уже разрешённый файл.
+    """
+    try:
+        path = storage.path(name)
+        stat = os.stat(path)
+    except (NotImplementedError, FileNotFoundError, ValueError):
+        raise Http404("Файл не найден")
+
+    etag = _etag(name, stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        # 304 должен нести те же валидаторы, что и 200, иначе кэш их потеряет.
+        if response.status_code == 304:
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(stat.st_mtime)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    as_attachment = content_type not in INLINE_TYPES
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Accept-Ranges": "bytes",
+    }
+    offload = _offload_headers(name, path)
+    size = stat.st_size
+    byte_range = None
+    if not offload and request.method == "GET" and _if_range_matches(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.headers.get("Range"), size)
+
+    if offload:
+        # Тело и Range отдаёт nginx/Apache, Django только проверяет доступ.
+        headers["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+        response = HttpResponse(content_type=content_type, headers={**headers, **offload})
+    elif byte_range is False:
+        response = HttpResponse(status=416, headers={"Content-Range": f"bytes */{size}"})
+    elif byte_range:
+        start, end = byte_range
+        headers["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        response = FileResponse(
+            _read_range(path, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+            headers=headers,
+        )
+    else:
+        response = FileResponse(
+            open(path, "rb"),
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=filename,
+            headers=headers,
+        )
+    # Браузер хранит копию, но перепроверяет её по ETag: ответ 304 без тела.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def download_name(prefix, name) -> str:
+    return f"{prefix}{posixpath.splitext(name)[1].lower()}"
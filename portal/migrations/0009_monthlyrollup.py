@@ -0,0 +1,107 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:33
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_rollups(apps, schema_editor):
+    Order = apps.get_model("portal", "Order")
+    Expense = apps.get_model("portal", "Expense")
+    MonthlyRollup = apps.get_model("portal", "MonthlyRollup")
+
+    rows = {}
+    for entry in (
+        Order.objects.order_by()
+        .annotate(month=TruncMonth("created_at"))
+        .values("month")
+        .annotate(income=Sum("total_amount"), order_count=Count("id"))
+    ):
+        month = entry["month"].date().replace(day=1)
+        rows.setdefault(
+            month, {"income": Decimal("0"), "expense": Decimal("0"), "order_count": 0}
+        )
+        rows[month]["income"] = entry["income"] or Decimal("0")
+        rows[month]["order_count"] = entry["order_count"]
+    for entry in (
+        Expense.objects.order_by()
+        .annotate(month=TruncMonth("expense_date"))
+        .values("month")
+        .annotate(total=Sum("amount"))
+    ):
+        month = entry["month"].replace(day=1)
+        rows.setdefault(
+            month, {"income": Decimal("0"), "expense": Decimal("0"), "order_count": 0}
+        )
+        rows[month]["expense"] = entry["total"] or Decimal("0")
+
+    MonthlyRollup.objects.bulk_create(
+        MonthlyRollup(month=month, net=values["income"] - values["expense"], **values)
+        for month, values in rows.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0008_defectrecord_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "month",
+                    models.DateField(
+                        help_text="Первое число месяца",
+                        unique=True,
+                        verbose_name="Месяц",
+                    ),
+                ),
+                (
+                    "income",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=14, verbose_name="Доход"
+                    ),
+                ),
+                (
+                    "expense",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Расход",
+                    ),
+                ),
+                (
+                    "net",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=14, verbose_name="Итог"
+                    ),
+                ),
+                (
+                    "order_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Заказов"),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Итоги месяца",
+                "verbose_name_plural": "Итоги по месяцам",
+                "ordering": ["-month"],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
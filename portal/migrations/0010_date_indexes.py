@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("portal", "0009_monthlyrollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="defectrecord",
+            index=models.Index(
+                fields=["report_date", "created_at"], name="portal_defect_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["expense_date", "created_at"], name="portal_expense_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventoryusage",
+            index=models.Index(
+                fields=["usage_date", "created_at"], name="portal_usage_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["created_at"], name="portal_order_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["status"], name="portal_order_status_idx"),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0010_date_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(fields=["name"], name="portal_inventory_name_idx"),
+        ),
+    ]
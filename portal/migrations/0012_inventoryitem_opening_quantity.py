@@ -0,0 +1,57 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:40
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def set_opening_quantity(apps, schema_editor):
+    """Текущие остатки принимаются за факт: начальный остаток = остаток − журнал."""
+    InventoryItem = apps.get_model("portal", "InventoryItem")
+    InventoryMovement = apps.get_model("portal", "InventoryMovement")
+    InventoryUsage = apps.get_model("portal", "InventoryUsage")
+
+    net = defaultdict(Decimal)
+    for item_id, direction, total in (
+        InventoryMovement.objects.order_by()
+        .values_list("item_id", "direction")
+        .annotate(total=Sum("quantity"))
+    ):
+        net[item_id] += (
+            Decimal(total or 0) if direction == "in" else -Decimal(total or 0)
+        )
+    for item_id, total in (
+        InventoryUsage.objects.order_by()
+        .values_list("item_id")
+        .annotate(total=Sum("quantity"))
+    ):
+        net[item_id] -= Decimal(str(total or 0))
+
+    items = list(InventoryItem.objects.only("id", "quantity_on_hand"))
+    for item in items:
+        item.opening_quantity = item.quantity_on_hand - net.get(item.id, Decimal("0"))
+    InventoryItem.objects.bulk_update(items, ["opening_quantity"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0011_inventoryitem_name_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="opening_quantity",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Остаток на момент последней инвентаризации/импорта, от него считается журнал движений",
+                max_digits=12,
+                verbose_name="Начальный остаток",
+            ),
+        ),
+        migrations.RunPython(set_opening_quantity, migrations.RunPython.noop),
+    ]
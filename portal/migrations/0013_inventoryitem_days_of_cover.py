@@ -0,0 +1,99 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:42
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+USAGE_WINDOW_DAYS = 90
+
+
+def fill_days_of_cover(apps, schema_editor):
+    """Начальные средний расход и запас в днях — те же формулы, что у
+    refresh_stock_cover на момент миграции, чтобы виджет не был пустым до его запуска.
+    """
+    InventoryItem = apps.get_model("portal", "InventoryItem")
+    InventoryUsage = apps.get_model("portal", "InventoryUsage")
+    since = date.today() - timedelta(days=USAGE_WINDOW_DAYS)
+    used = dict(
+        InventoryUsage.objects.filter(usage_date__gt=since)
+        .order_by()
+        .values("item")
+        .annotate(total=Sum("quantity"))
+        .values_list("item", "total")
+    )
+    items = []
+    for item in InventoryItem.objects.only(
+        "quantity_on_hand", "reorder_level"
+    ).iterator(chunk_size=500):
+        avg = (Decimal(str(used.get(item.pk) or 0)) / USAGE_WINDOW_DAYS).quantize(
+            Decimal("0.001")
+        )
+        if item.quantity_on_hand <= item.reorder_level and (
+            item.reorder_level > 0 or avg > 0
+        ):
+            cover = Decimal("0")
+        elif avg > 0:
+            cover = ((item.quantity_on_hand - item.reorder_level) / avg).quantize(
+                Decimal("0.1")
+            )
+        else:
+            cover = None
+        item.avg_daily_usage, item.days_of_cover = avg, cover
+        items.append(item)
+    InventoryItem.objects.bulk_update(
+        items, ["avg_daily_usage", "days_of_cover"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0012_inventoryitem_opening_quantity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="avg_daily_usage",
+            field=models.DecimalField(
+                decimal_places=3,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Средний расход в день",
+            ),
+        ),
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="days_of_cover",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=1,
+                editable=False,
+                help_text="На сколько дней хватит остатка до минимального уровня при текущем расходе",
+                max_digits=10,
+                null=True,
+                verbose_name="Запас, дней",
+            ),
+        ),
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="reorder_level",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="При остатке на этом уровне или ниже материал нужно дозаказать",
+                max_digits=12,
+                verbose_name="Минимальный остаток",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(
+                fields=["days_of_cover", "name"], name="portal_inventory_cover_idx"
+            ),
+        ),
+        migrations.RunPython(fill_days_of_cover, migrations.RunPython.noop),
+    ]
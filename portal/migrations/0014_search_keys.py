@@ -0,0 +1,65 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:47
+
+import graceproject.fields
+from django.db import migrations, models
+
+
+def search_key(value):
+    # Копия graceproject.fields.search_key на момент миграции.
+    return " ".join(str(value or "").split()).casefold()
+
+
+def fill_search_keys(apps, schema_editor):
+    InventoryItem = apps.get_model("portal", "InventoryItem")
+    Order = apps.get_model("portal", "Order")
+
+    items = list(InventoryItem.objects.only("id", "name", "sku"))
+    for item in items:
+        item.name_key = search_key(item.name)[:255]
+        item.sku_key = search_key(item.sku)[:100]
+    InventoryItem.objects.bulk_update(items, ["name_key", "sku_key"], batch_size=500)
+
+    orders = list(Order.objects.only("id", "title"))
+    for order in orders:
+        order.title_key = search_key(order.title)[:255]
+    Order.objects.bulk_update(orders, ["title_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0013_inventoryitem_days_of_cover"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="name_key",
+            field=graceproject.fields.SearchKeyField(source="name"),
+        ),
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="sku_key",
+            field=graceproject.fields.SearchKeyField(max_length=100, source="sku"),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="title_key",
+            field=graceproject.fields.SearchKeyField(source="title"),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(
+                fields=["name_key"], name="portal_inventory_name_key_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(fields=["sku_key"], name="portal_inventory_sku_key_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["title_key"], name="portal_order_title_key_idx"),
+        ),
+    ]
@@ -0,0 +1,158 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:49
+
+import re
+
+from django.db import migrations, models
+
+FTS_TABLE = "portal_searchdocument_fts"
+# unicode61 не снимает диакритику с кириллицы, поэтому «ё» приводится к «е»
+# при записи в индекс; длина текста не меняется, так что snippet() по исходному
+# тексту подсвечивает те же позиции.
+FOLD = "replace(replace({0}, 'ё', 'е'), 'Ё', 'Е')"
+NEW = f"new.id, {FOLD.format('new.title')}, {FOLD.format('new.body')}"
+OLD = f"'delete', old.id, {FOLD.format('old.title')}, {FOLD.format('old.body')}"
+
+FTS_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body,
+        content='portal_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER portal_searchdocument_ai AFTER INSERT ON portal_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES ({NEW});
+    END""",
+    f"""CREATE TRIGGER portal_searchdocument_ad AFTER DELETE ON portal_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ({OLD});
+    END""",
+    f"""CREATE TRIGGER portal_searchdocument_au AFTER UPDATE ON portal_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ({OLD});
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES ({NEW});
+    END""",
+]
+FTS_DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS portal_searchdocument_ai",
+    "DROP TRIGGER IF EXISTS portal_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS portal_searchdocument_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def create_fts_table(apps, schema_editor):
+    """FTS5-таблица с триггерами синхронизации — только на SQLite; на других
+    бэкендах поиск работает по самой таблице документов."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in FTS_STATEMENTS:
+        schema_editor.execute(statement)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in FTS_DROP_STATEMENTS:
+        schema_editor.execute(statement)
+
+
+def _join(*parts):
+    return "\n".join(part for part in parts if part)
+
+
+def _phone_variants(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    variants = [digits]
+    if len(digits) == 11 and digits[0] in "78":
+        variants.append(digits[1:])
+    return " ".join(variant for variant in variants if variant)
+
+
+def build_index(apps, schema_editor):
+    """Первичное заполнение; текст документов — как в portal/search.py на момент миграции."""
+    SearchDocument = apps.get_model("portal", "SearchDocument")
+    Client = apps.get_model("portal", "Client")
+    Order = apps.get_model("portal", "Order")
+    InventoryItem = apps.get_model("portal", "InventoryItem")
+
+    def documents():
+        for client in Client.objects.iterator(chunk_size=500):
+            yield "client", client.pk, client.name, _join(
+                client.contact_person,
+                client.phone,
+                _phone_variants(client.phone),
+                client.email,
+                client.address,
+                client.notes,
+            )
+        for order in Order.objects.prefetch_related("items").iterator(chunk_size=500):
+            lines = [_join(item.title, item.comment) for item in order.items.all()]
+            yield "order", order.pk, order.title, _join(order.description, *lines)
+        for item in InventoryItem.objects.iterator(chunk_size=500):
+            yield "item", item.pk, f"{item.sku} — {item.name}", _join(
+                item.sku,
+                item.name,
+                item.category,
+                item.package_unit_label,
+                item.location,
+                item.notes,
+            )
+
+    batch = []
+    for kind, object_id, title, body in documents():
+        batch.append(
+            SearchDocument(kind=kind, object_id=object_id, title=title[:255], body=body)
+        )
+        if len(batch) >= 500:
+            SearchDocument.objects.bulk_create(batch)
+            batch = []
+    SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0014_search_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("client", "Клиент"),
+                            ("order", "Заказ"),
+                            ("item", "Материал"),
+                        ],
+                        max_length=16,
+                        verbose_name="Тип",
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("title", models.CharField(max_length=255, verbose_name="Заголовок")),
+                ("body", models.TextField(blank=True, verbose_name="Текст")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Поисковый документ",
+                "verbose_name_plural": "Поисковый индекс",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="searchdocument",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "object_id"), name="portal_search_object_uniq"
+            ),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
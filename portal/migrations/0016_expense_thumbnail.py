@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:08
+
+import portal.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0015_searchdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                storage=portal.storage.attachment_storage,
+                upload_to="expenses/thumbs/",
+                verbose_name="Превью",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="expense",
+            name="attachment",
+            field=models.FileField(
+                blank=True,
+                help_text="Фото чека или PDF",
+                null=True,
+                storage=portal.storage.attachment_storage,
+                upload_to="expenses/",
+                verbose_name="Файл",
+            ),
+        ),
+    ]
@@ -1,7 +1,11 @@
 from datetime import date
+from decimal import Decimal
 
-from django.db import models
+from django.db import models, transaction
 from accounts.models import Employee
+from graceproject.fields import SearchKeyField
+
+from .storage import attachment_storage
 
 
 class TimestampedModel(models.Model):
@@ -12,6 +16,22 @@ class TimestampedModel(models.Model):
         abstract = True
 
 
+class StockLedgerEntry(TimestampedModel):
+    """Запись, меняющая остаток товара (приход, расход, списание).
+
+    Наследники задают ``item`` и ``stock_delta()`` — изменение остатка от записи.
+    Сам остаток правят сигналы в ``portal.signals``; сохранение обёрнуто в
+    транзакцию, чтобы запись и изменение остатка применялись вместе.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
 class Client(TimestampedModel):
     name = models.CharField(max_length=255)
     contact_person = models.CharField(max_length=255, blank=True)
@@ -33,6 +53,7 @@ class Order(TimestampedModel):
         DONE = "done", "Завершено"
 
     title = models.CharField(max_length=255)
+    title_key = SearchKeyField(source="title")
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="orders")
     description = models.TextField(blank=True)
     status = models.CharField(max_length=32, choices=Status.choices, default=Status.DEVELOPMENT)
@@ -46,6 +67,11 @@ class Order(TimestampedModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"], name="portal_order_created_idx"),
+            models.Index(fields=["status"], name="portal_order_status_idx"),
+            models.Index(fields=["title_key"], name="portal_order_title_key_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -83,6 +109,8 @@ class InventoryItem(TimestampedModel):
 
     name = models.CharField(max_length=255)
     sku = models.CharField(max_length=100, unique=True)
+    name_key = SearchKeyField(source="name")
+    sku_key = SearchKeyField(source="sku", max_length=100)
     category = models.CharField(max_length=150, blank=True)
     base_unit = models.CharField(max_length=10, choices=Unit.choices, default=Unit.PIECE)
     package_size = models.DecimalField(
@@ -99,11 +127,47 @@ class InventoryItem(TimestampedModel):
     )
     default_unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     quantity_on_hand = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    opening_quantity = models.DecimalField(
+        "Начальный остаток",
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="Остаток на момент последней инвентаризации/импорта, от него считается журнал движений",
+    )
+    reorder_level = models.DecimalField(
+        "Минимальный остаток",
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="При остатке на этом уровне или ниже материал нужно дозаказать",
+    )
+    avg_daily_usage = models.DecimalField(
+        "Средний расход в день",
+        max_digits=12,
+        decimal_places=3,
+        default=0,
+        editable=False,
+    )
+    days_of_cover = models.DecimalField(
+        "Запас, дней",
+        max_digits=10,
+        decimal_places=1,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="На сколько дней хватит остатка до минимального уровня при текущем расходе",
+    )
     location = models.CharField(max_length=255, blank=True)
     notes = models.TextField(blank=True)
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["name"], name="portal_inventory_name_idx"),
+            models.Index(fields=["days_of_cover", "name"], name="portal_inventory_cover_idx"),
+            models.Index(fields=["name_key"], name="portal_inventory_name_key_idx"),
+            models.Index(fields=["sku_key"], name="portal_inventory_sku_key_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.sku} — {self.name}"
@@ -120,7 +184,7 @@ class InventoryItem(TimestampedModel):
         return "упаковка"
 
 
-class InventoryMovement(TimestampedModel):
+class InventoryMovement(StockLedgerEntry):
     class Direction(models.TextChoices):
         IN = "in", "Приход"
         OUT = "out", "Расход"
@@ -133,12 +197,16 @@ class InventoryMovement(TimestampedModel):
     class Meta:
         ordering = ["-created_at"]
 
+    def stock_delta(self) -> Decimal:
+        quantity = Decimal(str(self.quantity or 0))
+        return quantity if self.direction == self.Direction.IN else -quantity
+
     def __str__(self) -> str:
         prefix = "+" if self.direction == self.Direction.IN else "-"
         return f"{prefix}{self.quantity} {self.item.sku}"
 
 
-class InventoryUsage(TimestampedModel):
+class InventoryUsage(StockLedgerEntry):
     usage_date = models.DateField("Дата", default=date.today)
     item = models.ForeignKey(
         InventoryItem, on_delete=models.CASCADE, related_name="usages"
@@ -156,6 +224,12 @@ class InventoryUsage(TimestampedModel):
 
     class Meta:
         ordering = ["-usage_date", "-created_at"]
+        indexes = [
+            models.Index(fields=["usage_date", "created_at"], name="portal_usage_date_idx"),
+        ]
+
+    def stock_delta(self) -> Decimal:
+        return -Decimal(str(self.quantity or 0))
 
     def __str__(self) -> str:
         project_label = self.project.title if self.project else "Без проекта"
@@ -169,14 +243,26 @@ class Expense(TimestampedModel):
     attachment = models.FileField(
         "Файл",
         upload_to="expenses/",
+        storage=attachment_storage,
         blank=True,
         null=True,
         help_text="Фото чека или PDF",
     )
+    # Уменьшенное превью фото (portal/thumbnails.py), строится в фоне после сохранения.
+    thumbnail = models.ImageField(
+        "Превью",
+        upload_to="expenses/thumbs/",
+        storage=attachment_storage,
+        blank=True,
+        editable=False,
+    )
     description = models.CharField("Комментарий", max_length=255, blank=True)
 
     class Meta:
         ordering = ["-expense_date", "-created_at"]
+        indexes = [
+            models.Index(fields=["expense_date", "created_at"], name="portal_expense_date_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.supplier_name} — {self.amount}"
@@ -214,8 +300,55 @@ class DefectRecord(TimestampedModel):
 
     class Meta:
         ordering = ["-report_date", "-created_at"]
+        indexes = [
+            models.Index(fields=["report_date", "created_at"], name="portal_defect_date_idx"),
+        ]
 
     def __str__(self) -> str:
         project_label = self.project.title if self.project else "Без проекта"
         person = self.responsible.full_name if self.responsible else "Не указано"
         return f"{project_label} — {person}"
+
+
+class MonthlyRollup(models.Model):
+    """Месячные итоги для отчёта: доход по заказам и расход по закупкам."""
+
+    month = models.DateField("Месяц", unique=True, help_text="Первое число месяца")
+    income = models.DecimalField("Доход", max_digits=14, decimal_places=2, default=0)
+    expense = models.DecimalField("Расход", max_digits=14, decimal_places=2, default=0)
+    net = models.DecimalField("Итог", max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField("Заказов", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-month"]
+        verbose_name = "Итоги месяца"
+        verbose_name_plural = "Итоги по месяцам"
+
+    def __str__(self) -> str:
+        return f"{self.month:%m.%Y}: {self.net}"
+
+
+class SearchDocument(models.Model):
+    """Текст объекта для глобального поиска; на SQLite зеркалируется в FTS5."""
+
+    class Kind(models.TextChoices):
+        CLIENT = "client", "Клиент"
+        ORDER = "order", "Заказ"
+        ITEM = "item", "Материал"
+
+    kind = models.CharField("Тип", max_length=16, choices=Kind.choices)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField("Заголовок", max_length=255)
+    body = models.TextField("Текст", blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Поисковый документ"
+        verbose_name_plural = "Поисковый индекс"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="portal_search_object_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()}: {self.title}"
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    has_next: bool = False
+    has_previous: bool = False
+    next_query: str = ""
+    previous_query: str = ""
+    ordering: tuple = field(default=())
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+def _encode_cursor(obj, ordering) -> str:
+    values = []
+    for name in ordering:
+        value = getattr(obj, name.lstrip("-"))
+        values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(model, ordering, cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return [
+            model._meta.get_field(name.lstrip("-")).to_python(value)
+            for name, value in zip(ordering, values)
+        ]
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        return None
+
+
+def _seek_filter(ordering, values, forward: bool) -> Q:
+    """Условие «строго после курсора» для лексикографического порядка ``ordering``."""
+    condition = Q()
+    for position, name in enumerate(ordering):
+        column = name.lstrip("-")
+        descending = name.startswith("-")
+        lookup = "lt" if descending == forward else "gt"
+        step = Q(**{f"{column}__{lookup}": values[position]})
+        for prev_name, prev_value in zip(ordering[:position], values[:position]):
+            step &= Q(**{prev_name.lstrip("-"): prev_value})
+        condition |= step
+    return condition
+
+
+def _reverse_ordering(ordering) -> list:
+    return [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+
+def _page_query(request, param=None, cursor=None) -> str:
+    params = request.GET.copy()
+    params.pop("after", None)
+    params.pop("before", None)
+    if param:
+        params[param] = cursor
+    return params.urlencode()
+
+
+def paginate_keyset(request, queryset, ordering, per_page=None) -> KeysetPage:
+    """Постраничный вывод без OFFSET: страница ищется по значениям ``ordering``.
+
+    Последнее поле ``ordering`` должно быть уникальным (обычно ``id``/``-id``),
+    поля не должны содержать NULL. Курсоры передаются в ``?after=`` и ``?before=``.
+    """
+    ordering = tuple(ordering)
+    per_page = per_page or PAGE_SIZE
+    model = queryset.model
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+
+    forward = True
+    values = None
+    if after:
+        values = _decode_cursor(model, ordering, after)
+    elif before:
+        values = _decode_cursor(model, ordering, before)
+        forward = values is None
+
+    page_qs = queryset.order_by(*(ordering if forward else _reverse_ordering(ordering)))
+    if values is not None:
+        page_qs = page_qs.filter(_seek_filter(ordering, values, forward))
+    rows = list(page_qs[: per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if forward:
+        has_previous = values is not None
+        has_next = has_more
+    else:
+        rows.reverse()
+        has_previous = has_more
+        has_next = True
+
+    page = KeysetPage(
+        object_list=rows,
+        has_next=has_next and bool(rows),
+        has_previous=has_previous and bool(rows),
+        ordering=ordering,
+    )
+    if page.has_next:
+        page.next_query = _page_query(request, "after", _encode_cursor(rows[-1], ordering))
+    if page.has_previous:
+        page.previous_query = _page_query(request, "before", _encode_cursor(rows[0], ordering))
+    elif not rows and (after or before):
+        # Курсор указывает за пределы данных (записи удалены) — ведём на первую страницу.
+        page.has_previous = True
+        page.previous_query = _page_query(request)
+    return page
@@ -0,0 +1,114 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Expense, MonthlyRollup, Order
+
+
+def month_start(value) -> date:
+    if isinstance(value, datetime):
+        value = value.date()
+    return date(value.year, value.month, 1)
+
+
+def next_month(month: date) -> date:
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def shift_month(month: date, delta: int) -> date:
+    index = month.year * 12 + month.month - 1 + delta
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def refresh_month(month: date) -> MonthlyRollup:
+    """Пересчитывает одну строку сводки по данным за месяц."""
+    month = month_start(month)
+    month_end = next_month(month)
+
+    orders = Order.objects.filter(
+        created_at__gte=datetime.combine(month, time.min),
+        created_at__lt=datetime.combine(month_end, time.min),
+    ).aggregate(income=Sum("total_amount"), order_count=Count("id"))
+    expense = Expense.objects.filter(
+        expense_date__gte=month,
+        expense_date__lt=month_end,
+    ).aggregate(total=Sum("amount"))
+
+    income = orders.get("income") or Decimal("0")
+    expense_total = expense.get("total") or Decimal("0")
+    rollup, _ = MonthlyRollup.objects.update_or_create(
+        month=month,
+        defaults={
+            "income": income,
+            "expense": expense_total,
+            "net": income - expense_total,
+            "order_count": orders.get("order_count") or 0,
+        },
+    )
+    return rollup
+
+
+def rebuild_rollups() -> int:
+    """Полностью пересобирает сводку двумя сгруппированными запросами."""
+    rows = {}
+
+    def row(month):
+        return rows.setdefault(
+            month_start(month),
+            {"income": Decimal("0"), "expense": Decimal("0"), "order_count": 0},
+        )
+
+    order_totals = (
+        Order.objects.order_by()
+        .annotate(month=TruncMonth("created_at"))
+        .values("month")
+        .annotate(income=Sum("total_amount"), order_count=Count("id"))
+    )
+    for entry in order_totals:
+        target = row(entry["month"])
+        target["income"] = entry["income"] or Decimal("0")
+        target["order_count"] = entry["order_count"]
+
+    expense_totals = (
+        Expense.objects.order_by()
+        .annotate(month=TruncMonth("expense_date"))
+        .values("month")
+        .annotate(total=Sum("amount"))
+    )
+    for entry in expense_totals:
+        row(entry["month"])["expense"] = entry["total"] or Decimal("0")
+
+    rollups = [
+        MonthlyRollup(month=month, net=values["income"] - values["expense"], **values)
+        for month, values in sorted(rows.items())
+    ]
+    with transaction.atomic():
+        MonthlyRollup.objects.all().delete()
+        MonthlyRollup.objects.bulk_create(rollups)
+    return len(rollups)
+
+
+def get_month_rollup(month: date) -> MonthlyRollup:
+    """Строка сводки за месяц; для месяца без данных — пустая несохранённая."""
+    month = month_start(month)
+    rollup = MonthlyRollup.objects.filter(month=month).first()
+    return rollup or MonthlyRollup(month=month)
+
+
+def get_trend(month: date, months: int = 12) -> list:
+    """Сводка за ``months`` месяцев, заканчивая ``month``, без пропусков."""
+    last = month_start(month)
+    first = shift_month(last, -(months - 1))
+    existing = {
+        rollup.month: rollup
+        for rollup in MonthlyRollup.objects.filter(month__gte=first, month__lte=last)
+    }
+    return [
+        existing.get(shift_month(first, offset)) or MonthlyRollup(month=shift_month(first, offset))
+        for offset in range(months)
+    ]
@@ -0,0 +1,202 @@
+import re
+import threading
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Client, InventoryItem, Order, SearchDocument
+
+FTS_TABLE = "portal_searchdocument_fts"
+SEARCH_LIMIT = 50
+INDEX_CHUNK = 500
+# Маркеры подсветки в snippet(): управляющие символы не встречаются в тексте
+# и переживают escape(), поэтому подсветку можно вставить после экранирования.
+MARK_START, MARK_END = "\x02", "\x03"
+
+# FTS5-таблица и триггеры синхронизации создаются миграцией 0015. unicode61
+# не снимает диакритику с кириллицы, поэтому триггеры приводят «ё» к «е»;
+# то же делает _tokens() с запросом.
+
+
+def _join(*parts) -> str:
+    return "\n".join(part for part in parts if part)
+
+
+def _phone_variants(phone) -> str:
+    """Телефон цифрами: «+7 (701) 123-45-67» находится и по «7011234567»."""
+    digits = re.sub(r"\D", "", phone or "")
+    variants = [digits]
+    if len(digits) == 11 and digits[0] in "78":
+        variants.append(digits[1:])
+    return " ".join(variant for variant in variants if variant)
+
+
+def client_text(client):
+    return client.name, _join(
+        client.contact_person,
+        client.phone,
+        _phone_variants(client.phone),
+        client.email,
+        client.address,
+        client.notes,
+    )
+
+
+def order_text(order):
+    # Позиции заказа ищутся вместе с заказом: находка ведёт на его карточку.
+    lines = [_join(item.title, item.comment) for item in order.items.all()]
+    return order.title, _join(order.description, *lines)
+
+
+def item_text(item):
+    return f"{item.sku} — {item.name}", _join(
+        item.sku, item.name, item.category, item.package_unit_label, item.location, item.notes
+    )
+
+
+TEXT = {
+    SearchDocument.Kind.CLIENT: client_text,
+    SearchDocument.Kind.ORDER: order_text,
+    SearchDocument.Kind.ITEM: item_text,
+}
+
+
+def source_querysets() -> dict:
+    """Индексируемые объекты по типам."""
+    return {
+        SearchDocument.Kind.CLIENT: Client.objects.all(),
+        SearchDocument.Kind.ORDER: Order.objects.prefetch_related("items"),
+        SearchDocument.Kind.ITEM: InventoryItem.objects.all(),
+    }
+
+
+def index_objects(kind, ids, queryset=None) -> None:
+    """Пересобирает документы ``kind`` для ``ids``; удалённые объекты выпадают из индекса."""
+    queryset = source_querysets()[kind] if queryset is None else queryset
+    text = TEXT[kind]
+    ids = list(ids)
+    for start in range(0, len(ids), INDEX_CHUNK):
+        chunk = ids[start : start + INDEX_CHUNK]
+        documents = []
+        for obj in queryset.filter(pk__in=chunk):
+            title, body = text(obj)
+            documents.append(
+                SearchDocument(kind=kind, object_id=obj.pk, title=title[:255], body=body)
+            )
+        with transaction.atomic():
+            SearchDocument.objects.filter(kind=kind, object_id__in=chunk).delete()
+            SearchDocument.objects.bulk_create(documents)
+
+
+_pending = threading.local()
+
+
+def _index_pending() -> None:
+    pending, _pending.ids = getattr(_pending, "ids", {}), {}
+    for kind, ids in pending.items():
+        index_objects(kind, sorted(ids))
+
+
+def index_on_commit(kind, ids) -> None:
+    """Пересобирает документы после коммита; все вызовы за одну транзакцию
+    (например, по строке на каждую позицию заказа) сливаются в один проход."""
+    _pending.ids = getattr(_pending, "ids", {})
+    _pending.ids.setdefault(kind, set()).update(ids)
+    transaction.on_commit(_index_pending)
+
+
+def remove_objects(kind, ids) -> None:
+    SearchDocument.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+def rebuild_index() -> int:
+    SearchDocument.objects.all().delete()
+    for kind, queryset in source_querysets().items():
+        ids = queryset.order_by("pk").values_list("pk", flat=True)
+        index_objects(kind, ids, queryset=queryset)
+    return SearchDocument.objects.count()
+
+
+def fts_available() -> bool:
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def optimize_index() -> None:
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def _tokens(query) -> list:
+    return re.findall(r"\w+", (query or "").replace("ё", "е").replace("Ё", "Е"))
+
+
+def match_expression(tokens) -> str:
+    """Все слова запроса, каждое — по началу: «плён орак» → ``"плён"* "орак"*``."""
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    object_id: int
+    title: str
+    snippet: str
+
+    @property
+    def kind_label(self) -> str:
+        return SearchDocument.Kind(self.kind).label
+
+    @property
+    def url(self) -> str:
+        if self.kind == SearchDocument.Kind.ORDER:
+            return reverse("portal:order_detail", args=[self.object_id])
+        if self.kind == SearchDocument.Kind.CLIENT:
+            return reverse("admin:portal_client_change", args=[self.object_id])
+        return reverse("admin:portal_inventoryitem_change", args=[self.object_id])
+
+
+def _highlight(text) -> str:
+    return mark_safe(
+        escape(text).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+    )
+
+
+def search(query, limit=SEARCH_LIMIT) -> list:
+    """Находки по релевантности (bm25 в FTS5); заголовок весит больше текста."""
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+    if fts_available():
+        sql = (
+            f"SELECT d.kind, d.object_id, d.title, "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', 12) "
+            f"FROM {FTS_TABLE} JOIN portal_searchdocument d ON d.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [MARK_START, MARK_END, match_expression(tokens), limit])
+            rows = cursor.fetchall()
+        return [
+            SearchHit(kind, object_id, title, _highlight(snippet))
+            for kind, object_id, title, snippet in rows
+        ]
+
+    # Другие бэкенды: полный просмотр таблицы документов, без ранжирования.
+    condition = Q()
+    for token in tokens:
+        condition &= Q(title__icontains=token) | Q(body__icontains=token)
+    documents = SearchDocument.objects.filter(condition).order_by("kind", "title")[:limit]
+    return [
+        SearchHit(doc.kind, doc.object_id, doc.title, doc.body[:160].replace("\n", " · "))
+        for doc in documents
+    ]
@@ -0,0 +1,163 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .archive import MONTH_FIELDS, invalidate_archive_months
+from .dashboard import invalidate_dashboard_snapshot
+from .models import (
+    Client,
+    Expense,
+    InventoryItem,
+    InventoryMovement,
+    InventoryUsage,
+    Order,
+    OrderItem,
+    SearchDocument,
+)
+from .rollups import month_start, refresh_month
+from .search import index_objects, index_on_commit, remove_objects
+from .sqlite import configure_connection
+from .versions import bump_versions
+from .stock import apply_stock_deltas, entry_deltas, refresh_days_of_cover
+from .thumbnails import schedule_thumbnail
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, raw=False, **kwargs):
+    # loaddata (raw) сводки не трогает — после загрузки фикстур их пересчитывает rebuild_rollups.
+    if raw:
+        return
+    invalidate_dashboard_snapshot()
+    if instance.created_at:
+        refresh_month(instance.created_at)
+
+
+def version_changed(sender, instance, **kwargs):
+    bump_versions(sender)
+
+
+# Версии для кэша фрагментов: дашборд, склад и архивы месяцев.
+for model in (Order, InventoryItem, *MONTH_FIELDS):
+    post_save.connect(version_changed, sender=model, dispatch_uid=f"version-{model._meta.label_lower}")
+    post_delete.connect(version_changed, sender=model, dispatch_uid=f"version-delete-{model._meta.label_lower}")
+
+
+@receiver(post_init, sender=Expense)
+def expense_loaded(sender, instance, **kwargs):
+    # Запоминаем исходную дату: при её смене пересчитать нужно оба месяца.
+    instance._rollup_date = instance.expense_date
+    instance._attachment_name = instance.attachment.name
+
+
+@receiver(pre_save, sender=Expense)
+def expense_saving(sender, instance, raw=False, **kwargs):
+    # Новый файл — старое превью больше не подходит, новое построится в фоне.
+    if not raw and instance.attachment.name != instance._attachment_name:
+        instance.thumbnail = ""
+
+
+@receiver(post_save, sender=Expense)
+def expense_attachment_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.attachment and not instance.thumbnail:
+        schedule_thumbnail(instance.pk)
+    instance._attachment_name = instance.attachment.name
+
+
+def _expense_date(value):
+    # В create()/save() дата может прийти строкой «2024-03-05» — приводим, как это сделает поле.
+    return Expense._meta.get_field("expense_date").to_python(value)
+
+
+@receiver([post_save, post_delete], sender=Expense)
+def expense_changed(sender, instance, raw=False, **kwargs):
+    expense_date = _expense_date(instance.expense_date)
+    if not raw:
+        months = {month_start(expense_date)}
+        if instance._rollup_date:
+            months.add(month_start(_expense_date(instance._rollup_date)))
+        for month in months:
+            refresh_month(month)
+    instance._rollup_date = expense_date
+
+
+def archive_changed(sender, instance, **kwargs):
+    invalidate_archive_months(sender)
+
+
+for model in MONTH_FIELDS:
+    post_save.connect(archive_changed, sender=model, dispatch_uid=f"archive-{model._meta.label_lower}")
+    post_delete.connect(archive_changed, sender=model, dispatch_uid=f"archive-delete-{model._meta.label_lower}")
+
+
+@receiver(pre_save, sender=InventoryUsage)
+@receiver(pre_save, sender=InventoryMovement)
+def ledger_entry_saving(sender, instance, raw=False, **kwargs):
+    instance._stock_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = sender.objects.select_for_update().filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._stock_previous = previous
+
+
+@receiver(post_save, sender=InventoryUsage)
+@receiver(post_save, sender=InventoryMovement)
+def ledger_entry_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = entry_deltas([instance])
+    previous = getattr(instance, "_stock_previous", None)
+    if previous is not None:
+        for item_id, delta in entry_deltas([previous]).items():
+            deltas[item_id] = deltas.get(item_id, 0) - delta
+    apply_stock_deltas(deltas)
+    instance._stock_previous = None
+
+
+@receiver(post_delete, sender=InventoryUsage)
+@receiver(post_delete, sender=InventoryMovement)
+def ledger_entry_deleted(sender, instance, **kwargs):
+    apply_stock_deltas({item_id: -delta for item_id, delta in entry_deltas([instance]).items()})
+
+
+@receiver(post_save, sender=InventoryItem)
+def inventory_item_saved(sender, instance, raw=False, **kwargs):
+    # Остаток или минимальный уровень могли измениться — запас в днях считаем заново.
+    if not raw:
+        refresh_days_of_cover([instance.pk])
+
+
+SEARCH_KINDS = {
+    Client: SearchDocument.Kind.CLIENT,
+    Order: SearchDocument.Kind.ORDER,
+    InventoryItem: SearchDocument.Kind.ITEM,
+}
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=InventoryItem)
+def search_object_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_objects(SEARCH_KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=InventoryItem)
+def search_object_deleted(sender, instance, **kwargs):
+    remove_objects(SEARCH_KINDS[sender], [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def search_order_item_changed(sender, instance, raw=False, **kwargs):
+    # Позиции входят в документ заказа: он пересобирается один раз после коммита,
+    # сколько бы позиций ни поменялось.
+    if not raw:
+        index_on_commit(SearchDocument.Kind.ORDER, [instance.order_id])
+
+
+@receiver(connection_created)
+def sqlite_connection_created(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        configure_connection(connection)
@@ -0,0 +1,10 @@
+from django.conf import settings
+
+
+def configure_connection(connection) -> None:
+    """Применяет ``SQLITE_PRAGMAS`` из настроек к новому соединению SQLite
+    в порядке их объявления."""
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,68 @@
+// Подгрузка вариантов для RemoteSelect: в HTML приходит только выбранный
+// вариант, остальные запрашиваются у portal:lookup по мере ввода.
+(function () {
+  const DELAY = 250;
+  const timers = new WeakMap();
+
+  function selectFor(input) {
+    return input.closest('.lookup')?.querySelector('select[data-lookup-url]');
+  }
+
+  function option(value, text, selected) {
+    const el = document.createElement('option');
+    el.value = value;
+    el.textContent = text;
+    el.selected = selected;
+    return el;
+  }
+
+  async function load(select, query) {
+    const url = new URL(select.dataset.lookupUrl, window.location.origin);
+    url.searchParams.set('q', query);
+    const request = String(Number(select.dataset.lookupRequest || 0) + 1);
+    select.dataset.lookupRequest = request;
+    const response = await fetch(url, { headers: { Accept: 'application/json' } });
+    if (!response.ok) {
+      return;
+    }
+    const data = await response.json();
+    if (select.dataset.lookupRequest !== request) {
+      return; // пришёл ответ на устаревший запрос
+    }
+    const current = select.value;
+    const kept = Array.from(select.options).filter((el) => (el.value === '' && !el.disabled) || el.value === current);
+    select.replaceChildren(...kept);
+    data.results.forEach((row) => {
+      if (String(row.id) !== current) {
+        select.appendChild(option(row.id, row.text, false));
+      }
+    });
+    if (data.next) {
+      const more = option('', 'Показаны первые совпадения — уточните поиск', false);
+      more.disabled = true;
+      select.appendChild(more);
+    }
+    select.dataset.lookupLoaded = query;
+  }
+
+  document.addEventListener('input', (event) => {
+    const input = event.target;
+    if (!input.matches('[data-lookup-search]')) {
+      return;
+    }
+    const select = selectFor(input);
+    if (!select) {
+      return;
+    }
+    clearTimeout(timers.get(input));
+    timers.set(input, setTimeout(() => load(select, input.value.trim()), DELAY));
+  });
+
+  // Пока ничего не введено, по фокусу показываем начало списка.
+  document.addEventListener('focusin', (event) => {
+    const select = event.target;
+    if (select.matches('select[data-lookup-url]') && select.dataset.lookupLoaded === undefined) {
+      load(select, '');
+    }
+  });
+})();
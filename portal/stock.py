@@ -0,0 +1,159 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
+
+from .models import InventoryItem, InventoryMovement, InventoryUsage
+from .versions import bump_versions
+
+AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+COVER = DecimalField(max_digits=10, decimal_places=1)
+# Окно, по которому считается средний дневной расход.
+USAGE_WINDOW_DAYS = 90
+# Товаров в одном UPDATE остатков: по три параметра на товар, меньше лимита SQLite.
+STOCK_UPDATE_CHUNK = 300
+
+
+def apply_stock_deltas(deltas) -> None:
+    """Меняет остатки на ``{item_id: delta}``: блокирует строки товаров и правит
+    их одним ``UPDATE … CASE`` на пачку, а не запросом на товар."""
+    deltas = {item_id: delta for item_id, delta in deltas.items() if item_id and delta}
+    if not deltas:
+        return
+    output_field = InventoryItem._meta.get_field("quantity_on_hand")
+    # Фиксированный порядок блокировок, чтобы параллельные записи не взаимоблокировались.
+    item_ids = sorted(deltas)
+    with transaction.atomic():
+        for start in range(0, len(item_ids), STOCK_UPDATE_CHUNK):
+            chunk = item_ids[start : start + STOCK_UPDATE_CHUNK]
+            list(
+                InventoryItem.objects.select_for_update()
+                .filter(pk__in=chunk)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            InventoryItem.objects.filter(pk__in=chunk).update(
+                quantity_on_hand=F("quantity_on_hand")
+                + Case(
+                    *(When(pk=item_id, then=Value(deltas[item_id])) for item_id in chunk),
+                    output_field=output_field,
+                )
+            )
+        refresh_days_of_cover(item_ids)
+
+
+def entry_deltas(entries) -> dict:
+    """Суммарное изменение остатков по товарам для набора записей журнала."""
+    deltas = defaultdict(Decimal)
+    for entry in entries:
+        deltas[entry.item_id] += entry.stock_delta()
+    return dict(deltas)
+
+
+def _sum_for_item(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(item=OuterRef("pk"))
+            .order_by()
+            .values("item")
+            .annotate(total=Sum(field, output_field=AMOUNT))
+            .values("total"),
+            output_field=AMOUNT,
+        ),
+        Value(Decimal("0")),
+        output_field=AMOUNT,
+    )
+
+
+def ledger_net_expression():
+    """Приходы минус расходы и списания по товару — выражение для annotate/update."""
+    return (
+        _sum_for_item(InventoryMovement.objects.filter(direction=InventoryMovement.Direction.IN), "quantity")
+        - _sum_for_item(InventoryMovement.objects.filter(direction=InventoryMovement.Direction.OUT), "quantity")
+        - _sum_for_item(InventoryUsage.objects.all(), "quantity")
+    )
+
+
+def expected_stock_expression():
+    return F("opening_quantity") + ledger_net_expression()
+
+
+def stock_drift(queryset=None):
+    """Товары, у которых остаток расходится с журналом, одним запросом.
+
+    SQLite суммирует десятичные как float (7.7 превращается в 7.699999…),
+    поэтому сравнивается разница, округлённая до сотых, а не сами значения.
+    """
+    queryset = InventoryItem.objects.all() if queryset is None else queryset
+    return (
+        queryset.annotate(
+            expected_quantity=expected_stock_expression(),
+            drift=Round(F("quantity_on_hand") - F("expected_quantity"), 2, output_field=AMOUNT),
+        )
+        .exclude(drift=0)
+        .order_by("sku")
+    )
+
+
+def reset_opening_quantity(item_ids) -> None:
+    """Принимает текущий остаток за факт (после инвентаризации): начальный остаток
+    пересчитывается так, чтобы журнал давал ровно ``quantity_on_hand``."""
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), 900):
+        InventoryItem.objects.filter(pk__in=item_ids[start : start + 900]).update(
+            opening_quantity=F("quantity_on_hand") - ledger_net_expression()
+        )
+
+
+def _divide(numerator, denominator):
+    """Деление во float: SQLite хранит десятичные без дробной части как целые
+    и делит их нацело (3 / 90 = 0)."""
+    return Cast(numerator, FloatField()) / Cast(denominator, FloatField())
+
+
+def days_of_cover_expression():
+    """Дней до минимального остатка при среднем расходе; 0 — уже пора дозаказывать,
+    NULL — товар не расходуется и минимальный уровень не задан."""
+    return Case(
+        When(
+            Q(quantity_on_hand__lte=F("reorder_level"))
+            & (Q(reorder_level__gt=0) | Q(avg_daily_usage__gt=0)),
+            then=Value(Decimal("0")),
+        ),
+        When(
+            avg_daily_usage__gt=0,
+            then=_divide(F("quantity_on_hand") - F("reorder_level"), F("avg_daily_usage")),
+        ),
+        default=Value(None),
+        output_field=COVER,
+    )
+
+
+def refresh_days_of_cover(item_ids=None) -> None:
+    """Пересчитывает запас в днях по уже посчитанному среднему расходу."""
+    # update() не отправляет сигналы, а остатки и запас видны в кэше фрагментов.
+    bump_versions(InventoryItem)
+    if item_ids is None:
+        InventoryItem.objects.update(days_of_cover=days_of_cover_expression())
+        return
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), 900):
+        InventoryItem.objects.filter(pk__in=item_ids[start : start + 900]).update(
+            days_of_cover=days_of_cover_expression()
+        )
+
+
+def refresh_usage_velocity(window_days: int = USAGE_WINDOW_DAYS) -> int:
+    """Средний дневной расход за последние ``window_days`` дней и запас в днях
+    для всех товаров — два UPDATE без выборки строк в Python."""
+    since = date.today() - timedelta(days=window_days)
+    recent = InventoryUsage.objects.filter(usage_date__gt=since)
+    with transaction.atomic():
+        updated = InventoryItem.objects.update(
+            avg_daily_usage=_divide(_sum_for_item(recent, "quantity"), Value(window_days))
+        )
+        refresh_days_of_cover()
+    return updated
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+def content_digest(content) -> str:
+    """sha256 содержимого файла; позиция чтения возвращается в начало."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def digest_of(name) -> str:
+    """Хэш из имени, выданного ContentHashStorage: ``expenses/ab/<sha256>.jpg``."""
+    return os.path.splitext(posixpath.basename(name or ""))[0]
+
+
+class _HashNameTaken(Exception):
+    """Файл с этим хэшем уже записан — например, параллельной загрузкой."""
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Файлы называются по sha256 содержимого, одинаковые файлы хранятся один раз.
+
+    Имя — ``<каталог upload_to>/<первые 2 символа>/<sha256><расширение>``; если такой
+    файл уже есть (или его только что создала параллельная загрузка), запись
+    пропускается и возвращается то же имя — без суффиксов ``_AbCd123``. Поэтому файлы могут быть общими у
+    нескольких записей и не должны удаляться вместе с одной из них.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = content_digest(content)
+        directory, filename = posixpath.split(name.replace("\\", "/"))
+        extension = os.path.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        try:
+            return super().save(name, content, max_length=max_length)
+        except _HashNameTaken:
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Сюда приходит и _save(), когда файл успели создать между exists() и
+        # записью: содержимое то же самое, поэтому новое имя не подбираем.
+        if self.exists(name):
+            raise _HashNameTaken(name)
+        return super().get_available_name(name, max_length=max_length)
+
+
+def attachment_storage():
+    return ContentHashStorage()
@@ -0,0 +1,62 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from graceproject.db_routers import primary_reads
+
+from ..versions import get_versions, record_fragment
+
+register = template.Library()
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, models, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.models = models
+        self.vary_on = vary_on
+
+    def render(self, context):
+        models = self.models.resolve(context).split() if self.models else []
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, [*get_versions(models), *vary_on])
+        value = cache.get(key)
+        record_fragment(self.fragment_name, hit=value is not None)
+        if value is None:
+            # Фрагмент кэшируется под новой версией — его данные берём с основной
+            # базы, а не с реплики, которая могла ещё не получить запись.
+            with primary_reads():
+                value = self.nodelist.render(context)
+            timeout = getattr(settings, "PORTAL_FRAGMENT_TIMEOUT", FRAGMENT_TIMEOUT)
+            cache.set(key, value, timeout)
+        return value
+
+
+@register.tag("versioned_cache")
+def do_versioned_cache(parser, token):
+    """Кэширует фрагмент шаблона до изменения перечисленных моделей::
+
+        {% versioned_cache "low-stock" models="inventoryitem" %}…{% endversioned_cache %}
+        {% versioned_cache "nav" request.resolver_match.url_name %}…{% endversioned_cache %}
+
+    Первый аргумент — имя фрагмента (оно же в статистике ``fragment_cache_stats``),
+    ``models`` — имена моделей через пробел, остальные аргументы — значения,
+    от которых зависит содержимое.
+    """
+    nodelist = parser.parse(("endversioned_cache",))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError("'versioned_cache' требует имя фрагмента")
+    fragment_name = bits[1].strip("\"'")
+    models = None
+    vary_on = []
+    for bit in bits[2:]:
+        if bit.startswith("models="):
+            models = parser.compile_filter(bit[len("models="):])
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    return VersionedCacheNode(nodelist, fragment_name, models, vary_on)
@@ -1,3 +1,1105 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import partial
+from inspect import iscoroutinefunction
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, router, transaction
+from django.http import HttpResponse, QueryDict
+from django.template import Context, Template
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from PIL import Image
+
+from graceproject.db_routers import (
+    PIN_COOKIE,
+    REPLICA_ALIAS,
+    primary_reads,
+    replica_configured,
+    use_replica,
+)
+
+from . import views
+from .archive import get_archive_months, merge_archive_months
+from .concurrency import gather_queries
+from .dashboard import get_dashboard_snapshot
+from .forms import CalculatorItemFormSet, InventoryUsageForm, OrderItemFormSet
+from .instrumentation import QueryInstrumentationMiddleware
+from .media import parse_range
+from .models import (
+    Client,
+    DefectRecord,
+    Expense,
+    InventoryItem,
+    InventoryMovement,
+    InventoryUsage,
+    MonthlyRollup,
+    Order,
+    OrderItem,
+    SearchDocument,
+)
+from .pagination import _decode_cursor, _encode_cursor, paginate_keyset
+from .search import index_objects, search
+from .stock import STOCK_UPDATE_CHUNK, apply_stock_deltas, refresh_usage_velocity, stock_drift
+from .storage import ContentHashStorage, digest_of
+from .thumbnails import build_thumbnail, is_image, render_thumbnail
+from .versions import bump_versions, fragment_stats, record_fragment
+from .views import _month_context
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN проверяется только на SQLite")
+class MonthFilterIndexTests(TestCase):
+    month_start = date(2025, 3, 1)
+    month_end = date(2025, 4, 1)
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f"INDEX {index_name}", plan)
+        self.assertNotIn("SCAN", plan.replace("USING INDEX", ""))
+
+    def test_orders_created_at_range(self):
+        queryset = Order.objects.filter(
+            created_at__gte=datetime.combine(self.month_start, time.min),
+            created_at__lt=datetime.combine(self.month_end, time.min),
+        ).order_by("-created_at")
+        self.assertUsesIndex(queryset, "portal_order_created_idx")
+
+    def test_orders_by_status(self):
+        self.assertUsesIndex(
+            Order.objects.filter(status=Order.Status.OFFICE), "portal_order_status_idx"
+        )
+
+    def test_expenses_month(self):
+        queryset = Expense.objects.filter(
+            expense_date__gte=self.month_start, expense_date__lt=self.month_end
+        )
+        self.assertUsesIndex(queryset, "portal_expense_date_idx")
+
+    def test_usages_month(self):
+        queryset = InventoryUsage.objects.filter(
+            usage_date__gte=self.month_start, usage_date__lt=self.month_end
+        )
+        self.assertUsesIndex(queryset, "portal_usage_date_idx")
+
+    def test_defects_month(self):
+        queryset = DefectRecord.objects.filter(
+            report_date__gte=self.month_start, report_date__lt=self.month_end
+        )
+        self.assertUsesIndex(queryset, "portal_defect_date_idx")
+
+
+@skipUnless(connection.vendor == "sqlite", "PRAGMA есть только у SQLite")
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(get_user_model().objects.create_user("manager"))
+        self.customer = Client.objects.create(name="Кафе")
+
+    def create_orders(self, count, status=Order.Status.DEVELOPMENT):
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(count):
+                order = Order.objects.create(
+                    title=f"Заказ {number}", client=self.customer, status=status
+                )
+                OrderItem.objects.create(order=order, title="Баннер", quantity=1, unit_price=10)
+
+    def test_index_queries_do_not_grow_with_orders(self):
+        self.create_orders(3)
+        # Месяцы архива, снимок счётчиков, заказы месяца, их строки, остатки.
+        with self.assertNumQueries(5):
+            self.client.get(reverse("portal:index"))
+        # Месяцы архива, снимок и фрагмент остатков — из кэша.
+        with self.assertNumQueries(2):
+            self.client.get(reverse("portal:index"))
+
+        self.create_orders(10)
+        self.client.get(reverse("portal:index"))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("portal:index"))
+        self.assertEqual(len(response.context["recent_orders"]), 13)
+
+    def test_snapshot_reset_after_commit(self):
+        self.create_orders(2)
+        self.assertEqual(get_dashboard_snapshot()["total"], 2)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Order.objects.create(title="Меню", client=self.customer, status=Order.Status.DONE)
+        self.assertEqual(get_dashboard_snapshot()["total"], 2)
+        for callback in callbacks:
+            callback()
+        snapshot = get_dashboard_snapshot()
+        self.assertEqual(snapshot["total"], 3)
+        self.assertEqual(snapshot["status_counts"][Order.Status.DONE], 1)
+
+
+class ArchiveMonthsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def expense(self, day):
+        return Expense.objects.create(supplier_name="Типография", expense_date=day, amount=100)
+
+    def test_months_descending_and_cached(self):
+        for day in (date(2025, 1, 31), date(2025, 3, 1), date(2025, 3, 31), date(2024, 12, 5)):
+            self.expense(day)
+        months = [date(2025, 3, 1), date(2025, 1, 1), date(2024, 12, 1)]
+        with self.assertNumQueries(1):
+            self.assertEqual(get_archive_months(Expense), months)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_archive_months(Expense), months)
+
+    def test_merge_archive_months(self):
+        self.expense(date(2025, 3, 10))
+        DefectRecord.objects.create(report_date=date(2025, 2, 1))
+        DefectRecord.objects.create(report_date=date(2025, 3, 2))
+        self.assertEqual(
+            merge_archive_months(Expense, DefectRecord), [date(2025, 3, 1), date(2025, 2, 1)]
+        )
+
+    def test_reset_after_commit(self):
+        expense = self.expense(date(2025, 3, 10))
+        self.assertEqual(get_archive_months(Expense), [date(2025, 3, 1)])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.expense(date(2025, 4, 2))
+        self.assertEqual(get_archive_months(Expense), [date(2025, 3, 1)])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_archive_months(Expense), [date(2025, 4, 1), date(2025, 3, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.delete()
+        self.assertEqual(get_archive_months(Expense), [date(2025, 4, 1)])
+
+    def test_month_context_clamped_to_archive(self):
+        months = [date(2025, 3, 1), date(2025, 1, 1)]
+        factory = RequestFactory()
+        cases = {
+            "2024-06": date(2025, 1, 1),
+            "2025-02": date(2025, 2, 1),
+            "2025-13": date.today().replace(day=1),
+            "bad": date.today().replace(day=1),
+        }
+        for month, expected in cases.items():
+            with self.subTest(month=month):
+                context = _month_context(factory.get("/", {"month": month}), months)
+                self.assertEqual(context["month_start"], expected)
+
+        context = _month_context(factory.get("/", {"month": "2025-01"}), months)
+        self.assertIsNone(context["previous_month"])
+        self.assertEqual(context["next_month"], date(2025, 2, 1))
+        self.assertEqual(context["month_end"], date(2025, 2, 1))
+
+        context = _month_context(factory.get("/"), [])
+        self.assertEqual(context["month_start"], date.today().replace(day=1))
+        self.assertIsNone(context["previous_month"])
+        self.assertIsNone(context["next_month"])
+
+
+class SQLitePragmaTests(TestCase):
+    def pragma(self, pragmas, name, database=None):
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            other = connection.copy()
+            if database:
+                other.settings_dict["NAME"] = database
+            try:
+                with other.cursor() as cursor:
+                    cursor.execute(f"PRAGMA {name}")
+                    return cursor.fetchone()[0]
+            finally:
+                other.close()
+
+    def test_applied_to_new_connections(self):
+        self.assertEqual(self.pragma({"busy_timeout": 1234}, "busy_timeout"), 1234)
+        self.assertEqual(self.pragma({"cache_size": -2048}, "cache_size"), -2048)
+
+    def test_journal_mode_only_on_request(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "db.sqlite3")
+            # Настройки по умолчанию не меняют заголовок файла базы.
+            self.assertEqual(self.pragma(settings.SQLITE_PRAGMAS, "journal_mode", database), "delete")
+            self.assertEqual(self.pragma({"journal_mode": "wal"}, "journal_mode", database), "wal")
+
+
+class RemoteChoiceTests(TestCase):
+    def test_item_created_in_bulk(self):
+        InventoryItem.objects.create(name="Баннер", sku="B-1")
+        # bulk_create не шлёт сигналов: поиск и проверка всё равно идут по базе.
+        (item,) = InventoryItem.objects.bulk_create([InventoryItem(name="Баннерная сетка", sku="B-2")])
+
+        response = self.client.get(reverse("portal:lookup", args=["items"]), {"q": "баннерная"})
+        self.assertEqual([row["id"] for row in response.json()["results"]], [item.pk])
+
+        form = InventoryUsageForm(
+            data={"usage_date": "2025-03-05", "item": str(item.pk), "quantity": "1"}
+        )
+        # Выбранный товар читается один раз; второй запрос — проверка ForeignKey
+        # в Model.full_clean.
+        with self.assertNumQueries(2):
+            self.assertTrue(form.is_valid(), form.errors)
+            self.assertIn(f'value="{item.pk}" selected', str(form["item"]))
+        self.assertEqual(form.cleaned_data["item"], item)
+
+    def test_formset_reads_selected_items_once(self):
+        items = InventoryItem.objects.bulk_create(
+            InventoryItem(name=f"Плёнка {index}", sku=f"F-{index}") for index in range(20)
+        )
+        data = {"items-TOTAL_FORMS": "21", "items-INITIAL_FORMS": "0"}
+        for index, item in enumerate(items):
+            data[f"items-{index}-product"] = str(item.pk)
+            data[f"items-{index}-quantity"] = "1"
+            data[f"items-{index}-unit_price"] = "10"
+        data.update({"items-20-product": "999", "items-20-quantity": "1", "items-20-unit_price": "1"})
+        formset = CalculatorItemFormSet(data, prefix="items")
+
+        # Проверка и рендер всех строк — один запрос pk__in.
+        with self.assertNumQueries(1):
+            self.assertFalse(formset.is_valid())
+            html = str(formset)
+        self.assertEqual([form.cleaned_data["product"] for form in formset.forms[:20]], items)
+        self.assertEqual(formset.forms[20].errors["product"].as_data()[0].code, "invalid_choice")
+        self.assertIn(f'value="{items[-1].pk}" selected', html)
+
+    def test_unknown_item_is_invalid(self):
+        form = InventoryUsageForm(data={"usage_date": "2025-03-05", "item": "999", "quantity": "1"})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["item"].as_data()[0].code, "invalid_choice")
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.item = InventoryItem.objects.create(
+            name="Плёнка", sku="F-1", opening_quantity=10, quantity_on_hand=10
+        )
+        self.other = InventoryItem.objects.create(
+            name="Баннер", sku="B-1", opening_quantity=5, quantity_on_hand=5
+        )
+
+    def assertStock(self, item, expected):
+        item.refresh_from_db()
+        self.assertEqual(item.quantity_on_hand, Decimal(expected))
+
+    def test_usage_create_edit_delete(self):
+        usage = InventoryUsage.objects.create(item=self.item, quantity=Decimal("1.10"))
+        self.assertStock(self.item, "8.90")
+
+        usage.quantity = Decimal("2.30")
+        usage.save()
+        self.assertStock(self.item, "7.70")
+
+        usage.item = self.other
+        usage.save()
+        self.assertStock(self.item, "10")
+        self.assertStock(self.other, "2.70")
+
+        usage.delete()
+        self.assertStock(self.other, "5")
+
+    def test_movement_create_edit_delete(self):
+        movement = InventoryMovement.objects.create(
+            item=self.item, direction=InventoryMovement.Direction.IN, quantity=4
+        )
+        self.assertStock(self.item, "14")
+
+        movement.direction = InventoryMovement.Direction.OUT
+        movement.save()
+        self.assertStock(self.item, "6")
+
+        movement.delete()
+        self.assertStock(self.item, "10")
+
+    def test_float_quantity_delta(self):
+        # Количество, присвоенное float до сохранения, не даёт хвостов двоичной дроби.
+        usage = InventoryUsage(item=self.item, quantity=0.1)
+        movement = InventoryMovement(item=self.item, direction=InventoryMovement.Direction.IN, quantity=0.1)
+        self.assertEqual(usage.stock_delta(), Decimal("-0.1"))
+        self.assertEqual(movement.stock_delta(), Decimal("0.1"))
+
+    def test_no_drift_for_fractional_sums(self):
+        # 10 − 0.1 − 2.2 = 7.7; сумма во float на SQLite не должна давать расхождение.
+        InventoryUsage.objects.create(item=self.item, quantity=Decimal("0.10"))
+        InventoryUsage.objects.create(item=self.item, quantity=Decimal("2.20"))
+        self.assertStock(self.item, "7.70")
+        self.assertFalse(stock_drift().exists())
+
+        out = StringIO()
+        call_command("reconcile_stock", stdout=out)
+        self.assertIn("Расхождений нет", out.getvalue())
+
+    def test_reconcile_fix(self):
+        InventoryUsage.objects.create(item=self.item, quantity=Decimal("0.10"))
+        InventoryUsage.objects.create(item=self.item, quantity=Decimal("2.20"))
+        # update() мимо сигналов — остаток разошёлся с журналом.
+        InventoryItem.objects.filter(pk=self.item.pk).update(quantity_on_hand=3)
+        self.assertEqual(list(stock_drift().values_list("sku", flat=True)), ["F-1"])
+
+        out = StringIO()
+        call_command("reconcile_stock", stdout=out)
+        self.assertIn("по журналу 7.70", out.getvalue())
+        self.assertStock(self.item, "3")
+
+        call_command("reconcile_stock", "--fix", stdout=StringIO())
+        self.assertStock(self.item, "7.70")
+        self.assertStock(self.other, "5")
+        self.assertFalse(stock_drift().exists())
+
+    def test_apply_deltas_in_bulk(self):
+        items = InventoryItem.objects.bulk_create(
+            InventoryItem(name=f"Товар {index}", sku=f"T-{index}", quantity_on_hand=10)
+            for index in range(STOCK_UPDATE_CHUNK + 1)
+        )
+        deltas = {item.pk: Decimal("-1.25") if index % 2 else Decimal(3) for index, item in enumerate(items)}
+        # Две пачки по блокировке и UPDATE, пересчёт запаса в днях и savepoint.
+        with self.assertNumQueries(7):
+            apply_stock_deltas(deltas)
+        self.assertStock(items[0], "13")
+        self.assertStock(items[-2], "8.75")
+        self.assertStock(items[-1], "13")
+        self.assertStock(self.item, "10")
+
+    def test_usage_velocity(self):
+        # Целые количества: на SQLite деление не должно стать целочисленным.
+        InventoryUsage.objects.create(item=self.item, quantity=3, usage_date=date.today())
+        refresh_usage_velocity()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.avg_daily_usage, Decimal("0.033"))
+        # 7 / (3 / 90); на бэкендах с точным decimal средний расход уже округлён до 0.033.
+        self.assertAlmostEqual(self.item.days_of_cover, Decimal("210"), delta=3)
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5-индекс есть только на SQLite")
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.client_record = Client.objects.create(name="Ёлочная типография", phone="+7 (701) 123-45-67")
+
+    def kinds(self, query):
+        return [(hit.kind, hit.object_id) for hit in search(query)]
+
+    def test_triggers_follow_documents(self):
+        client_hit = ("client", self.client_record.pk)
+        self.assertEqual(self.kinds("елочн"), [client_hit])
+        self.assertEqual(self.kinds("7011234567"), [client_hit])
+        self.assertIn("<mark>7011234567</mark>", search("7011234567")[0].snippet)
+
+        self.client_record.name = "Печатный двор"
+        self.client_record.save()
+        self.assertEqual(self.kinds("елочн"), [])
+        self.assertEqual(self.kinds("печат двор"), [client_hit])
+
+        self.client_record.delete()
+        self.assertEqual(self.kinds("печат"), [])
+
+    def test_order_items_reindex_order_once(self):
+        order = Order.objects.create(title="Вывеска", client=self.client_record)
+        with patch("portal.search.index_objects", wraps=index_objects) as reindex:
+            with self.captureOnCommitCallbacks(execute=True):
+                for title in ("Люверсы", "Баннер", "Монтаж"):
+                    OrderItem.objects.create(order=order, title=title)
+        self.assertEqual(reindex.call_count, 1)
+        self.assertEqual(self.kinds("люверс"), [("order", order.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.items.filter(title="Люверсы").delete()
+        self.assertEqual(self.kinds("люверс"), [])
+        self.assertEqual(self.kinds("баннер"), [("order", order.pk)])
+
+    def test_fallback_without_fts(self):
+        item = InventoryItem.objects.create(name="Плёнка оракал", sku="ORA-1")
+        with patch("portal.search.fts_available", return_value=False):
+            hits = search("оракал")
+        self.assertEqual([(hit.kind, hit.object_id) for hit in hits], [("item", item.pk)])
+        self.assertIn("оракал", hits[0].snippet)
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.kinds("типогр"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.kinds("типогр"), [("client", self.client_record.pk)])
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_hits_and_misses(self):
+        template = Template(
+            '{% load portal_cache %}{% versioned_cache "test-fragment" models="order" %}'
+            "{{ value }}{% endversioned_cache %}"
+        )
+        self.assertEqual(template.render(Context({"value": 1})), "1")
+        self.assertEqual(template.render(Context({"value": 2})), "1")
+        self.assertEqual(fragment_stats()["test-fragment"], (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_versions(Order)
+        self.assertEqual(template.render(Context({"value": 3})), "3")
+        self.assertEqual(fragment_stats()["test-fragment"], (1, 2))
+
+    def test_stats_page(self):
+        record_fragment("test-fragment", hit=False)
+        record_fragment("test-fragment", hit=True)
+        url = reverse("portal:fragment_stats")
+        self.client.force_login(get_user_model().objects.create_user("clerk"))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(get_user_model().objects.create_user("admin", is_staff=True))
+        response = self.client.get(url)
+        self.assertContains(response, "test-fragment")
+        self.assertContains(response, "50,0%")
+
+        self.client.post(url)
+        self.assertEqual(fragment_stats(), {})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        Expense.objects.create(supplier_name="Типография", expense_date=date(2025, 3, 5), amount=100)
+        Expense.objects.create(supplier_name="Плёнка", expense_date=date(2025, 2, 10), amount=40)
+
+    def export(self, dataset, fmt, **params):
+        return self.client.get(reverse("portal:export", kwargs={"dataset": dataset, "fmt": fmt}), params)
+
+    def test_csv_streams_month(self):
+        response = self.export("expenses", "csv", month="2025-03")
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="expenses_2025-03.csv"', response["Content-Disposition"])
+        lines = response.getvalue().decode().splitlines()
+        self.assertEqual(lines, ["\ufeffДата;Поставщик;Комментарий;Сумма", "05.03.2025;Типография;;100.00"])
+
+    def test_xlsx_range(self):
+        # Границы периода в обратном порядке меняются местами.
+        response = self.export("report", "xlsx", **{"from": "2025-03", "to": "2025-02"})
+        self.assertIn('filename="report_2025-02_2025-03.xlsx"', response["Content-Disposition"])
+        sheet = load_workbook(BytesIO(response.getvalue()), read_only=True).active
+        rows = list(sheet.iter_rows(min_row=2, values_only=True))
+        self.assertEqual(
+            [(kind, supplier) for kind, _, supplier, _, _ in rows],
+            [("Расход", "Плёнка"), ("Расход", "Типография")],
+        )
+        self.assertEqual(rows[0][1], datetime(2025, 2, 10))
+
+    def test_out_of_range_month_falls_back(self):
+        current = date.today().strftime("%Y-%m")
+        for params in ({"month": "9999-12"}, {"to": "9999-12"}, {"month": "0-01"}, {"month": "2025-13"}):
+            with self.subTest(params=params):
+                response = self.export("expenses", "csv", **params)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(f"expenses_{current}.csv", response["Content-Disposition"])
+
+    def test_unknown_dataset(self):
+        self.assertEqual(self.export("clients", "csv").status_code, 404)
+        self.assertEqual(self.export("expenses", "pdf").status_code, 404)
+
+
+class OrderItemFormSetTests(TestCase):
+    def setUp(self):
+        client = Client.objects.create(name="Кафе")
+        self.order = Order.objects.create(title="Вывеска", client=client)
+        self.items = [
+            OrderItem.objects.create(order=self.order, title=title, quantity=1, unit_price=10)
+            for title in ("Баннер", "Люверсы", "Монтаж")
+        ]
+        self.foreign = OrderItem.objects.create(
+            order=Order.objects.create(title="Меню", client=client), title="Печать"
+        )
+
+    def data(self, **changes):
+        data = {"items-TOTAL_FORMS": "3", "items-INITIAL_FORMS": "3"}
+        for index, item in enumerate(self.items):
+            data.update(
+                {
+                    f"items-{index}-id": str(item.pk),
+                    f"items-{index}-title": item.title,
+                    f"items-{index}-quantity": "1.00",
+                    f"items-{index}-unit_price": "10.00",
+                }
+            )
+        data.update(changes)
+        return data
+
+    def formset(self, data):
+        return OrderItemFormSet(data, queryset=self.order.items.all(), prefix="items")
+
+    def test_rows_resolved_from_formset_queryset(self):
+        formset = self.formset(self.data(**{"items-1-quantity": "3"}))
+        with self.assertNumQueries(1):
+            self.assertTrue(formset.is_valid(), formset.errors)
+        self.assertEqual([form.cleaned_data["id"] for form in formset], self.items)
+        self.assertEqual([form.has_changed() for form in formset], [False, True, False])
+
+    def test_row_of_another_order_is_rejected(self):
+        formset = self.formset(self.data(**{"items-2-id": str(self.foreign.pk)}))
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(formset.forms[2].errors["id"].as_data()[0].code, "invalid_choice")
+
+    def test_order_detail_saves_changed_rows(self):
+        data = self.data(**{"items-1-quantity": "3", "action": "save"})
+        data.update({"order-title": "Вывеска", "order-status": self.order.status})
+        response = self.client.post(reverse("portal:order_detail", args=[self.order.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal("50"))
+        self.assertEqual(OrderItem.objects.get(pk=self.items[1].pk).quantity, Decimal("3"))
+
+
+class ImportMaterialsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.items = InventoryItem.objects.bulk_create(
+            InventoryItem(name=f"Плёнка {index}", sku=f"F-{index}", quantity_on_hand=10)
+            for index in range(60)
+        )
+
+    def run_import(self, rows):
+        path = os.path.join(self.directory, f"materials-{len(rows)}.xlsx")
+        workbook = Workbook()
+        workbook.active.append(["Дата", "Товар", "Количество", "Ед. изм.", "Проект"])
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        with CaptureQueriesContext(connection) as captured:
+            call_command("import_materials", "--file", path, stdout=StringIO())
+        return len(captured)
+
+    def rows(self, count):
+        # Каждая строка — свой товар, плюс одна строка с новым товаром.
+        return [("05.03.2025", item.name, 1.5, "шт", "") for item in self.items[:count]] + [
+            ("05.03.2025", f"Новый товар {count}", 1, "шт", "")
+        ]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        few = self.run_import(self.rows(5))
+        many = self.run_import(self.rows(60))
+        self.assertEqual(few, many)
+        self.items[59].refresh_from_db()
+        self.assertEqual(self.items[59].quantity_on_hand, Decimal("8.50"))
+        self.assertEqual(InventoryItem.objects.get(name="Новый товар 60").quantity_on_hand, Decimal("-1"))
+
+
+class ImportInventoryTests(TestCase):
+    header = [
+        "SKU",
+        "Название",
+        "Категория",
+        "Ед.",
+        "Упаковка",
+        "Маркировка упаковки",
+        "Цена",
+        "Остаток",
+        "Локация",
+        "Примечание",
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.film = InventoryItem.objects.create(
+            name="Плёнка", sku="F-1", quantity_on_hand=10, opening_quantity=10, default_unit_price=5
+        )
+        self.banner = InventoryItem.objects.create(
+            name="Баннер",
+            sku="B-1",
+            base_unit=InventoryItem.Unit.SQUARE_METER,
+            quantity_on_hand=3,
+            opening_quantity=3,
+        )
+
+    def run_import(self, rows, name="inventory.xlsx"):
+        path = os.path.join(self.directory, name)
+        workbook = Workbook()
+        workbook.active.append(self.header)
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as captured:
+            call_command("import_inventory", "--file", path, stdout=stdout)
+        return stdout.getvalue(), len(captured)
+
+    def test_upsert_by_sku(self):
+        output, _ = self.run_import(
+            [
+                # Остаток изменился — это инвентаризация.
+                ("F-1", "Плёнка", "", "шт", None, "", 5, 12.5, "", ""),
+                # Без изменений: значения из файла приводятся к типам полей.
+                ("B-1", "Баннер", "", "м2", None, "", 0, 3, "", ""),
+                ("L-1", "Люверсы", "Фурнитура", "pcs", 100, "пачка", 2, 400, "Склад", ""),
+                ("L-1", "Люверсы 10 мм", "Фурнитура", "pcs", 100, "пачка", 2, 500, "Склад", ""),
+                (None, "Без артикула", "", "шт", None, "", 1, 1, "", ""),
+            ]
+        )
+        self.assertIn("Создано: 1, обновлено: 1, без изменений: 1, пропущено строк: 1", output)
+
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.quantity_on_hand, Decimal("12.5"))
+        self.assertEqual(self.film.opening_quantity, Decimal("12.5"))
+        eyelets = InventoryItem.objects.get(sku="L-1")
+        self.assertEqual(eyelets.name, "Люверсы 10 мм")
+        self.assertEqual(eyelets.quantity_on_hand, Decimal("500"))
+        self.assertEqual(eyelets.opening_quantity, Decimal("500"))
+        self.assertEqual([hit.object_id for hit in search("люверсы")], [eyelets.pk])
+
+    def test_renamed_item_gets_new_search_key(self):
+        self.run_import([("F-1", "Ёлочная плёнка", "", "шт", None, "", 5, 10, "", "")])
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.name_key, "ёлочная плёнка")
+        self.assertEqual(self.film.opening_quantity, Decimal("10"))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def rows(count):
+            return [
+                (f"S-{index}", f"Товар {index}", "", "шт", None, "", 1, index, "", "")
+                for index in range(count)
+            ]
+
+        _, few = self.run_import(rows(5), "few.xlsx")
+        _, many = self.run_import(rows(60), "many.xlsx")
+        self.assertEqual(few, many)
+
+
+class ExpenseRollupTests(TestCase):
+    def rollup(self, month):
+        return MonthlyRollup.objects.filter(month=month).values_list("expense", flat=True).first()
+
+    def test_string_date(self):
+        expense = Expense.objects.create(supplier_name="Типография", expense_date="2024-03-05", amount=100)
+        self.assertEqual(self.rollup(date(2024, 3, 1)), Decimal("100"))
+
+        expense.expense_date = "2024-04-01"
+        expense.save()
+        self.assertEqual(self.rollup(date(2024, 3, 1)), Decimal("0"))
+        self.assertEqual(self.rollup(date(2024, 4, 1)), Decimal("100"))
+
+    def test_raw_save_skips_rollup(self):
+        # Как loaddata: raw-сохранение берёт все поля как есть, включая даты записи.
+        now = timezone.now()
+        expense = Expense(
+            supplier_name="Типография",
+            expense_date=date(2024, 3, 5),
+            amount=100,
+            created_at=now,
+            updated_at=now,
+        )
+        expense.save_base(raw=True)
+        self.assertIsNone(self.rollup(date(2024, 3, 1)))
+
+
+class KeysetPaginationTests(TestCase):
+    ordering = ("-expense_date", "-id")
+
+    def setUp(self):
+        # bulk_create — без сигналов пересчёта сводок; три расхода с одной датой.
+        self.expenses = Expense.objects.bulk_create(
+            Expense(supplier_name=f"Поставщик {index}", expense_date=expense_date, amount=10)
+            for index, expense_date in enumerate(
+                [date(2025, 3, 1), date(2025, 3, 5), date(2025, 3, 5), date(2025, 3, 5), date(2025, 3, 9)]
+            )
+        )
+        self.expected = sorted(self.expenses, key=lambda e: (e.expense_date, e.pk), reverse=True)
+
+    def page(self, **params):
+        request = RequestFactory().get("/", params)
+        return paginate_keyset(request, Expense.objects.all(), self.ordering, per_page=2)
+
+    def follow(self, page, direction):
+        query = page.next_query if direction == "next" else page.previous_query
+        return self.page(**QueryDict(query).dict())
+
+    def test_cursor_round_trip(self):
+        expense = self.expenses[1]
+        cursor = _encode_cursor(expense, self.ordering)
+        self.assertEqual(_decode_cursor(Expense, self.ordering, cursor), [date(2025, 3, 5), expense.pk])
+
+    def test_walk_forward_and_back(self):
+        first = self.page()
+        self.assertEqual(list(first), self.expected[:2])
+        self.assertFalse(first.has_previous)
+
+        # Вторая страница начинается посреди одинаковых дат — порядок решает id.
+        second = self.follow(first, "next")
+        self.assertEqual(list(second), self.expected[2:4])
+        self.assertTrue(second.has_previous)
+
+        last = self.follow(second, "next")
+        self.assertEqual(list(last), self.expected[4:])
+        self.assertFalse(last.has_next)
+        self.assertEqual(last.next_query, "")
+
+        self.assertEqual(list(self.follow(last, "previous")), self.expected[2:4])
+        self.assertEqual(list(self.follow(second, "previous")), self.expected[:2])
+
+    def test_invalid_cursor_shows_first_page(self):
+        wrong_length = _encode_cursor(self.expenses[0], ("-expense_date",))
+        for cursor in ("не-курсор", "e30", "WyJ4IiwgMV0", wrong_length):
+            with self.subTest(cursor=cursor):
+                page = self.page(after=cursor)
+                self.assertEqual(list(page), self.expected[:2])
+                self.assertFalse(page.has_previous)
+
+    def test_cursor_past_the_end(self):
+        cursor = _encode_cursor(self.expected[-1], self.ordering)
+        page = self.page(after=cursor)
+        self.assertEqual(list(page), [])
+        self.assertFalse(page.has_next)
+        # Пустая страница ведёт на первую, а не на «предыдущую» от курсора.
+        self.assertTrue(page.has_previous)
+        self.assertEqual(page.previous_query, "")
+
+
+class ExpenseFileTests(TestCase):
+    content = b"0123456789"
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # PDF — превью не строится, фоновых задач нет.
+        self.expense = Expense.objects.create(
+            supplier_name="Типография",
+            expense_date=date(2025, 3, 5),
+            amount=100,
+            attachment=ContentFile(self.content, name="check.pdf"),
+        )
+        self.url = reverse("portal:expense_file", args=[self.expense.pk, "file"])
+        self.client.force_login(get_user_model().objects.create_user("accountant"))
+
+    def test_parse_range(self):
+        cases = {
+            "bytes=2-5": (2, 5),
+            "bytes=4-": (4, 9),
+            "bytes=2-100": (2, 9),
+            "bytes=-4": (6, 9),
+            "bytes=-20": (0, 9),
+            "bytes=10-": False,
+            "bytes=5-2": False,
+            "bytes=-0": False,
+            "bytes=0-1,5-6": None,
+            "bytes=-": None,
+            "items=0-1": None,
+            "": None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, len(self.content)), expected)
+
+    def test_full_file_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), self.content)
+        etag = response["ETag"]
+
+        last_modified = response["Last-Modified"]
+
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response["Last-Modified"], last_modified)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        response = self.client.get(self.url, headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_range(self):
+        response = self.client.get(self.url, headers={"Range": "bytes=2-5"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response.getvalue(), b"2345")
+
+        response = self.client.get(self.url, headers={"Range": "bytes=-3"})
+        self.assertEqual(response.getvalue(), b"789")
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, headers={"Range": "bytes=20-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_multiple_ranges_and_stale_if_range(self):
+        response = self.client.get(self.url, headers={"Range": "bytes=0-1,5-6"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), self.content)
+
+        # Файл сменился с тех пор, как клиент получил часть: отдаётся целиком.
+        response = self.client.get(
+            self.url, headers={"Range": "bytes=2-5", "If-Range": '"old"'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), self.content)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+def image_file(name="photo.png", size=(1200, 800), color="red", mode="RGB"):
+    output = BytesIO()
+    Image.new(mode, size, color).save(output, "PNG")
+    return ContentFile(output.getvalue(), name=name)
+
+
+class MediaRootMixin:
+    def use_temp_media_root(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return media_root.name
+
+
+class ContentHashStorageTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        self.root = self.use_temp_media_root()
+        self.storage = ContentHashStorage()
+
+    def test_same_content_stored_once(self):
+        first = self.storage.save("expenses/check.PDF", ContentFile(b"content"))
+        second = self.storage.save("expenses/other.pdf", ContentFile(b"content"))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r"^expenses/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$")
+        self.assertEqual(first.split("/")[1], digest_of(first)[:2])
+        self.assertNotEqual(first, self.storage.save("expenses/check.pdf", ContentFile(b"other")))
+
+    def test_concurrent_upload_keeps_hash_name(self):
+        name = self.storage.save("expenses/check.pdf", ContentFile(b"content"))
+        # Параллельная загрузка успела записать файл между exists() и записью.
+        with patch.object(ContentHashStorage, "exists", side_effect=[False, True]):
+            self.assertEqual(self.storage.save("expenses/check.pdf", ContentFile(b"content")), name)
+        self.assertEqual(len(os.listdir(os.path.dirname(self.storage.path(name)))), 1)
+
+
+class ThumbnailTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        self.use_temp_media_root()
+
+    def expense(self, attachment):
+        return Expense.objects.create(
+            supplier_name="Типография",
+            expense_date=date(2025, 3, 5),
+            amount=100,
+            attachment=attachment,
+        )
+
+    def test_is_image(self):
+        self.assertTrue(is_image("expenses/ab/photo.JPG"))
+        self.assertTrue(is_image("photo.png"))
+        self.assertFalse(is_image("check.pdf"))
+        self.assertFalse(is_image(""))
+
+    def test_render_thumbnail(self):
+        with Image.open(BytesIO(render_thumbnail(image_file(color=(0, 0, 0, 0), mode="RGBA")))) as thumbnail:
+            self.assertEqual(thumbnail.format, "JPEG")
+            self.assertEqual(thumbnail.size, (480, 320))
+
+    def test_build_thumbnail_shared_between_copies(self):
+        first = self.expense(image_file())
+        second = self.expense(image_file(name="copy.png"))
+        self.assertEqual(first.attachment.name, second.attachment.name)
+
+        name = build_thumbnail(first.pk)
+        self.assertTrue(name.startswith("expenses/thumbs/"))
+        with patch("portal.thumbnails.render_thumbnail") as render:
+            self.assertEqual(build_thumbnail(second.pk), name)
+        render.assert_not_called()
+        self.assertEqual(set(Expense.objects.values_list("thumbnail", flat=True)), {name})
+
+    def test_build_thumbnail_skips_documents(self):
+        expense = self.expense(ContentFile(b"%PDF-1.4", name="check.pdf"))
+        self.assertEqual(build_thumbnail(expense.pk), "")
+        self.assertEqual(build_thumbnail(expense.pk + 1), "")
+        expense.refresh_from_db()
+        self.assertFalse(expense.thumbnail)
+
+
+class BuildThumbnailsCommandTests(MediaRootMixin, TransactionTestCase):
+    # Команда строит превью в потоках со своими соединениями: данные должны быть закоммичены.
+
+    def setUp(self):
+        self.use_temp_media_root()
+
+    def test_builds_missing_thumbnails(self):
+        with patch("portal.signals.schedule_thumbnail"):
+            photos = [
+                Expense.objects.create(
+                    supplier_name="Типография",
+                    expense_date=date(2025, 3, 5),
+                    amount=100,
+                    attachment=image_file(color=color),
+                )
+                for color in ("red", "red", "blue")
+            ]
+            Expense.objects.create(
+                supplier_name="Типография",
+                expense_date=date(2025, 3, 5),
+                amount=100,
+                attachment=ContentFile(b"%PDF-1.4", name="check.pdf"),
+            )
+        stdout = StringIO()
+        call_command("build_thumbnails", "--workers", "2", stdout=stdout)
+        self.assertIn("Превью готово: 3; не изображения: 1; с ошибкой: 0", stdout.getvalue())
+        thumbnails = dict(
+            Expense.objects.filter(pk__in=[photo.pk for photo in photos]).values_list(
+                "pk", "thumbnail"
+            )
+        )
+        self.assertEqual(thumbnails[photos[0].pk], thumbnails[photos[1].pk])
+        self.assertNotEqual(thumbnails[photos[0].pk], thumbnails[photos[2].pk])
+        self.assertTrue(all(thumbnails.values()))
+
+
+@override_settings(PORTAL_CONCURRENT_QUERIES=True, SQLITE_PRAGMAS={})
+class GatherQueriesTests(TransactionTestCase):
+    # Рабочие потоки открывают свои соединения и видят только закоммиченные данные.
+
+    def setUp(self):
+        customer = Client.objects.create(name="Кафе")
+        for title in ("Вывеска", "Меню"):
+            Order.objects.create(title=title, client=customer)
+
+    def count_orders(self, barrier=None):
+        if barrier is not None:
+            # Дождаться второго вызова: при последовательном выполнении — таймаут.
+            barrier.wait()
+        return threading.get_ident(), Order.objects.count()
+
+    def test_calls_run_concurrently_in_order(self):
+        barrier = threading.Barrier(2, timeout=5)
+        results = async_to_sync(gather_queries)(
+            partial(self.count_orders, barrier),
+            partial(self.count_orders, barrier),
+            lambda: "без запросов",
+        )
+        (first, first_count), (second, second_count), last = results
+        self.assertEqual((first_count, second_count, last), (2, 2, "без запросов"))
+        self.assertNotEqual(first, second)
+        self.assertNotIn(threading.get_ident(), {first, second})
+
+    def test_sequential_inside_transaction(self):
+        with transaction.atomic():
+            Order.objects.create(title="Визитки", client=Client.objects.first())
+            results = async_to_sync(gather_queries)(self.count_orders, self.count_orders)
+        self.assertEqual([count for _, count in results], [3, 3])
+        self.assertEqual(len({thread for thread, _ in results}), 1)
+
+    @override_settings(PORTAL_CONCURRENT_QUERIES=False)
+    def test_sequential_when_disabled(self):
+        results = async_to_sync(gather_queries)(self.count_orders, self.count_orders)
+        self.assertEqual(len({thread for thread, _ in results}), 1)
+
+    @override_settings(PORTAL_INSTRUMENTATION=True)
+    def test_worker_queries_are_counted(self):
+        def view(request):
+            async_to_sync(gather_queries)(self.count_orders, self.count_orders)
+            Order.objects.exists()
+            return HttpResponse()
+
+        response = QueryInstrumentationMiddleware(view)(RequestFactory().get("/"))
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+
+
+@override_settings(PORTAL_CONCURRENT_QUERIES=True, SQLITE_PRAGMAS={})
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.async_client.force_login(get_user_model().objects.create_user("manager"))
+        customer = Client.objects.create(name="Кафе")
+        for title, amount in (("Вывеска", 300), ("Меню", 200)):
+            Order.objects.create(title=title, client=customer, total_amount=amount)
+        Expense.objects.create(supplier_name="Типография", expense_date=date.today(), amount=120)
+
+    def test_views_are_async(self):
+        self.assertTrue(iscoroutinefunction(views.index))
+        self.assertTrue(iscoroutinefunction(views.report))
+
+    async def test_index(self):
+        response = await self.async_client.get(reverse("portal:index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {order.title for order in response.context["recent_orders"]}, {"Вывеска", "Меню"}
+        )
+        self.assertEqual(response.context["status_summary"]["total"], 2)
+
+    async def test_report(self):
+        response = await self.async_client.get(reverse("portal:report"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["income_total"], Decimal("500"))
+        self.assertEqual(response.context["expense_total"], Decimal("120"))
+        self.assertEqual(response.context["net_total"], Decimal("380"))
+        self.assertEqual(len(response.context["income_rows"]), 2)
+        self.assertEqual(len(response.context["expense_rows"]), 1)
+
+
+@skipUnless(replica_configured(), "нужен алиас replica: GRACE_DB_PROFILE=sqlite-replica")
+class ReplicaRouterTests(TransactionTestCase):
+    # У реплики TEST MIRROR = default: в тестах это та же база, но другое
+    # соединение, поэтому без обёртки TestCase в транзакцию — иначе запись не видна.
+    databases = {"default", REPLICA_ALIAS} if replica_configured() else {"default"}
+
+    @staticmethod
+    @use_replica
+    def read_alias_view(request):
+        with primary_reads():
+            primary = router.db_for_read(Order)
+        return HttpResponse(f"{router.db_for_read(Order)} {primary}")
+
+    def read_alias(self, request):
+        return self.read_alias_view(request).content.decode().split()
+
+    def test_get_reads_from_replica(self):
+        request = RequestFactory().get("/")
+        self.assertEqual(self.read_alias(request), [REPLICA_ALIAS, "default"])
+        self.assertEqual(router.db_for_read(Order), "default")
+        self.assertEqual(router.db_for_write(Order), "default")
+
+    def test_post_and_pinned_reads_from_primary(self):
+        self.assertEqual(self.read_alias(RequestFactory().post("/")), ["default", "default"])
+        request = RequestFactory().get("/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        self.assertEqual(self.read_alias(request), ["default", "default"])
+
+    def test_mirror_sees_primary_writes(self):
+        order = Order.objects.create(title="Вывеска", client=Client.objects.create(name="Кафе"))
+        self.assertTrue(Order.objects.using(REPLICA_ALIAS).filter(pk=order.pk).exists())
+
+    def test_successful_write_pins_primary(self):
+        response = self.client.post(
+            reverse("portal:defects"),
+            {"report_date": "2025-03-05", "status": DefectRecord.Status.CLOSED},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post(reverse("portal:lookup", args=["unknown"]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Expense
+
+logger = logging.getLogger("portal.thumbnails")
+
+DEFAULT_SIZE = (480, 480)
+DEFAULT_QUALITY = 70
+DEFAULT_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "PORTAL_THUMBNAIL_WORKERS", DEFAULT_WORKERS),
+                thread_name_prefix="thumbnails",
+            )
+        return _executor
+
+
+def is_image(name) -> bool:
+    # registered_extensions() включает и форматы только для записи (PDF).
+    image_format = Image.registered_extensions().get(os.path.splitext(name or "")[1].lower())
+    return image_format in Image.OPEN
+
+
+def render_thumbnail(fh) -> bytes:
+    """Уменьшенная копия в JPEG: поворот по EXIF, без прозрачности и метаданных."""
+    size = getattr(settings, "PORTAL_THUMBNAIL_SIZE", DEFAULT_SIZE)
+    with Image.open(fh) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе — фото с телефона в разы быстрее.
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        output = BytesIO()
+        image.save(
+            output,
+            "JPEG",
+            quality=getattr(settings, "PORTAL_THUMBNAIL_QUALITY", DEFAULT_QUALITY),
+            optimize=True,
+            progressive=True,
+        )
+    return output.getvalue()
+
+
+def build_thumbnail(expense_id) -> str:
+    """Строит превью вложения расхода; возвращает имя файла превью или ""."""
+    expense = Expense.objects.filter(pk=expense_id).first()
+    if expense is None or not expense.attachment or not is_image(expense.attachment.name):
+        return ""
+    attachment = expense.attachment.name
+    # Тот же файл у другой записи уже с превью — повторно не считаем.
+    thumbnail = (
+        Expense.objects.filter(attachment=attachment)
+        .exclude(thumbnail="")
+        .values_list("thumbnail", flat=True)
+        .first()
+    )
+    if not thumbnail:
+        with expense.attachment.open("rb") as fh:
+            data = render_thumbnail(fh)
+        field = Expense._meta.get_field("thumbnail")
+        thumbnail = field.storage.save(
+            field.generate_filename(expense, "preview.jpg"), ContentFile(data)
+        )
+    # update(), а не save(): сигналы расхода (сводки, архив) тут ни при чём, а
+    # условие по attachment не даст записать превью к уже заменённому файлу.
+    Expense.objects.filter(pk=expense_id, attachment=attachment).update(thumbnail=thumbnail)
+    return thumbnail
+
+
+def _run(expense_id) -> None:
+    try:
+        build_thumbnail(expense_id)
+    except Exception:
+        logger.exception("Не удалось построить превью для расхода %s", expense_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnail(expense_id) -> None:
+    """Превью строится в фоновом потоке после коммита, не задерживая ответ."""
+    transaction.on_commit(lambda: _pool().submit(_run, expense_id))
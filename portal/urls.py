@@ -11,10 +11,15 @@ urlpatterns = [
     path('orders/<int:pk>/', views.order_detail, name='order_detail'),
     path('report/', views.report, name='report'),
     path('expenses/', views.expenses, name='expenses'),
+    path('expenses/<int:pk>/<slug:variant>/', views.expense_file, name='expense_file'),
     path('usage/', views.usage, name='usage'),
     path('defects/', views.defects, name='defects'),
+    path('export/<slug:dataset>.<slug:fmt>', views.export, name='export'),
+    path('lookup/<slug:name>/', views.lookup, name='lookup'),
+    path('search/', views.search_page, name='search'),
     path('inventory/', views.inventory, name='inventory'),
     path('help/', views.help_page, name='help'),
     path('directory/', views.directory, name='directory'),
     path('staff/', views.staff, name='staff'),
+    path('fragments/', views.fragment_stats_page, name='fragment_stats'),
 ]
@@ -0,0 +1,78 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Счётчики «последнего изменения» по моделям: ключи кэша фрагментов включают их,
+# поэтому после записи старые фрагменты просто перестают читаться.
+VERSION_KEY = "portal:version:{}"
+STATS_KEY = "portal:fragment-stats:{}:{}"
+STATS_NAMES_KEY = "portal:fragment-stats:names"
+
+
+def _name(model) -> str:
+    return model if isinstance(model, str) else model._meta.model_name
+
+
+def get_versions(names) -> list:
+    names = list(names)
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for name, key in zip(names, keys):
+        version = found.get(key)
+        if version is None:
+            # Счётчик пропал из кэша — начинаем с текущего времени, чтобы новое
+            # значение не совпало ни с одной прежней версией.
+            version = int(time.time() * 1000)
+            cache.add(key, version, None)
+            version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def _bump(names) -> None:
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), None)
+
+
+def bump_versions(*models) -> None:
+    """Отмечает изменение моделей после коммита, чтобы параллельный запрос не
+    закэшировал фрагмент с ещё не закоммиченными данными под новой версией."""
+    names = [_name(model) for model in models]
+    transaction.on_commit(lambda: _bump(names))
+
+
+def record_fragment(name: str, hit: bool) -> None:
+    key = STATS_KEY.format(name, "hit" if hit else "miss")
+    if not hit:
+        names = cache.get(STATS_NAMES_KEY, set())
+        if name not in names:
+            cache.set(STATS_NAMES_KEY, names | {name}, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def fragment_stats() -> dict:
+    """``{фрагмент: (попадания, промахи)}`` с момента последнего сброса."""
+    names = sorted(cache.get(STATS_NAMES_KEY, set()))
+    stats = {}
+    for name in names:
+        hits = cache.get(STATS_KEY.format(name, "hit"), 0)
+        misses = cache.get(STATS_KEY.format(name, "miss"), 0)
+        stats[name] = (hits, misses)
+    return stats
+
+
+def reset_fragment_stats() -> None:
+    names = cache.get(STATS_NAMES_KEY, set())
+    cache.delete_many(
+        [STATS_KEY.format(name, kind) for name in names for kind in ("hit", "miss")]
+        + [STATS_NAMES_KEY]
+    )
@@ -1,13 +1,29 @@
-from datetime import date, datetime
+from datetime import date, datetime, time
 from decimal import Decimal
+from functools import partial
+from time import perf_counter
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
 from django.db import transaction
-from django.db.models import F, Max, Min, Sum
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
+from django.views.decorators.http import require_safe
 
 from accounts.models import Employee
+from graceproject.db_routers import use_replica
 
+from .archive import get_archive_months
+from .concurrency import gather_queries
+from .dashboard import get_dashboard_snapshot
+from .exports import export_response
 from .forms import (
     CalculatorItemFormSet,
     CalculatorSummaryForm,
@@ -19,6 +35,8 @@ from .forms import (
     OrderForm,
     OrderItemFormSet,
 )
+from .lookups import lookup_response
+from .media import download_name, serve_file
 from .models import (
     DefectRecord,
     Expense,
@@ -26,26 +44,22 @@ from .models import (
     InventoryUsage,
     Order,
     OrderItem,
+    SearchDocument,
 )
+from .pagination import paginate_keyset
+from .rollups import get_month_rollup, get_trend, next_month, refresh_month, shift_month
+from .search import index_on_commit, search
+from .versions import fragment_stats, reset_fragment_stats
 
 
-def _normalize_to_date(value):
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value.date()
-    return value
-
-
-def _month_context(request, min_date, max_date):
+def _month_context(request, archive_months):
+    """Навигация по месяцам; ``archive_months`` — месяцы с данными по убыванию."""
     today = date.today()
-    data_min_date = _normalize_to_date(min_date)
-    data_max_date = _normalize_to_date(max_date)
+    default_month = date(today.year, today.month, 1)
 
-    min_date = data_min_date or today
-    max_date = max(data_max_date or today, today)
+    min_month = archive_months[-1] if archive_months else default_month
+    max_month = max(archive_months[0], default_month) if archive_months else default_month
 
-    default_month = date(today.year, today.month, 1)
     month_param = request.GET.get("month")
     try:
         if month_param:
@@ -56,67 +70,51 @@ def _month_context(request, min_date, max_date):
     except (TypeError, ValueError):
         current_month = default_month
 
-    min_month = date(min_date.year, min_date.month, 1)
-    max_month = date(max_date.year, max_date.month, 1)
-
     if current_month < min_month:
         current_month = min_month
     if current_month > max_month:
         current_month = max_month
 
-    if current_month.month == 12:
-        month_end = date(current_month.year + 1, 1, 1)
-    else:
-        month_end = date(current_month.year, current_month.month + 1, 1)
-
-    previous_month = None
-    if current_month > min_month:
-        if current_month.month == 1:
-            previous_month = date(current_month.year - 1, 12, 1)
-        else:
-            previous_month = date(current_month.year, current_month.month - 1, 1)
-
-    next_month = None
-    if current_month < max_month:
-        if current_month.month == 12:
-            next_month = date(current_month.year + 1, 1, 1)
-        else:
-            next_month = date(current_month.year, current_month.month + 1, 1)
-
-    month_slug = current_month.strftime("%Y-%m")
-    month_label = current_month.strftime("%m.%Y")
-
-    archive_months = []
-    if data_min_date and data_max_date:
-        cursor = date(data_max_date.year, data_max_date.month, 1)
-        min_archive_month = date(data_min_date.year, data_min_date.month, 1)
-        while cursor >= min_archive_month:
-            archive_months.append(cursor)
-            if cursor.month == 1:
-                cursor = date(cursor.year - 1, 12, 1)
-            else:
-                cursor = date(cursor.year, cursor.month - 1, 1)
+    month_end = next_month(current_month)
+    previous_month = shift_month(current_month, -1) if current_month > min_month else None
+    following_month = month_end if current_month < max_month else None
 
     return {
         "month_start": current_month,
         "month_end": month_end,
         "previous_month": previous_month,
-        "next_month": next_month,
-        "month_slug": month_slug,
-        "month_label": month_label,
+        "next_month": following_month,
+        "month_slug": current_month.strftime("%Y-%m"),
+        "month_label": current_month.strftime("%m.%Y"),
         "archive_months": archive_months,
     }
 
 
-def index(request):
-    order_bounds = Order.objects.aggregate(
-        min_date=Min("created_at"), max_date=Max("created_at")
+def _created_in_month(month_ctx) -> dict:
+    """Фильтр по created_at обычным диапазоном: без обёртки в DATE() работает индекс."""
+    return {
+        "created_at__gte": datetime.combine(month_ctx["month_start"], time.min),
+        "created_at__lt": datetime.combine(month_ctx["month_end"], time.min),
+    }
+
+
+def _recent_orders(month_ctx) -> list:
+    return list(
+        Order.objects.select_related("client")
+        .prefetch_related("items")
+        .filter(**_created_in_month(month_ctx))
+        .order_by("-created_at")
     )
-    order_month = _month_context(
-        request,
-        order_bounds.get("min_date"),
-        order_bounds.get("max_date"),
+
+
+@use_replica
+async def index(request):
+    # Независимые запросы идут одновременно, каждый в своём соединении.
+    archive_months, snapshot = await gather_queries(
+        partial(get_archive_months, Order), get_dashboard_snapshot
     )
+    order_month = _month_context(request, archive_months)
+    (recent_orders,) = await gather_queries(partial(_recent_orders, order_month))
 
     status_cards = [
         {
@@ -151,30 +149,22 @@ def index(request):
         },
     ]
 
-    counts = {
-        card["key"]: Order.objects.filter(status=card["key"]).count() for card in status_cards
-    }
+    counts = snapshot["status_counts"]
     for card in status_cards:
         card["count"] = counts.get(card["key"], 0)
 
     status_summary = {
-        "total": Order.objects.count(),
+        "total": snapshot["total"],
         "active": sum(counts.values()) - counts.get(Order.Status.DONE, 0),
         "office": counts.get(Order.Status.OFFICE, 0),
         "workshop": counts.get(Order.Status.WORKSHOP, 0) + counts.get(Order.Status.INSTALLATION, 0),
         "done": counts.get(Order.Status.DONE, 0),
     }
 
-    recent_orders = (
-        Order.objects.select_related("client")
-        .prefetch_related("items")
-        .filter(
-            created_at__date__gte=order_month["month_start"],
-            created_at__date__lt=order_month["month_end"],
-        )
-        .order_by("-created_at")
-    )
-    low_stock = InventoryItem.objects.order_by("quantity_on_hand")[:5]
+    # Вычисляется при рендеринге, только если фрагмент «low-stock» не в кэше.
+    low_stock = InventoryItem.objects.filter(days_of_cover__isnull=False).order_by(
+        "days_of_cover", "name"
+    )[:5]
 
     context = {
         "status_cards": status_cards,
@@ -183,58 +173,51 @@ def index(request):
         "low_stock": low_stock,
         "order_month": order_month,
     }
-    return render(request, "portal/index.html", context)
+    return await sync_to_async(render)(request, "portal/index.html", context)
 
 
-def report(request):
-    order_bounds = Order.objects.aggregate(
-        min_date=Min("created_at"), max_date=Max("created_at")
-    )
-    expense_bounds = Expense.objects.aggregate(
-        min_date=Min("expense_date"), max_date=Max("expense_date")
-    )
-    bounds = [
-        _normalize_to_date(order_bounds.get("min_date")),
-        _normalize_to_date(expense_bounds.get("min_date")),
-    ]
-    bounds_max = [
-        _normalize_to_date(order_bounds.get("max_date")),
-        _normalize_to_date(expense_bounds.get("max_date")),
-    ]
-    min_date = min([d for d in bounds if d]) if any(bounds) else None
-    max_date = max([d for d in bounds_max if d]) if any(bounds_max) else None
-    month_ctx = _month_context(request, min_date, max_date)
-
-    income_qs = (
+def _income_rows(month_ctx) -> list:
+    return list(
         Order.objects.select_related("client")
-        .filter(
-            created_at__date__gte=month_ctx["month_start"],
-            created_at__date__lt=month_ctx["month_end"],
-        )
+        .filter(**_created_in_month(month_ctx))
         .order_by("-created_at")
     )
-    income_total = income_qs.aggregate(total=Sum("total_amount"))
-    income_total = income_total.get("total") or Decimal("0")
 
-    expense_qs = (
+
+def _expense_rows(month_ctx) -> list:
+    return list(
         Expense.objects.filter(
             expense_date__gte=month_ctx["month_start"],
             expense_date__lt=month_ctx["month_end"],
         )
         .order_by("-expense_date")
     )
-    expense_total = expense_qs.aggregate(total=Sum("amount"))
-    expense_total = expense_total.get("total") or Decimal("0")
+
+
+@use_replica
+async def report(request):
+    order_months, expense_months = await gather_queries(
+        partial(get_archive_months, Order), partial(get_archive_months, Expense)
+    )
+    month_ctx = _month_context(request, sorted(set(order_months) | set(expense_months), reverse=True))
+
+    income_rows, expense_rows, rollup, trend = await gather_queries(
+        partial(_income_rows, month_ctx),
+        partial(_expense_rows, month_ctx),
+        partial(get_month_rollup, month_ctx["month_start"]),
+        partial(get_trend, month_ctx["month_start"]),
+    )
 
     context = {
-        "income_total": income_total,
-        "expense_total": expense_total,
-        "net_total": income_total - expense_total,
-        "income_rows": income_qs,
-        "expense_rows": expense_qs,
+        "income_total": rollup.income,
+        "expense_total": rollup.expense,
+        "net_total": rollup.net,
+        "income_rows": income_rows,
+        "expense_rows": expense_rows,
         "report_month": month_ctx,
+        "trend": trend,
     }
-    return render(request, "portal/report.html", context)
+    return await sync_to_async(render)(request, "portal/report.html", context)
 
 
 def order(request):
@@ -340,6 +323,45 @@ def wizard(request):
     return render(request, "portal/wizard.html", context)
 
 
+def _save_order_items(order, item_formset) -> bool:
+    """Записывает только изменённые строки: вставки, обновления и удаления пачками."""
+    item_formset.save(commit=False)
+    new_items = item_formset.new_objects
+    changed = item_formset.changed_objects
+    deleted_ids = [obj.pk for obj in item_formset.deleted_objects]
+    if not (new_items or changed or deleted_ids):
+        return False
+
+    if deleted_ids:
+        OrderItem.objects.filter(pk__in=deleted_ids).delete()
+    if changed:
+        now = timezone.now()
+        fields = {"updated_at"}
+        for obj, changed_fields in changed:
+            obj.updated_at = now
+            fields.update(changed_fields)
+        OrderItem.objects.bulk_update([obj for obj, _ in changed], sorted(fields))
+    if new_items:
+        for obj in new_items:
+            obj.order = order
+        OrderItem.objects.bulk_create(new_items)
+    return True
+
+
+def _order_total_expression():
+    return Coalesce(
+        Subquery(
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=Sum(F("quantity") * F("unit_price")))
+            .values("total")
+        ),
+        Value(Decimal("0")),
+        output_field=Order._meta.get_field("total_amount"),
+    )
+
+
 def order_detail(request, pk):
     order = get_object_or_404(
         Order.objects.select_related("client"),
@@ -370,22 +392,17 @@ def order_detail(request, pk):
         )
 
         if order_form.is_valid() and item_formset.is_valid():
-            order_form.save()
-            instances = item_formset.save(commit=False)
-            for obj in item_formset.deleted_objects:
-                obj.delete()
-            for obj in instances:
-                obj.order = order
-                obj.save()
-
-            total = (
-                order.items.all()
-                .aggregate(total=Sum(F("quantity") * F("unit_price")))
-                .get("total")
-                or Decimal("0")
-            )
-            order.total_amount = total
-            order.save(update_fields=["total_amount"])
+            with transaction.atomic():
+                if order_form.has_changed():
+                    order_form.save()
+                if _save_order_items(order, item_formset):
+                    Order.objects.filter(pk=order.pk).update(
+                        total_amount=_order_total_expression(), updated_at=timezone.now()
+                    )
+                    # update() и bulk-операции не отправляют сигналы — сводку месяца
+                    # и поисковый документ заказа обновляем сами.
+                    refresh_month(order.created_at)
+                    index_on_commit(SearchDocument.Kind.ORDER, [order.pk])
 
             messages.success(request, "Изменения сохранены")
             return redirect("portal:order_detail", pk=order.pk)
@@ -413,6 +430,39 @@ def order_detail(request, pk):
     return render(request, "portal/order_detail.html", context)
 
 
+@use_replica
+def export(request, dataset, fmt):
+    return export_response(request, dataset, fmt)
+
+
+def lookup(request, name):
+    return lookup_response(request, name)
+
+
+def search_page(request):
+    query = request.GET.get("q", "").strip()
+    started = perf_counter()
+    hits = search(query)
+    elapsed_ms = (perf_counter() - started) * 1000
+    context = {"query": query, "hits": hits, "elapsed_ms": elapsed_ms}
+    return render(request, "portal/search.html", context)
+
+
+@staff_member_required
+def fragment_stats_page(request):
+    """Счётчики кэша фрагментов этого процесса (см. ``fragment_cache_stats``)."""
+    if request.method == "POST":
+        reset_fragment_stats()
+        messages.success(request, "Счётчики обнулены")
+        return redirect("portal:fragment_stats")
+    stats = [
+        {"name": name, "hits": hits, "misses": misses, "ratio": hits / (hits + misses) * 100}
+        for name, (hits, misses) in fragment_stats().items()
+        if hits + misses
+    ]
+    return render(request, "portal/fragment_stats.html", {"stats": stats})
+
+
 def help_page(request):
     return render(request, "portal/help.html")
 
@@ -421,6 +471,7 @@ def directory(request):
     return render(request, "portal/directory.html")
 
 
+@use_replica
 def staff(request):
     employees = (
         Employee.objects.select_related("main_position__department")
@@ -431,27 +482,19 @@ def staff(request):
     return render(request, "portal/staff.html", context)
 
 
+@use_replica
 def inventory(request):
-    items = InventoryItem.objects.all()
+    items = paginate_keyset(request, InventoryItem.objects.all(), ("name", "id"))
     return render(request, "portal/inventory.html", {"items": items})
 
 
+@use_replica
 def expenses(request):
-    expense_bounds = Expense.objects.aggregate(
-        min_date=Min("expense_date"), max_date=Max("expense_date")
-    )
-    expense_month = _month_context(
-        request,
-        expense_bounds.get("min_date"),
-        expense_bounds.get("max_date"),
-    )
+    expense_month = _month_context(request, get_archive_months(Expense))
 
-    expenses_qs = (
-        Expense.objects.filter(
-            expense_date__gte=expense_month["month_start"],
-            expense_date__lt=expense_month["month_end"],
-        )
-        .order_by("-expense_date")
+    expenses_qs = Expense.objects.filter(
+        expense_date__gte=expense_month["month_start"],
+        expense_date__lt=expense_month["month_end"],
     )
     if request.method == "POST":
         form = ExpenseForm(request.POST, request.FILES)
@@ -463,25 +506,44 @@ def expenses(request):
     else:
         form = ExpenseForm(initial={"expense_date": date.today()})
 
-    context = {"form": form, "expenses": expenses_qs, "expense_month": expense_month}
+    expenses_page = paginate_keyset(
+        request, expenses_qs, ("-expense_date", "-created_at", "-id")
+    )
+    context = {"form": form, "expenses": expenses_page, "expense_month": expense_month}
     return render(request, "portal/expenses.html", context)
 
 
+EXPENSE_FILE_FIELDS = {"file": "attachment", "preview": "thumbnail"}
+
+
+@require_safe
+@login_required
+def expense_file(request, pk, variant):
+    """Вложение расхода или его превью — только для вошедших пользователей
+    (и с правом ``PORTAL_ATTACHMENT_PERMISSION``, если оно задано)."""
+    field_name = EXPENSE_FILE_FIELDS.get(variant)
+    if field_name is None:
+        raise Http404
+    permission = getattr(settings, "PORTAL_ATTACHMENT_PERMISSION", None)
+    if permission and not request.user.has_perm(permission):
+        raise PermissionDenied
+    name = Expense.objects.filter(pk=pk).values_list(field_name, flat=True).first()
+    if not name:
+        raise Http404("Файл не найден")
+    storage = Expense._meta.get_field(field_name).storage
+    suffix = "" if variant == "file" else f"-{variant}"
+    return serve_file(request, storage, name, download_name(f"expense-{pk}{suffix}", name))
+
+
+@use_replica
 def usage(request):
     usage_qs = InventoryUsage.objects.select_related("item", "project")
-    usage_bounds = usage_qs.aggregate(
-        min_date=Min("usage_date"), max_date=Max("usage_date")
-    )
-    usage_month = _month_context(
-        request,
-        usage_bounds.get("min_date"),
-        usage_bounds.get("max_date"),
-    )
+    usage_month = _month_context(request, get_archive_months(InventoryUsage))
 
     filtered_usages = usage_qs.filter(
         usage_date__gte=usage_month["month_start"],
         usage_date__lt=usage_month["month_end"],
-    ).order_by("-usage_date", "-created_at")
+    )
 
     if request.method == "POST":
         form = InventoryUsageForm(request.POST)
@@ -495,23 +557,18 @@ def usage(request):
 
     context = {
         "form": form,
-        "usages": filtered_usages,
+        "usages": paginate_keyset(
+            request, filtered_usages, ("-usage_date", "-created_at", "-id")
+        ),
         "usage_month": usage_month,
     }
     return render(request, "portal/usage.html", context)
 
 
+@use_replica
 def defects(request):
     defect_qs = DefectRecord.objects.select_related("project", "responsible")
-
-    defect_bounds = defect_qs.aggregate(
-        min_date=Min("report_date"), max_date=Max("report_date")
-    )
-    defect_month = _month_context(
-        request,
-        defect_bounds.get("min_date"),
-        defect_bounds.get("max_date"),
-    )
+    defect_month = _month_context(request, get_archive_months(DefectRecord))
 
     if request.method == "POST":
         form = DefectRecordForm(request.POST)
@@ -523,10 +580,14 @@ def defects(request):
     else:
         form = DefectRecordForm(initial={"report_date": date.today()})
 
-    defects_list = defect_qs.filter(
-        report_date__gte=defect_month["month_start"],
-        report_date__lt=defect_month["month_end"],
-    ).order_by("-report_date", "-created_at")
+    defects_list = paginate_keyset(
+        request,
+        defect_qs.filter(
+            report_date__gte=defect_month["month_start"],
+            report_date__lt=defect_month["month_end"],
+        ),
+        ("-report_date", "-created_at", "-id"),
+    )
     context = {
         "form": form,
         "defects": defects_list,